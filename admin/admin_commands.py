@@ -1,32 +1,45 @@
-import os
+import html
+import logging
 
 from aiogram import F, Router, types
-from aiogram.filters import Command
-from aiogram.types import Message, CallbackQuery
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message, CallbackQuery, BufferedInputFile
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from keyboards.reply_kb import generate_main_menu, setting_commands
-from translation import LANG
+from storage import LANG
 from translation import translations
 from filters.admin_filters import IsAdmin
 from aiogram import Bot
 from database.utils import (
     db_add_category,
     db_add_product,
-    db_get_all_products,
-    db_get_all_categories,
+    db_get_products_page,
+    db_get_categories_page,
     db_delete_category,
     db_update_product,
-    db_get_product_by_id, db_delete_product, db_get_category, db_update_category
+    db_get_product_by_id, db_delete_product, db_get_category, db_update_category,
+    db_count_users, db_create_campaign, db_import_catalog, db_get_sales_today, run_after_commit
 )
 
 from keyboards.inline_kb import (
     generate_categories_for_admin,
     generate_products_for_admin,
     generate_edit_product_keyboard,
-    generate_confirm_delete_keyboard, generate_categories_for_admin_edit, generate_edit_category_keyboard
+    generate_confirm_delete_keyboard, generate_categories_for_admin_edit, generate_edit_category_keyboard,
+    generate_broadcast_confirm_keyboard
 )
+from keyboards.pagination import ADMIN_PAGE_SIZE, parse_page_callback
+from utils.analytics import STATS_MAX_DAYS, parse_report_range, sales_report
+from utils.broadcast import broadcast_engine
+from utils.catalog_io import (CATALOG_FORMATS, IMPORT_BATCH_SIZE, IMPORT_MAX_ERRORS, CatalogFileError,
+                              export_catalog, read_catalog)
+from utils.helper import stats_text
+from utils.ingest import ingest_photo, schedule_release
+
+logger = logging.getLogger(__name__)
 
 admin_router = Router()
 
@@ -64,6 +77,15 @@ class DeleteProductForm(StatesGroup):
     product_id = State()
 
 
+class BroadcastForm(StatesGroup):
+    message = State()
+    confirm = State()
+
+
+class ImportForm(StatesGroup):
+    document = State()
+
+
 @admin_router.message(IsAdmin(), Command("admin"))
 async def show_admin_panel(message: Message):
     """Show admin panel commands"""
@@ -74,7 +96,7 @@ async def show_admin_panel(message: Message):
            translations[lang]["admin_panel_commands"], reply_markup=setting_commands(True, lang)
         )
     except Exception as e:
-        print(f"Exception during show_admin_panel: {str(e)}")
+        logger.exception(f"Exception during show_admin_panel: {e}")
 
 
 @admin_router.message(F.text == "🔐Admin")
@@ -98,11 +120,11 @@ async def add_category_command(message: Message, state: FSMContext):
 
 
 @admin_router.message(IsAdmin(), CategoryForm.name)
-async def process_category_name(message: Message, state: FSMContext):
+async def process_category_name(message: Message, state: FSMContext, session: AsyncSession):
     category_name = message.text.strip()
     chat_id = message.chat.id
     lang = LANG.get(chat_id, "uz")
-    success = db_add_category(category_name)
+    success = await db_add_category(category_name, session=session)
     if success:
         await message.answer(translations[lang]["category_added_success"].format(category_name=category_name))
     else:
@@ -113,12 +135,12 @@ async def process_category_name(message: Message, state: FSMContext):
 
 
 @admin_router.message(IsAdmin(), Command("categories"))
-async def list_categories(message: Message):
+async def list_categories(message: Message, session: AsyncSession):
     """List all categories with management options"""
     chat_id = message.chat.id
     lang = LANG.get(chat_id, "uz")
-    categories = db_get_all_categories()
-    if not categories:
+    page = await db_get_categories_page(ADMIN_PAGE_SIZE, session=session)
+    if not page.rows:
         await message.answer(translations[lang]["no_categories_found"])
         return
 
@@ -127,27 +149,39 @@ async def list_categories(message: Message):
 
     await message.answer(
         text,
-        reply_markup=generate_categories_for_admin_edit(categories)
+        reply_markup=generate_categories_for_admin_edit(page)
     )
 
 
+@admin_router.callback_query(IsAdmin(), F.data.startswith("admcat_"))
+async def page_categories(callback: CallbackQuery, session: AsyncSession):
+    """Prev/next page of the category list, both for managing and for picking a product's category"""
+    after_id, before_id = parse_page_callback(callback.data)
+    page = await db_get_categories_page(ADMIN_PAGE_SIZE, after_id, before_id, session=session)
+    if callback.data.startswith("admcat_edit"):
+        keyboard = generate_categories_for_admin_edit(page)
+    else:
+        keyboard = generate_categories_for_admin(page)
+    await callback.message.edit_reply_markup(reply_markup=keyboard)
+
+
 @admin_router.callback_query(F.data.startswith("admin_category_edit_"))
-async def manage_selected_category(callback: CallbackQuery, state: FSMContext):
+async def manage_selected_category(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     category_id = int(callback.data.split("_")[-1])
-    category = db_get_category(category_id)
+    category = await db_get_category(category_id, session=session)
     chat_id = callback.message.chat.id
     lang = LANG.get(chat_id, "uz")
     if not category:
         await callback.message.answer(translations[lang]["category_not_found"])
 
-    text = translations[lang]["category_name_label"].format(category_name=category["category_name"])
+    text = translations[lang]["category_name_label"].format(category_name=category.category_name)
     await callback.message.edit_text(text, reply_markup=generate_edit_category_keyboard(lang, category_id))
 
 
 @admin_router.callback_query(F.data.startswith("edit_category_"))
-async def update_category(callback: CallbackQuery, state: FSMContext):
+async def update_category(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     category_id = int(callback.data.split("_")[-1])
-    category = db_get_category(category_id)
+    category = await db_get_category(category_id, session=session)
     chat_id = callback.message.chat.id
     lang = LANG.get(chat_id, "uz")
     if not category:
@@ -157,13 +191,13 @@ async def update_category(callback: CallbackQuery, state: FSMContext):
     await state.set_state(EditCategoryForm.category_id)
     await state.update_data(category_id=category_id)
 
-    await callback.message.edit_text(translations[lang]["editing_category_prompt"].format(category_name=category["category_name"]))
+    await callback.message.edit_text(translations[lang]["editing_category_prompt"].format(category_name=category.category_name))
 
     await state.set_state(EditCategoryForm.name)
 
 
 @admin_router.message(IsAdmin(), EditCategoryForm.name)
-async def process_edit_category_name(message: Message, state: FSMContext):
+async def process_edit_category_name(message: Message, state: FSMContext, session: AsyncSession):
     data = await state.get_data()
     category_id = data["category_id"]
     chat_id = message.chat.id
@@ -171,7 +205,7 @@ async def process_edit_category_name(message: Message, state: FSMContext):
 
     if message.text.lower() != "skip":
         name = message.text.strip()
-        success = db_update_category(category_id, name)
+        success = await db_update_category(category_id, name, session=session)
         if success:
             await message.answer(translations[lang]["category_updated_success"])
         else:
@@ -183,9 +217,9 @@ async def process_edit_category_name(message: Message, state: FSMContext):
 
 
 @admin_router.callback_query(IsAdmin(), F.data.startswith("delete_category_"))
-async def confirm_delete_category(callback: CallbackQuery, state: FSMContext):
+async def confirm_delete_category(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     category_id = int(callback.data.split("_")[-1])
-    category = db_get_category(category_id)
+    category = await db_get_category(category_id, session=session)
     chat_id = callback.message.chat.id
     lang = LANG.get(chat_id, "uz")
     if not category:
@@ -195,24 +229,26 @@ async def confirm_delete_category(callback: CallbackQuery, state: FSMContext):
     await state.update_data(category_id=category_id)
 
     await callback.message.edit_text(
-        translations[lang]["confirm_delete_category_prompt"].format(category_name=category["category_name"]),
+        translations[lang]["confirm_delete_category_prompt"].format(category_name=category.category_name),
         reply_markup=generate_confirm_delete_keyboard("category", category_id, lang)
     )
 
 
 @admin_router.callback_query(IsAdmin(), F.data.startswith("confirm_delete_category"))
-async def delete_category(callback: CallbackQuery, state: FSMContext):
+async def delete_category(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     category_id = int(callback.data.split("_")[-1])
     chat_id = callback.message.chat.id
     lang = LANG.get(chat_id, "uz")
-    success = db_delete_category(category_id)
-    if success:
+    images = await db_delete_category(category_id, session=session)
+    if images is not None:
+        for image in set(images):
+            run_after_commit(session, lambda image=image: schedule_release(image))
         await callback.message.edit_text(translations[lang]["category_deleted_success"])
-        await list_categories(callback.message)
+        await list_categories(callback.message, session=session)
 
     else:
         await callback.message.edit_text(translations[lang]["category_deleted_fail"])
-        await list_categories(callback.message)
+        await list_categories(callback.message, session=session)
 
     await state.clear()
 
@@ -225,12 +261,12 @@ async def cancel_delete_category(callback: CallbackQuery, state: FSMContext):
 
 
 @admin_router.callback_query(F.data.startswith("return_to_categories"))
-async def return_to_category_list(callback: CallbackQuery, bot: Bot):
+async def return_to_category_list(callback: CallbackQuery, bot: Bot, session: AsyncSession):
     try:
         await bot.delete_message(chat_id=callback.message.chat.id, message_id=callback.message.message_id)
-        await list_categories(callback.message)
+        await list_categories(callback.message, session=session)
     except Exception as e:
-        print(f"Error in return_to_category_list {str(e)}")
+        logger.exception(f"Error in return_to_category_list {e}")
 
 
 """
@@ -239,17 +275,17 @@ Admin product management
 
 
 @admin_router.message(IsAdmin(), Command("addproduct"))
-async def add_product_command(message: Message, state: FSMContext):
+async def add_product_command(message: Message, state: FSMContext, session: AsyncSession):
     chat_id = message.chat.id
     lang = LANG.get(chat_id, "uz")
-    categories = db_get_all_categories()
-    if not categories:
+    page = await db_get_categories_page(ADMIN_PAGE_SIZE, session=session)
+    if not page.rows:
         await message.answer(translations[lang]["no_categories_for_product"])
         return
 
     await message.answer(
         translations[lang]["select_category_for_product"],
-        reply_markup=generate_categories_for_admin(categories)
+        reply_markup=generate_categories_for_admin(page)
     )
 
     await state.set_state(ProductForm.category_id)
@@ -298,47 +334,44 @@ async def process_product_price(message: Message, state: FSMContext):
 
 
 @admin_router.message(ProductForm.image, F.photo)
-async def process_product_image(message: Message, state: FSMContext, bot: Bot):
+async def process_product_image(message: Message, state: FSMContext, bot: Bot, session: AsyncSession):
     """Process product image and add product to database"""
     photo = message.photo[-1]
     chat_id = message.chat.id
     lang = LANG.get(chat_id, "uz")
-    file = await bot.get_file(photo.file_id)
-    file_path = file.file_path
-    download_file = await bot.download_file(file_path)
-
-    image_filename = f"media/{photo.file_id}.jpg"
-    os.makedirs("media", exist_ok=True)
-    with open(image_filename, "wb") as f:
-        f.write(download_file.read())
+    image_filename = await ingest_photo(bot, photo.file_id)
 
-    await state.update_data(image=image_filename)
+    await state.update_data(image=image_filename, image_file_id=photo.file_id)
 
     data = await state.get_data()
 
-    success = db_add_product(
+    success = await db_add_product(
         category_id=data["category_id"],
         product_name=data["name"],
         description=data["description"],
         price=data["price"],
-        image=data["image"]
+        image=data["image"],
+        image_file_id=data["image_file_id"],
+        session=session
     )
 
     if success:
         await message.answer(translations[lang]["product_added_success"].format(product_name=data['name']))
     else:
+        # nothing points at the ingested photo, unless another product uses the same one
+        schedule_release(image_filename)
         await message.answer(translations[lang]["product_added_fail"])
 
     await state.clear()
 
 
 @admin_router.message(IsAdmin(), Command("products"))
-async def list_products(message: Message):
+async def list_products(message: Message, session: AsyncSession):
     """List all products with management options"""
     chat_id = message.chat.id
     lang = LANG.get(chat_id, "uz")
-    products = db_get_all_products()
-    if not products:
+    page = await db_get_products_page(ADMIN_PAGE_SIZE, session=session)
+    if not page.rows:
         await message.answer(translations[lang]["products_not_found"])
         return
 
@@ -346,24 +379,31 @@ async def list_products(message: Message):
     text += translations[lang]["products_list_instruction"]
     await message.answer(
         text,
-        reply_markup=generate_products_for_admin(products)
+        reply_markup=generate_products_for_admin(page)
     )
 
 
+@admin_router.callback_query(IsAdmin(), F.data.startswith("admprod_"))
+async def page_products(callback: CallbackQuery, session: AsyncSession):
+    after_id, before_id = parse_page_callback(callback.data)
+    page = await db_get_products_page(ADMIN_PAGE_SIZE, after_id, before_id, session=session)
+    await callback.message.edit_reply_markup(reply_markup=generate_products_for_admin(page))
+
+
 @admin_router.callback_query(IsAdmin(), F.data.startswith("admin_prod_"))
-async def show_product_actions(callback: CallbackQuery):
+async def show_product_actions(callback: CallbackQuery, session: AsyncSession):
     """Show actions for selected product"""
     product_id = int(callback.data.split("_")[-1])
-    product = db_get_product_by_id(product_id)
+    product = await db_get_product_by_id(product_id, session=session)
     chat_id = callback.message.chat.id
     lang = LANG.get(chat_id, "uz")
     if not product:
         await callback.message.answer(translations[lang]["products_not_found"])
         return
 
-    text = translations[lang]["product_details_text"].format(product_name=product["product_name"],
-                                                             product_description=product["description"],
-                                                             product_price=product["price"])
+    text = translations[lang]["product_details_text"].format(product_name=product.product_name,
+                                                             product_description=product.description,
+                                                             product_price=product.price)
 
     await callback.message.edit_text(
         text,
@@ -372,10 +412,10 @@ async def show_product_actions(callback: CallbackQuery):
 
 
 @admin_router.callback_query(IsAdmin(), F.data.startswith("edit_product_"))
-async def start_edit_product(callback: CallbackQuery, state: FSMContext):
+async def start_edit_product(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Start product editing process"""
     product_id = int(callback.data.split("_")[-1])
-    product = db_get_product_by_id(product_id)
+    product = await db_get_product_by_id(product_id, session=session)
     chat_id = callback.message.chat.id
     lang = LANG.get(chat_id, "uz")
     if not product:
@@ -384,7 +424,7 @@ async def start_edit_product(callback: CallbackQuery, state: FSMContext):
 
     await state.set_state(EditProductForm.product_id)
     await state.update_data(product_id=product_id)
-    text = translations[lang]["editing_product_prompt"].format(product_name=product["product_name"])
+    text = translations[lang]["editing_product_prompt"].format(product_name=product.product_name)
     await callback.message.edit_text(
         text
     )
@@ -431,71 +471,70 @@ async def process_edit_price(message: Message, state: FSMContext):
 
 
 @admin_router.message(IsAdmin(), EditProductForm.image, F.photo)
-async def process_edit_image_photo(message: Message, state: FSMContext, bot: Bot):
+async def process_edit_image_photo(message: Message, state: FSMContext, bot: Bot, session: AsyncSession):
     photo = message.photo[-1]
-    file = await bot.get_file(photo.file_id)
-    file_path = file.file_path
-    download_file = await bot.download_file(file_path)
-
-    image_filename = f"media/{photo.file_id}.jpg"
-    os.makedirs("media", exist_ok=True)
-    with open(image_filename, "wb") as f:
-        f.write(download_file.read())
+    image_filename = await ingest_photo(bot, photo.file_id)
 
-    await state.update_data(image=image_filename)
-    await update_product(message, state)
+    await state.update_data(image=image_filename, image_file_id=photo.file_id)
+    await update_product(message, state, session=session)
 
 
 @admin_router.message(IsAdmin(), EditProductForm.image)
-async def process_edit_image(message: Message, state: FSMContext):
+async def process_edit_image(message: Message, state: FSMContext, session: AsyncSession):
     """Handle skip or invalid input"""
     chat_id = message.chat.id
     lang = LANG.get(chat_id, "uz")
     if message.text and message.text.lower() == "skip":
-        print("skip detected for image")
-        await update_product(message, state)
+        logger.debug("Skip detected for image")
+        await update_product(message, state, session=session)
     else:
         await message.answer(translations[lang]["send_image_or_skip"])
 
 
-async def update_product(message: Message, state: FSMContext):
+async def update_product(message: Message, state: FSMContext, session: AsyncSession):
     """Update product in database with current state data"""
     data = await state.get_data()
     product_id = data["product_id"]
     chat_id = message.chat.id
     lang = LANG.get(chat_id, "uz")
 
-    product = db_get_product_by_id(product_id)
+    product = await db_get_product_by_id(product_id, session=session)
     if not product:
         await message.answer(translations[lang]["products_not_found"])
         await state.clear()
         return
 
-    name = data.get("name", product["product_name"])
-    description = data.get("description", product["description"])
-    price = data.get("price", product["price"])
-    image = data.get("image", product["image"])
+    name = data.get("name", product.product_name)
+    description = data.get("description", product.description)
+    price = data.get("price", product.price)
+    image = data.get("image", product.image)
 
-    success = db_update_product(
+    success = await db_update_product(
         product_id=product_id,
         name=name,
         description=description,
         price=price,
-        image=image
+        image=image,
+        image_file_id=data.get("image_file_id"),
+        session=session
     )
 
     if success:
+        if image != product.image:
+            run_after_commit(session, lambda: schedule_release(product.image))
         await message.answer(translations[lang]["product_updated_success"])
     else:
+        if image != product.image:
+            schedule_release(image)
         await message.answer(translations[lang]["product_updated_fail"])
 
     await state.clear()
 
 
 @admin_router.callback_query(IsAdmin(), F.data.startswith("delete_product_"))
-async def confirm_delete_product(callback: CallbackQuery, state: FSMContext):
+async def confirm_delete_product(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     product_id = int(callback.data.split("_")[-1])
-    product = db_get_product_by_id(product_id)
+    product = await db_get_product_by_id(product_id, session=session)
     chat_id = callback.message.chat.id
     lang = LANG.get(chat_id, "uz")
     if not product:
@@ -506,23 +545,21 @@ async def confirm_delete_product(callback: CallbackQuery, state: FSMContext):
     await state.update_data(product_id=product_id)
 
     await callback.message.edit_text(
-        translations[lang]["confirm_delete_product_prompt"].format(product_name=product['product_name']),
+        translations[lang]["confirm_delete_product_prompt"].format(product_name=product.product_name),
         reply_markup=generate_confirm_delete_keyboard("product", product_id, lang)
     )
 
 
 @admin_router.callback_query(IsAdmin(), F.data.startswith("confirm_delete_product"))
-async def delete_product(callback: CallbackQuery, state: FSMContext):
+async def delete_product(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     product_id = int(callback.data.split("_")[-1])
-    product = db_get_product_by_id(product_id)
+    product = await db_get_product_by_id(product_id, session=session)
     chat_id = callback.message.chat.id
     lang = LANG.get(chat_id, "uz")
-    image_path = product['image']
-    if os.path.exists(image_path):
-        os.remove(image_path)
 
-    success = db_delete_product(product_id)
+    success = await db_delete_product(product_id, session=session)
     if success:
+        run_after_commit(session, lambda: schedule_release(product.image))
         await callback.message.edit_text(translations[lang]["product_deleted_success"])
     else:
         await callback.message.edit_text(translations[lang]["product_deleted_fail"])
@@ -538,9 +575,125 @@ async def cancel_delete_category(callback: CallbackQuery, state: FSMContext):
 
 
 @admin_router.callback_query(F.data.startswith("return_to_products"))
-async def return_to_product_list(callback: CallbackQuery, bot: Bot):
+async def return_to_product_list(callback: CallbackQuery, bot: Bot, session: AsyncSession):
     try:
         await bot.delete_message(chat_id=callback.message.chat.id, message_id=callback.message.message_id)
-        await list_products(callback.message)
+        await list_products(callback.message, session=session)
     except Exception as e:
-        print(f"Error in return_to_products {str(e)}")
+        logger.exception(f"Error in return_to_products {e}")
+
+
+"""
+Catalog import and export
+"""
+
+
+@admin_router.message(IsAdmin(), Command("export"))
+async def export_command(message: Message, command: CommandObject):
+    """Send the catalog as a document, /export json for JSON, CSV otherwise"""
+    fmt = (command.args or "").strip().lower()
+    fmt = fmt if fmt in CATALOG_FORMATS else "csv"
+    data = await export_catalog(fmt)
+    await message.answer_document(BufferedInputFile(data, filename=f"catalog.{fmt}"))
+
+
+@admin_router.message(IsAdmin(), Command("import"))
+async def import_command(message: Message, state: FSMContext):
+    lang = LANG.get(message.chat.id, "uz")
+    await state.set_state(ImportForm.document)
+    await message.answer(translations[lang]["import_prompt"])
+
+
+@admin_router.message(IsAdmin(), ImportForm.document, F.document)
+async def process_import_document(message: Message, state: FSMContext, bot: Bot, session: AsyncSession):
+    """Validate the whole upload first, then write it in one transaction, nothing is imported on errors"""
+    lang = LANG.get(message.chat.id, "uz")
+    await state.clear()
+    try:
+        products, errors = await read_catalog(bot, message.document.file_id, message.document.file_name)
+    except CatalogFileError as e:
+        await message.answer(translations[lang]["import_invalid_file"].format(error=html.escape(str(e))))
+        return
+
+    if errors:
+        text = translations[lang]["import_errors"].format(count=len(errors))
+        for line, key, field in errors[:IMPORT_MAX_ERRORS]:
+            text += "\n" + translations[lang]["import_row_error"].format(
+                line=line, error=translations[lang][key].format(field=field))
+        await message.answer(text)
+        return
+    if not products:
+        await message.answer(translations[lang]["import_empty"])
+        return
+
+    created, updated, replaced = await db_import_catalog(products, IMPORT_BATCH_SIZE, session=session)
+    for image in replaced:
+        run_after_commit(session, lambda image=image: schedule_release(image))
+    logger.info(f"Catalog import by {message.chat.id}: {created} created, {updated} updated")
+    await message.answer(translations[lang]["import_done"].format(created=created, updated=updated))
+
+
+@admin_router.message(IsAdmin(), ImportForm.document)
+async def process_import_other(message: Message):
+    lang = LANG.get(message.chat.id, "uz")
+    await message.answer(translations[lang]["import_prompt"])
+
+
+"""
+Sales statistics
+"""
+
+
+@admin_router.message(IsAdmin(), Command("stats"))
+async def stats_command(message: Message, command: CommandObject, session: AsyncSession):
+    lang = LANG.get(message.chat.id, "uz")
+    days = parse_report_range(command.args, await db_get_sales_today(session=session))
+    if days is None:
+        await message.answer(translations[lang]["stats_invalid_range"].format(max_days=STATS_MAX_DAYS))
+        return
+
+    report = await sales_report(*days, session=session)
+    await message.answer(stats_text(report, lang))
+
+
+"""
+Broadcast to all users
+"""
+
+
+@admin_router.message(IsAdmin(), Command("broadcast"))
+async def broadcast_command(message: Message, state: FSMContext):
+    """Start broadcast, the next message of the admin is the one to send"""
+    lang = LANG.get(message.chat.id, "uz")
+    await state.set_state(BroadcastForm.message)
+    await message.answer(translations[lang]["broadcast_enter_message"])
+
+
+@admin_router.message(IsAdmin(), BroadcastForm.message)
+async def process_broadcast_message(message: Message, state: FSMContext, session: AsyncSession):
+    lang = LANG.get(message.chat.id, "uz")
+    await state.update_data(message_id=message.message_id)
+    await state.set_state(BroadcastForm.confirm)
+    users = await db_count_users(session=session)
+    await message.reply(translations[lang]["broadcast_confirm"].format(users=users),
+                        reply_markup=generate_broadcast_confirm_keyboard(lang))
+
+
+@admin_router.callback_query(IsAdmin(), BroadcastForm.confirm, F.data == "broadcast_confirm")
+async def confirm_broadcast(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+    chat_id = callback.message.chat.id
+    lang = LANG.get(chat_id, "uz")
+    data = await state.get_data()
+    await state.clear()
+
+    campaign = await db_create_campaign(chat_id, data["message_id"], session=session)
+    # the engine reads the campaign in its own session, so start it only once the row is committed
+    run_after_commit(session, lambda: broadcast_engine.launch(campaign.id))
+    await callback.message.edit_text(translations[lang]["broadcast_started"].format(campaign_id=campaign.id))
+
+
+@admin_router.callback_query(IsAdmin(), F.data == "broadcast_cancel")
+async def cancel_broadcast(callback: CallbackQuery, state: FSMContext):
+    lang = LANG.get(callback.message.chat.id, "uz")
+    await state.clear()
+    await callback.message.edit_text(translations[lang]["broadcast_canceled"])
@@ -0,0 +1,111 @@
+"""EXPLAIN ANALYZE of the cart and catalog lookups with and without the indexes of migration 0003.
+
+Builds the tables in a scratch schema of the database configured in .env (Postgres only,
+the covering index uses INCLUDE), seeds them with generate_series, runs every query
+before and after creating the indexes and prints plans and timings. The schema is
+dropped at the end, the bot's own tables are not touched.
+
+    python bench/explain_indexes.py --users 50000 --lines 8 --products 2000 --categories 40
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.modules import Base  # noqa: E402
+from database.utils import get_database_url  # noqa: E402
+
+SCHEMA = "bench_explain_indexes"
+INDEXES = ("ix_finally_carts_cart_id_id", "ix_products_category_id_id", "ix_order_items_order_id")
+
+SEED = [
+    "INSERT INTO users (name, telegram, phone, lang) "
+    "SELECT 'user' || n, 1000000 + n, '+998900000000', 'en' FROM generate_series(1, :users) n",
+    "INSERT INTO carts (total_price, total_products, user_id) SELECT 0, 0, id FROM users",
+    "INSERT INTO categories (category_name) SELECT 'category' || n FROM generate_series(1, :categories) n",
+    "INSERT INTO products (product_name, description, image, price, category_id) "
+    "SELECT 'product' || n, 'description', 'media/product.jpg', 10 + n % 90, 1 + n % :categories "
+    "FROM generate_series(1, :products) n",
+    "INSERT INTO finally_carts (product_name, final_price, quantity, cart_id) "
+    "SELECT 'product' || (1 + (c.id * 7 + n) % :products), 25, 1 + n % 3, c.id "
+    "FROM carts c CROSS JOIN generate_series(1, :lines) n",
+    "ANALYZE",
+]
+
+QUERIES = {
+    "cart lines": "SELECT f.id, f.product_name, f.final_price, f.quantity, f.cart_id "
+                  "FROM finally_carts f JOIN carts c ON c.id = f.cart_id JOIN users u ON u.id = c.user_id "
+                  "WHERE u.telegram = :telegram ORDER BY f.id",
+    "cart total": "SELECT sum(f.final_price), sum(f.quantity) "
+                  "FROM finally_carts f JOIN carts c ON c.id = f.cart_id JOIN users u ON u.id = c.user_id "
+                  "WHERE u.telegram = :telegram",
+    "category page": "SELECT id, product_name, price FROM products "
+                     "WHERE category_id = :category_id AND id > :after_id ORDER BY id LIMIT 10",
+}
+
+
+async def explain(connection, params: dict, repeat: int) -> None:
+    for name, query in QUERIES.items():
+        plan = (await connection.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {query}"), params)).scalars().all()
+        started = time.perf_counter()
+        for _ in range(repeat):
+            await connection.execute(text(query), params)
+        elapsed = (time.perf_counter() - started) / repeat * 1000
+        print(f"--- {name}: {elapsed:.3f} ms per query over {repeat} runs")
+        print("\n".join(plan))
+
+
+async def run(args) -> None:
+    engine = create_async_engine(get_database_url())
+    params = {"telegram": 1000000 + args.users // 2, "category_id": 1, "after_id": args.products // 2}
+    try:
+        async with engine.connect() as connection:
+            await connection.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+            await connection.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+            await connection.execute(text(f"SET search_path TO {SCHEMA}"))
+            await connection.run_sync(Base.metadata.create_all)
+            for index in INDEXES:
+                await connection.execute(text(f"DROP INDEX {index}"))
+            for statement in SEED:
+                await connection.execute(text(statement), {"users": args.users, "lines": args.lines,
+                                                           "products": args.products,
+                                                           "categories": args.categories})
+            await connection.commit()
+
+            print("===== without indexes")
+            await explain(connection, params, args.repeat)
+
+            for table in Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    if index.name in INDEXES:
+                        await connection.run_sync(index.create)
+            await connection.execute(text("ANALYZE"))
+            await connection.commit()
+
+            print("===== with indexes")
+            await explain(connection, params, args.repeat)
+
+            await connection.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+            await connection.commit()
+    finally:
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--lines", type=int, default=8, help="cart lines per user")
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--categories", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=200, help="runs per query for the timing")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
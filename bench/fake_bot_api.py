@@ -0,0 +1,139 @@
+"""Local stand-in for the Telegram Bot API.
+
+Answers every method with a plausible result and enforces flood limits like Telegram
+does, with token buckets using the same defaults as the bot's SendScheduler. Only the
+methods the scheduler paces (new messages: send*, copy*, forward*) are limited, a chat or
+the whole bot sending those too fast gets 429 with retry_after. Edits, deletes and chat
+actions are always answered. Run the bot against it with
+TELEGRAM_API_URL=http://127.0.0.1:8081 and drive it with bench/webhook_load.py.
+Counters are printed every few seconds.
+
+    python bench/fake_bot_api.py --port 8081 --chat-rate 1 --global-rate 30
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import sys
+import time
+from collections import defaultdict
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from middlewares.send_scheduler import PACED_PREFIXES, UNPACED_METHODS  # noqa: E402
+
+MESSAGE_METHODS = {"sendmessage", "sendphoto", "sendinvoice", "editmessagemedia", "editmessagetext",
+                   "editmessagecaption", "editmessagereplymarkup"}
+PHOTO_METHODS = {"sendphoto", "editmessagemedia"}
+# the same rule as is_paced, method names arrive lowercased here
+PACED = tuple(prefix.lower() for prefix in PACED_PREFIXES)
+UNPACED = {name.lower() for name in UNPACED_METHODS}
+
+
+def is_paced(method: str) -> bool:
+    return method.startswith(PACED) and method not in UNPACED
+
+
+class FakeBotApi:
+    def __init__(self, chat_rate: float, chat_burst: float, group_rate: float, group_burst: float,
+                 global_rate: float, latency: float):
+        self.limits = {"chat": (chat_rate, chat_burst), "group": (group_rate, group_burst),
+                       "global": (global_rate, global_rate)}
+        self.latency = latency
+        self.message_ids = itertools.count(1)
+        self.buckets: dict[str, tuple[float, float]] = {}  # key -> (tokens, updated)
+        self.counters: dict[str, int] = defaultdict(int)
+
+    def _has_token(self, key: str, kind: str, now: float) -> bool:
+        rate, burst = self.limits[kind]
+        tokens, updated = self.buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        self.buckets[key] = (tokens, now)
+        return tokens >= 1
+
+    def _take(self, key: str) -> None:
+        tokens, updated = self.buckets[key]
+        self.buckets[key] = (tokens - 1, updated)
+
+    def _result(self, method: str, chat_id, token: str):
+        if method == "getme":
+            return {"id": int(token.split(":")[0]), "is_bot": True, "first_name": "FakeBot", "username": "fake_bot"}
+        if method not in MESSAGE_METHODS:
+            return True
+
+        chat_id = int(chat_id) if str(chat_id).lstrip("-").isdigit() else 0
+        message = {
+            "message_id": next(self.message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "group"},
+        }
+        if method in PHOTO_METHODS:
+            file_id = f"fake-file-{message['message_id']}"
+            message["photo"] = [{"file_id": file_id, "file_unique_id": file_id, "width": 800, "height": 600}]
+        return message
+
+    async def handle(self, request: web.Request) -> web.Response:
+        token = request.match_info["token"]
+        method = request.match_info["method"].lower()
+        params = await request.post() if request.can_read_body else {}
+        chat_id = params.get("chat_id")
+        now = time.monotonic()
+
+        if chat_id is not None and is_paced(method):
+            chat_key = f"chat:{chat_id}"
+            kind = "group" if str(chat_id).startswith(("-", "@")) else "chat"
+            if not (self._has_token(chat_key, kind, now) and self._has_token("global", "global", now)):
+                self.counters["429"] += 1
+                return web.json_response({"ok": False, "error_code": 429,
+                                          "description": "Too Many Requests: retry after 1",
+                                          "parameters": {"retry_after": 1}}, status=429)
+            self._take(chat_key)
+            self._take("global")
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.counters[method] += 1
+        return web.json_response({"ok": True, "result": self._result(method, chat_id, token)})
+
+    async def report(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            print(dict(self.counters), flush=True)
+
+
+async def run(host: str, port: int, api: FakeBotApi) -> None:
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", api.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    print(f"Fake Bot API on http://{host}:{port}", flush=True)
+    try:
+        await api.report(5)
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--chat-rate", type=float, default=1, help="messages per second per private chat")
+    parser.add_argument("--chat-burst", type=float, default=3)
+    parser.add_argument("--group-rate", type=float, default=20 / 60, help="messages per second per group")
+    parser.add_argument("--group-burst", type=float, default=5)
+    parser.add_argument("--global-rate", type=float, default=30, help="messages per second for the bot")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds added to every response")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args.host, args.port,
+                        FakeBotApi(args.chat_rate, args.chat_burst, args.group_rate, args.group_burst,
+                                   args.global_rate, args.latency)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+"""Replay synthetic customer sessions through the bot's Dispatcher.
+
+Imports dp from main.py and feeds it Update objects in-process. The Bot API is replaced
+by FakeSession, which answers every method with a plausible result and remembers the
+inline keyboards it was asked to send. Journeys click the buttons they were shown, so
+the cart line ids, product ids and so on are real. The database is the one configured
+in .env. It must be Postgres with `alembic upgrade head` applied; the queries use
+Postgres-only SQL.
+
+Users get telegram ids from --chat-base upwards. They and their carts and orders are
+deleted at the end, together with a catalog seeded when the database had none, and the
+sales aggregates of the days they ordered on are rebuilt without them.
+
+Prints throughput and, per handler, latency percentiles and SQL statements per update.
+
+    python bench/load_test.py --users 2000 --concurrency 200
+    python bench/load_test.py --users 500 --concurrency 50 --paced   # through the send scheduler
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import time
+from collections import defaultdict
+from typing import Any, AsyncGenerator, Optional
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import GetMe, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import InlineKeyboardMarkup, Update
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main as bot_main  # noqa: E402
+from database.cache import catalog_cache  # noqa: E402
+from database.utils import (db_add_category, db_add_product, db_ensure_catalog, db_rebuild_sales,  # noqa: E402
+                            get_db_session, SALES_TIMEZONE)
+from middlewares.db import CommitBeforeRequestMiddleware  # noqa: E402
+from middlewares.send_scheduler import send_scheduler  # noqa: E402
+from storage import close_storage  # noqa: E402
+from translation import translations  # noqa: E402
+from utils.i18n import LANGUAGE_BUTTONS, MAKE_AN_ORDER  # noqa: E402
+from utils.metrics import UpdateStats, current_update  # noqa: E402
+
+SEED_PREFIX = "lt_"
+LANGUAGE_TEXTS = {lang: text for text, lang in LANGUAGE_BUTTONS.items()}
+
+# (kind, argument): text message, shared contact, reply keyboard key in user's language,
+# or a click on an inline button of the last keyboard whose callback_data matches
+JOURNEY = [
+    ("text", "/start"),
+    ("language", None),
+    ("contact", None),
+    ("menu", MAKE_AN_ORDER),
+    ("click", r"category_\d+$"),
+    ("click", r"product_\d+$"),
+    ("click", r"action \+ "),
+    ("click", r"action \+ "),
+    ("click", r"action - "),
+    ("click", r"add_to_cart "),
+    ("click", r"category_\d+$"),
+    ("click", r"product_\d+$"),
+    ("click", r"add_to_cart "),
+    ("click", r"your_cart$"),
+    ("click", r"add_\d+$"),
+    ("click", r"minus_\d+$"),
+    ("click", r"purchase$"),
+]
+
+
+class FakeSession(BaseSession):
+    """Bot API stand-in answering from memory, keeps the last inline keyboard of every chat"""
+
+    def __init__(self):
+        super().__init__()
+        self.message_ids = itertools.count(1)
+        self.keyboards: dict[int, tuple[int, InlineKeyboardMarkup]] = {}
+        self.requests: dict[str, int] = defaultdict(int)
+
+    def _result(self, bot: Bot, method: TelegramMethod) -> Any:
+        if isinstance(method, GetMe):
+            return {"id": bot.id, "is_bot": True, "first_name": "LoadTest", "username": "load_test_bot"}
+
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None or method.__returning__ is bool:
+            return True
+
+        message_id = getattr(method, "message_id", None) or next(self.message_ids)
+        markup = getattr(method, "reply_markup", None)
+        if isinstance(markup, InlineKeyboardMarkup):
+            self.keyboards[chat_id] = (message_id, markup)
+
+        message = {"message_id": message_id, "date": int(time.time()),
+                   "chat": {"id": chat_id, "type": "private"}}
+        if type(method).__name__ in ("SendPhoto", "EditMessageMedia"):
+            file_id = f"load-test-{message_id}"
+            message["photo"] = [{"file_id": file_id, "file_unique_id": file_id, "width": 800, "height": 600}]
+        return message
+
+    async def make_request(self, bot: Bot, method: TelegramMethod[TelegramType],
+                           timeout: Optional[int] = None) -> TelegramType:
+        self.requests[method.__api_method__] += 1
+        content = json.dumps({"ok": True, "result": self._result(bot, method)}, default=str)
+        return self.check_response(bot=bot, method=method, status_code=200, content=content).result
+
+    async def stream_content(self, url: str, headers: Optional[dict[str, Any]] = None, timeout: int = 30,
+                             chunk_size: int = 65536, raise_for_status: bool = True) -> AsyncGenerator[bytes, None]:
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+
+class LoadTest:
+    def __init__(self, session: FakeSession, chat_base: int, think_time: float):
+        self.session = session
+        self.chat_base = chat_base
+        self.think_time = think_time
+        self.update_ids = itertools.count(1)
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.queries: dict[str, list[int]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.skipped = 0
+
+    def _user(self, chat_id: int) -> dict:
+        return {"id": chat_id, "is_bot": False, "first_name": f"Load{chat_id}", "language_code": "en"}
+
+    def _message(self, chat_id: int, **fields) -> dict:
+        update_id = next(self.update_ids)
+        return {"update_id": update_id,
+                "message": {"message_id": update_id, "date": int(time.time()),
+                            "chat": {"id": chat_id, "type": "private"}, "from": self._user(chat_id), **fields}}
+
+    def _click(self, chat_id: int, pattern: str) -> Optional[dict]:
+        message_id, markup = self.session.keyboards.get(chat_id, (None, None))
+        buttons = [button for row in markup.inline_keyboard for button in row
+                   if button.callback_data and re.match(pattern, button.callback_data)] if markup else []
+        if not buttons:
+            return None
+
+        update_id = next(self.update_ids)
+        return {"update_id": update_id,
+                "callback_query": {"id": str(update_id), "from": self._user(chat_id), "chat_instance": str(chat_id),
+                                   "data": random.choice(buttons).callback_data,
+                                   "message": {"message_id": message_id, "date": int(time.time()),
+                                               "chat": {"id": chat_id, "type": "private"}}}}
+
+    def _build(self, chat_id: int, lang: str, kind: str, argument: Optional[str]) -> Optional[dict]:
+        if kind == "text":
+            return self._message(chat_id, text=argument)
+        if kind == "language":
+            return self._message(chat_id, text=LANGUAGE_TEXTS[lang])
+        if kind == "contact":
+            return self._message(chat_id, contact={"phone_number": f"+{chat_id}", "first_name": f"Load{chat_id}",
+                                                   "user_id": chat_id})
+        if kind == "menu":
+            return self._message(chat_id, text=translations[lang][argument])
+        return self._click(chat_id, argument)
+
+    async def _feed(self, bot: Bot, data: dict) -> None:
+        stats = UpdateStats()
+        token = current_update.set(stats)
+        started = time.perf_counter()
+        try:
+            await bot_main.dp.feed_update(bot, Update.model_validate(data, context={"bot": bot}))
+        except Exception:
+            self.errors[stats.handler] += 1
+        finally:
+            self.latencies[stats.handler].append(time.perf_counter() - started)
+            self.queries[stats.handler].append(stats.queries)
+            current_update.reset(token)
+
+    async def journey(self, bot: Bot, user: int) -> None:
+        chat_id = self.chat_base + user
+        lang = random.choice(list(LANGUAGE_TEXTS))
+        for kind, argument in JOURNEY:
+            data = self._build(chat_id, lang, kind, argument)
+            if data is None:
+                self.skipped += 1
+                continue
+            await self._feed(bot, data)
+            if self.think_time:
+                await asyncio.sleep(random.uniform(0, self.think_time))
+
+    def report(self, elapsed: float) -> None:
+        total = sum(len(values) for values in self.latencies.values())
+        print(f"{total} updates in {elapsed:.1f}s, {total / elapsed:.0f} updates/s, "
+              f"{sum(self.errors.values())} errors, {self.skipped} steps skipped (button not shown)")
+        print(f"{'handler':<40}{'count':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'sql/upd':>9}{'errors':>8}")
+        rows = []
+        for handler, values in self.latencies.items():
+            cuts = statistics.quantiles(values, n=100, method="inclusive") if len(values) > 1 else values * 99
+            rows.append((cuts[98], handler, len(values), cuts[49], cuts[94], max(values),
+                         statistics.fmean(self.queries[handler]), self.errors.get(handler, 0)))
+        for p99, handler, count, p50, p95, worst, queries, errors in sorted(rows, reverse=True):
+            print(f"{handler:<40}{count:>7}{p50 * 1000:>9.1f}{p95 * 1000:>9.1f}{p99 * 1000:>9.1f}"
+                  f"{worst * 1000:>9.1f}{queries:>9.1f}{errors:>8}")
+        print(f"Bot API requests: {dict(self.session.requests)}")
+
+
+async def seed_catalog(categories: int, products: int) -> bool:
+    """Add a small catalog when the database has none, returns True if it did"""
+    await db_ensure_catalog()
+    if catalog_cache.categories():
+        return False
+
+    for category in range(1, categories + 1):
+        await db_add_category(f"{SEED_PREFIX}category_{category}")
+    await db_ensure_catalog()
+    for category in catalog_cache.categories():
+        for product in range(1, products + 1):
+            await db_add_product(category.id, f"{SEED_PREFIX}{category.id}_{product}", "Load test product",
+                                 random.randint(10, 90) * 1000, "media/load_test.jpg",
+                                 image_file_id=f"{SEED_PREFIX}photo")
+    await db_ensure_catalog()
+    return True
+
+
+async def cleanup(chat_base: int, users: int, seeded: bool) -> None:
+    params = {"low": chat_base, "high": chat_base + users}
+    user_ids = "SELECT id FROM users WHERE telegram >= :low AND telegram < :high"
+    async with get_db_session() as session:
+        days = (await session.execute(text(
+            "SELECT min(timezone(:zone, created_at))::date, max(timezone(:zone, created_at))::date "
+            f"FROM orders WHERE user_id IN ({user_ids})"
+        ), {**params, "zone": SALES_TIMEZONE})).one()
+        await session.execute(text(f"DELETE FROM orders WHERE user_id IN ({user_ids})"), params)
+        await session.execute(text(f"DELETE FROM finally_carts WHERE cart_id IN "
+                                   f"(SELECT id FROM carts WHERE user_id IN ({user_ids}))"), params)
+        await session.execute(text(f"DELETE FROM carts WHERE user_id IN ({user_ids})"), params)
+        await session.execute(text("DELETE FROM users WHERE telegram >= :low AND telegram < :high"), params)
+        if seeded:
+            await session.execute(text("DELETE FROM products WHERE product_name LIKE :prefix"),
+                                  {"prefix": f"{SEED_PREFIX}%"})
+            await session.execute(text("DELETE FROM categories WHERE category_name LIKE :prefix"),
+                                  {"prefix": f"{SEED_PREFIX}%"})
+    # the checkouts of the journeys went into the daily sales aggregates too
+    if days[0] is not None:
+        await db_rebuild_sales(*days)
+
+
+async def run(args) -> None:
+    session = FakeSession()
+    session.middleware(CommitBeforeRequestMiddleware())
+    if args.paced:
+        session.middleware(send_scheduler)
+    bot_main.bot.session = session
+
+    seeded = await seed_catalog(args.categories, args.products)
+    test = LoadTest(session, args.chat_base, args.think_time)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def user_session(user: int) -> None:
+        async with semaphore:
+            await test.journey(bot_main.bot, user)
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(user_session(user) for user in range(args.users)))
+        test.report(time.perf_counter() - started)
+    finally:
+        await close_storage()
+        await send_scheduler.close()
+        if not args.keep:
+            await cleanup(args.chat_base, args.users, seeded)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000, help="simulated customers, one journey each")
+    parser.add_argument("--concurrency", type=int, default=100, help="journeys running at once")
+    parser.add_argument("--think-time", type=float, default=0, help="max random pause between steps, seconds")
+    parser.add_argument("--chat-base", type=int, default=8_000_000_000, help="first telegram id of the users")
+    parser.add_argument("--categories", type=int, default=5, help="categories to seed into an empty catalog")
+    parser.add_argument("--products", type=int, default=8, help="products per seeded category")
+    parser.add_argument("--paced", action="store_true", help="send through the flood-limit scheduler")
+    parser.add_argument("--keep", action="store_true", help="keep the users, carts and orders")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
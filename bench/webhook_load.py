@@ -0,0 +1,107 @@
+"""Load driver for webhook mode.
+
+POSTs synthetic Telegram Update JSON to a running bot (BOT_MODE=webhook) and prints
+throughput and latency percentiles of the webhook endpoint. No Telegram involved.
+
+    python bench/webhook_load.py --url http://127.0.0.1:8080/webhook --requests 5000 --concurrency 200
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import statistics
+import time
+
+from aiohttp import ClientSession, TCPConnector
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+MESSAGE_TEXTS = ["/start", "✅ Make an order", "📄 History", "🛠️Settings", "📝Main menu"]
+CALLBACK_DATA = ["return_to_category", "your_cart", "category_1", "product_1"]
+
+
+def make_message_update(update_id: int, chat_id: int, text: str) -> dict:
+    user = {"id": chat_id, "is_bot": False, "first_name": f"Load{chat_id}", "language_code": "en"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": user["first_name"]},
+            "from": user,
+            "text": text,
+        },
+    }
+
+
+def make_callback_update(update_id: int, chat_id: int, data: str) -> dict:
+    user = {"id": chat_id, "is_bot": False, "first_name": f"Load{chat_id}", "language_code": "en"}
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": user,
+            "chat_instance": str(chat_id),
+            "data": data,
+            "message": {
+                "message_id": update_id - 1,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private", "first_name": user["first_name"]},
+                "text": "menu",
+            },
+        },
+    }
+
+
+def make_update(update_id: int, chats: int) -> dict:
+    chat_id = 10_000_000 + random.randrange(chats)
+    if random.random() < 0.5:
+        return make_message_update(update_id, chat_id, random.choice(MESSAGE_TEXTS))
+    return make_callback_update(update_id, chat_id, random.choice(CALLBACK_DATA))
+
+
+async def run(url: str, total: int, concurrency: int, chats: int, secret: str) -> None:
+    headers = {"Content-Type": "application/json"}
+    if secret:
+        headers[SECRET_HEADER] = secret
+
+    update_ids = itertools.count(1)
+    latencies: list[float] = []
+    statuses: dict[int, int] = {}
+
+    async def worker(session: ClientSession, count: int):
+        for _ in range(count):
+            body = json.dumps(make_update(next(update_ids), chats))
+            started = time.perf_counter()
+            async with session.post(url, data=body, headers=headers) as response:
+                await response.read()
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status] = statuses.get(response.status, 0) + 1
+
+    per_worker, rest = divmod(total, concurrency)
+    started = time.perf_counter()
+    async with ClientSession(connector=TCPConnector(limit=concurrency)) as session:
+        await asyncio.gather(*(worker(session, per_worker + (1 if i < rest else 0)) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(f"requests:   {len(latencies)} in {elapsed:.2f}s ({len(latencies) / elapsed:.0f} req/s)")
+    print(f"statuses:   {statuses}")
+    print(f"latency ms: p50={quantiles[49] * 1000:.1f} p90={quantiles[89] * 1000:.1f} "
+          f"p99={quantiles[98] * 1000:.1f} max={max(latencies) * 1000:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8080/webhook")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--chats", type=int, default=500, help="number of distinct simulated chats")
+    parser.add_argument("--secret", default="", help="value of WEBHOOK_SECRET")
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.requests, args.concurrency, args.chats, args.secret))
+
+
+if __name__ == '__main__':
+    main()
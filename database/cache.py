@@ -0,0 +1,226 @@
+import asyncio
+import logging
+import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from dataclasses import replace
+from os import getenv
+from typing import Awaitable, Callable, Optional
+
+from dotenv import load_dotenv
+
+from .dto import CategoryRow, ProductRow, Page
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CATALOG_CACHE_TTL = float(getenv('CATALOG_CACHE_TTL', '300'))
+HISTORY_CACHE_TTL = float(getenv('HISTORY_CACHE_TTL', '300'))
+HISTORY_CACHE_USERS = int(getenv('HISTORY_CACHE_USERS', '1024'))
+
+
+class CatalogCache:
+    """In-process copy of categories and products.
+
+    The catalog only changes through admin commands, so the whole table pair is loaded once
+    and afterwards kept in sync by the db_* write functions. TTL is just a safety net for
+    changes made outside of the bot (e.g. by hand in pgAdmin).
+    Returned rows are shared between handlers and must be treated as read-only.
+    """
+
+    def __init__(self, ttl: float = CATALOG_CACHE_TTL):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.version = 0
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self._categories: dict[int, CategoryRow] = {}
+        self._products: dict[int, ProductRow] = {}
+        self._products_by_name: dict[str, ProductRow] = {}
+        self._products_by_category: dict[int, list[ProductRow]] = {}
+        self._sorted_categories: list[CategoryRow] = []
+        self._category_ids: list[int] = []
+        self._product_ids_by_category: dict[int, list[int]] = {}
+
+    def is_fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    async def ensure(self, loader: Callable[[], Awaitable[tuple[list[CategoryRow], list[ProductRow]]]]) -> None:
+        """Count a lookup and (re)load the catalog with loader() when it is missing or expired"""
+        if self.is_fresh():
+            self.hits += 1
+            return
+
+        self.misses += 1
+        async with self._lock:
+            if not self.is_fresh():
+                categories, products = await loader()
+                self.load(categories, products)
+
+    def load(self, categories: list[CategoryRow], products: list[ProductRow]) -> None:
+        self._categories = {category.id: category for category in categories}
+        self._products = {product.id: product for product in products}
+        self._reindex()
+        self._loaded_at = time.monotonic()
+        logger.info(f"Catalog cache loaded: {len(self._categories)} categories, {len(self._products)} products")
+
+    def invalidate(self) -> None:
+        """Drop everything, next lookup reloads from database"""
+        self._loaded_at = None
+        self.version += 1
+
+    def _reindex(self) -> None:
+        self._products_by_name = {product.product_name: product for product in self._products.values()}
+        self._products_by_category = {category_id: [] for category_id in self._categories}
+        for product_id in sorted(self._products):
+            product = self._products[product_id]
+            self._products_by_category.setdefault(product.category_id, []).append(product)
+        self._sorted_categories = [self._categories[category_id] for category_id in sorted(self._categories)]
+        self._category_ids = [category.id for category in self._sorted_categories]
+        self._product_ids_by_category = {category_id: [product.id for product in products]
+                                         for category_id, products in self._products_by_category.items()}
+        self.version += 1
+
+    """
+    Lookups
+    """
+
+    def categories(self) -> list[CategoryRow]:
+        return list(self._sorted_categories)
+
+    def category(self, category_id: int) -> Optional[CategoryRow]:
+        return self._categories.get(category_id)
+
+    def product(self, product_id: int) -> Optional[ProductRow]:
+        return self._products.get(product_id)
+
+    def product_by_name(self, product_name: str) -> Optional[ProductRow]:
+        return self._products_by_name.get(product_name)
+
+    def products_by_category(self, category_id: int) -> list[ProductRow]:
+        return list(self._products_by_category.get(category_id, ()))
+
+    def categories_page(self, size: int, after_id: Optional[int] = None, before_id: Optional[int] = None) -> Page:
+        return _keyset_page(self._sorted_categories, self._category_ids, size, after_id, before_id)
+
+    def products_page(self, category_id: int, size: int, after_id: Optional[int] = None,
+                      before_id: Optional[int] = None) -> Page:
+        return _keyset_page(self._products_by_category.get(category_id, []),
+                            self._product_ids_by_category.get(category_id, []), size, after_id, before_id)
+
+    """
+    Write-through updates, called after the admin transaction commits
+    """
+
+    def put_category(self, category: CategoryRow) -> None:
+        if self._loaded_at is None:
+            return
+        self._categories[category.id] = category
+        self._reindex()
+
+    def drop_category(self, category_id: int) -> None:
+        if self._loaded_at is None:
+            return
+        self._categories.pop(category_id, None)
+        self._products = {product_id: product for product_id, product in self._products.items()
+                          if product.category_id != category_id}
+        self._reindex()
+
+    def put_product(self, product: ProductRow) -> None:
+        if self._loaded_at is None:
+            return
+        self._products[product.id] = product
+        self._reindex()
+
+    def drop_product(self, product_id: int) -> None:
+        if self._loaded_at is None:
+            return
+        self._products.pop(product_id, None)
+        self._reindex()
+
+    def set_product_file_id(self, product_id: int, image: str, file_id: Optional[str]) -> None:
+        """Swap in a copy of the row with the new file_id of image, rows already handed out stay
+        as they were. file_id is not shown anywhere in keyboards, so no version bump is needed"""
+        product = self._products.get(product_id)
+        if product is None or product.image != image:
+            return
+        product = replace(product, image_file_id=file_id)
+        self._products[product_id] = product
+        self._products_by_name[product.product_name] = product
+        if (siblings := self._products_by_category.get(product.category_id)) is not None:
+            self._products_by_category[product.category_id] = [product if sibling.id == product_id else sibling
+                                                               for sibling in siblings]
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "version": self.version,
+            "categories": len(self._categories),
+            "products": len(self._products),
+        }
+
+
+def _keyset_page(rows: list, ids: list[int], size: int, after_id: Optional[int], before_id: Optional[int]) -> Page:
+    """Page of rows sorted by id, found by binary search on the id instead of an offset"""
+    if before_id is not None:
+        end = bisect_left(ids, before_id)
+        start = max(end - size, 0)
+    else:
+        start = bisect_right(ids, after_id) if after_id is not None else 0
+        end = start + size
+    return Page(rows[start:end], start > 0, end < len(rows))
+
+
+PageKey = tuple[Optional[int], Optional[int]]
+
+
+class OrderHistoryCache:
+    """Order history pages of recently active users.
+
+    A user's orders only change at checkout, which drops that user's pages once committed.
+    The TTL covers checkouts made through another bot replica. Least recently used users
+    are evicted beyond max_users.
+    """
+
+    def __init__(self, ttl: float = HISTORY_CACHE_TTL, max_users: int = HISTORY_CACHE_USERS):
+        self.ttl = ttl
+        self.max_users = max_users
+        self.hits = 0
+        self.misses = 0
+        self._users: OrderedDict[int, tuple[float, dict[PageKey, Page]]] = OrderedDict()
+
+    def get(self, chat_id: int, key: PageKey) -> Optional[Page]:
+        entry = self._users.get(chat_id)
+        if entry is None or time.monotonic() - entry[0] >= self.ttl or key not in entry[1]:
+            self.misses += 1
+            return None
+
+        self._users.move_to_end(chat_id)
+        self.hits += 1
+        return entry[1][key]
+
+    def put(self, chat_id: int, key: PageKey, page: Page) -> None:
+        entry = self._users.get(chat_id)
+        if entry is None or time.monotonic() - entry[0] >= self.ttl:
+            entry = self._users[chat_id] = (time.monotonic(), {})
+        entry[1][key] = page
+        self._users.move_to_end(chat_id)
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+
+    def invalidate(self, chat_id: int) -> None:
+        self._users.pop(chat_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "users": len(self._users),
+        }
+
+
+catalog_cache = CatalogCache()
+order_history_cache = OrderHistoryCache()
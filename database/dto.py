@@ -0,0 +1,110 @@
+from dataclasses import dataclass, fields
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Optional
+
+
+@dataclass(slots=True)
+class UserRow:
+    id: int
+    name: str
+    telegram: int
+    phone: Optional[str]
+    lang: Optional[str]
+
+
+@dataclass(slots=True)
+class CartRow:
+    id: int
+    total_price: Decimal
+    total_products: int
+    user_id: int
+
+
+@dataclass(slots=True)
+class CartLineRow:
+    id: int
+    product_name: str
+    final_price: Decimal
+    quantity: int
+    cart_id: int
+
+
+@dataclass(slots=True)
+class CategoryRow:
+    id: int
+    category_name: str
+
+
+@dataclass(slots=True)
+class ProductRow:
+    id: int
+    product_name: str
+    description: str
+    image: str
+    image_file_id: Optional[str]
+    price: Decimal
+    category_id: int
+
+
+@dataclass(slots=True)
+class OrderRow:
+    id: int
+    user_id: int
+    idempotency_key: str
+    total_price: Decimal
+    total_products: int
+    status: str
+    created_at: datetime
+
+
+@dataclass(slots=True)
+class OrderItemRow:
+    id: int
+    order_id: int
+    product_id: Optional[int]
+    product_name: str
+    quantity: int
+    final_price: Decimal
+
+
+@dataclass(slots=True)
+class DailySalesRow:
+    day: date
+    orders: int
+    revenue: Decimal
+    products: int
+
+
+@dataclass(slots=True)
+class ProductSalesRow:
+    day: date
+    product_name: str
+    category_id: Optional[int]
+    quantity: int
+    revenue: Decimal
+
+
+@dataclass(slots=True)
+class CampaignRow:
+    id: int
+    from_chat_id: int
+    message_id: int
+    status: str
+    last_user_id: int
+    sent: int
+    failed: int
+    blocked: int
+
+
+@dataclass(slots=True)
+class Page:
+    """One keyset page, rows in id order"""
+    rows: list
+    has_prev: bool
+    has_next: bool
+
+
+def columns_of(row_type, model) -> tuple:
+    """Columns of model in field order of row_type, so select(*columns) rows map with row_type(*row)"""
+    return tuple(getattr(model, field.name) for field in fields(row_type))
@@ -1,8 +1,9 @@
+from datetime import date, datetime
 from os import getenv
 
 from sqlalchemy.orm import DeclarativeBase, Mapped, relationship, Session
 from sqlalchemy.orm import mapped_column
-from sqlalchemy import String, Integer, BigInteger, DECIMAL, ForeignKey, UniqueConstraint
+from sqlalchemy import String, Integer, BigInteger, DECIMAL, ForeignKey, UniqueConstraint, JSON, DateTime, Date, func, Index
 from sqlalchemy import create_engine
 from dotenv import load_dotenv
 
@@ -54,7 +55,12 @@ class Finally_carts(Base):
     cart_id: Mapped[int] = mapped_column(ForeignKey('carts.id'))
     user_cart: Mapped[Carts] = relationship(back_populates='finally_id')
 
-    __table_args__ = (UniqueConstraint('cart_id', 'product_name'),)
+    __table_args__ = (
+        UniqueConstraint('cart_id', 'product_name'),
+        # cart view and price sum read only these columns, in line order: index-only scan
+        Index('ix_finally_carts_cart_id_id', 'cart_id', 'id',
+              postgresql_include=['product_name', 'final_price', 'quantity']),
+    )
 
     def __str__(self):
         return str(self.id)
@@ -79,11 +85,120 @@ class Products(Base):
     product_name: Mapped[str] = mapped_column(String(30), unique=True)
     description: Mapped[str]
     image: Mapped[str]
+    image_file_id: Mapped[str] = mapped_column(String(255), nullable=True)
     price: Mapped[DECIMAL] = mapped_column(DECIMAL(12, 2))
     category_id: Mapped[int] = mapped_column(ForeignKey("categories.id"))
 
     product_category: Mapped[Categories] = relationship('Categories', back_populates='products')
 
+    # products of a category in id order, also the keyset of the paginated menus
+    __table_args__ = (Index('ix_products_category_id_id', 'category_id', 'id'),)
+
     def __str__(self):
         return self.product_name
 
+
+class FsmStates(Base):
+    """aiogram FSM state and data, shared between bot replicas"""
+    __tablename__ = "fsm_states"
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    state: Mapped[str] = mapped_column(String(255), nullable=True)
+    data: Mapped[dict] = mapped_column(JSON, default=dict)
+
+    def __str__(self):
+        return self.key
+
+
+class Orders(Base):
+    """Checked out carts, the cart lines are copied to order_items"""
+    __tablename__ = "orders"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey('users.id'))
+    idempotency_key: Mapped[str] = mapped_column(String(64), unique=True)
+    total_price: Mapped[DECIMAL] = mapped_column(DECIMAL(12, 2), default=0)
+    total_products: Mapped[int] = mapped_column(default=0)
+    status: Mapped[str] = mapped_column(String(20), default='new')
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+    items: Mapped[list['OrderItems']] = relationship('OrderItems', back_populates='order')
+
+    # order history of a user, newest first, keyset on (created_at, id);
+    # orders not reported to the manager yet, a handful of rows whatever the number of orders
+    __table_args__ = (Index('ix_orders_user_id_created_at_id', 'user_id', 'created_at', 'id'),
+                      Index('ix_orders_status_new', 'id', postgresql_where=status == 'new'))
+
+    def __str__(self):
+        return str(self.id)
+
+
+class OrderItems(Base):
+    """Snapshot of a cart line at checkout, kept when the product changes or is deleted"""
+    __tablename__ = "order_items"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    order_id: Mapped[int] = mapped_column(ForeignKey('orders.id', ondelete='CASCADE'), index=True)
+    product_id: Mapped[int] = mapped_column(ForeignKey('products.id', ondelete='SET NULL'), nullable=True)
+    product_name: Mapped[str] = mapped_column(String(50))
+    quantity: Mapped[int]
+    final_price: Mapped[DECIMAL] = mapped_column(DECIMAL(12, 2))
+
+    order: Mapped[Orders] = relationship(back_populates='items')
+
+    def __str__(self):
+        return str(self.id)
+
+
+class DailySales(Base):
+    """Orders, revenue and sold products per day, added to by every checkout"""
+    __tablename__ = "daily_sales"
+    day: Mapped[date] = mapped_column(Date, primary_key=True)  # in SALES_TIMEZONE
+    orders: Mapped[int] = mapped_column(default=0)
+    revenue: Mapped[DECIMAL] = mapped_column(DECIMAL(14, 2), default=0)
+    products: Mapped[int] = mapped_column(default=0)
+
+    def __str__(self):
+        return str(self.day)
+
+
+class DailyProductSales(Base):
+    """Sold quantity and revenue per day and product, added to by every checkout.
+
+    Keyed by the product name of the order items, like them it outlives the product. No
+    foreign keys, deleting a product or category must not scan the aggregates.
+    """
+    __tablename__ = "daily_product_sales"
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    product_name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    category_id: Mapped[int] = mapped_column(nullable=True)  # of the product when sold
+    quantity: Mapped[int] = mapped_column(default=0)
+    revenue: Mapped[DECIMAL] = mapped_column(DECIMAL(14, 2), default=0)
+
+    def __str__(self):
+        return f"{self.day} {self.product_name}"
+
+
+class Campaigns(Base):
+    """Broadcast of one admin message to every user, copied with copyMessage"""
+    __tablename__ = "campaigns"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    from_chat_id: Mapped[int] = mapped_column(BigInteger)
+    message_id: Mapped[int]
+    status: Mapped[str] = mapped_column(String(20), default='running')
+    last_user_id: Mapped[int] = mapped_column(default=0)  # keyset checkpoint, users up to it are done
+    sent: Mapped[int] = mapped_column(default=0)
+    failed: Mapped[int] = mapped_column(default=0)
+    blocked: Mapped[int] = mapped_column(default=0)
+    lease_until: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+    def __str__(self):
+        return str(self.id)
+
+
+class CampaignDeliveries(Base):
+    """Outcome of a campaign for one user"""
+    __tablename__ = "campaign_deliveries"
+    campaign_id: Mapped[int] = mapped_column(ForeignKey('campaigns.id', ondelete='CASCADE'), primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    status: Mapped[str] = mapped_column(String(20))  # sent | failed | blocked
+    error: Mapped[str] = mapped_column(String(255), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
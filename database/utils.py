@@ -1,89 +1,121 @@
 import logging
-from contextlib import contextmanager
+from contextlib import asynccontextmanager
+from datetime import date, timedelta
 from functools import wraps
 from os import getenv
-from sqlite3 import OperationalError
-from typing import Iterable, Type, Optional
+from typing import AsyncIterator, Iterable, Optional
 
 from dotenv import load_dotenv
-from sqlalchemy.orm import Session, sessionmaker
-from sqlalchemy import update, delete, select, DECIMAL, create_engine, Engine, QueuePool
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import update, delete, select, event, func, literal, literal_column, case, or_, tuple_, cast, \
+    Date, DECIMAL
 from sqlalchemy.sql.functions import sum
-from sqlalchemy.exc import IntegrityError, DisconnectionError
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError, DisconnectionError, OperationalError, SQLAlchemyError
 
-from .modules import Users, Categories, Carts, Finally_carts, Products
+from .cache import catalog_cache, order_history_cache
+from .dto import UserRow, CartRow, CartLineRow, CategoryRow, ProductRow, OrderRow, OrderItemRow, CampaignRow, Page, \
+    DailySalesRow, ProductSalesRow, columns_of
+from .modules import Users, Categories, Carts, Finally_carts, Products, FsmStates, Orders, OrderItems, \
+    Campaigns, CampaignDeliveries, DailySales, DailyProductSales
 
 load_dotenv()
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 DB_USER = getenv('DB_USER')
 DB_PASSWORD = getenv('DB_PASSWORD')
 DB_ADDRESS = getenv('DB_HOST')
 DB_NAME = getenv('DB_NAME')
+SALES_TIMEZONE = getenv('SALES_TIMEZONE', 'Asia/Tashkent')  # sales aggregates are kept per day of this zone
 
 
-def get_db_engine() -> Engine:
-    """Create and return a SQLAlchemy engine with connection string"""
-    connection_string = f'postgresql://{DB_USER}:{DB_PASSWORD}@{DB_ADDRESS}/{DB_NAME}'
-    engine = create_engine(
-        connection_string,
-        poolclass=QueuePool,
+def get_database_url() -> str:
+    """Connection string for the psycopg 3 driver, shared with the migrations"""
+    return f'postgresql+psycopg://{DB_USER}:{DB_PASSWORD}@{DB_ADDRESS}/{DB_NAME}'
+
+
+def get_db_engine() -> AsyncEngine:
+    """Create and return an async SQLAlchemy engine (psycopg 3 driver) with connection string.
+
+    SQL is not echoed, SQL_ECHO=1 turns statement logging on through utils.log.
+    """
+    engine = create_async_engine(
+        get_database_url(),
         pool_size=5,
         max_overflow=10,
         pool_timeout=30,
         pool_recycle=300,
-        pool_pre_ping=True,
-        echo=True
+        pool_pre_ping=True
     )
     return engine
 
 
 # Initialize engine and session factory
 engine = get_db_engine()
-SessionFactory = sessionmaker(bind=engine)
+SessionFactory = async_sessionmaker(bind=engine, expire_on_commit=False)
 
 
-@contextmanager
-def get_db_session():
-    """context manager for database sessions"""
+@asynccontextmanager
+async def get_db_session():
+    """async context manager for database sessions, errors raised inside roll the transaction back.
+
+    DbSessionMiddleware runs whole handlers in it, only database errors are logged here,
+    everything else is left to whoever handles the exception.
+    """
     session = SessionFactory()
     try:
         yield session
-        session.commit()
-    except Exception as e:
+        await session.commit()
+    except SQLAlchemyError as e:
         logger.error(f"Database error: {e}")
-        session.rollback()
+        await session.rollback()
+        raise
+    except Exception:
+        await session.rollback()
         raise
     finally:
-        session.close()
+        await session.close()
+
+
+def run_after_commit(session: AsyncSession, callback) -> None:
+    """Call callback() once the session's transaction is committed, skip it on rollback"""
+    session.info.setdefault("after_commit", []).append(callback)
+
+
+@event.listens_for(Session, "after_commit")
+def _run_after_commit_callbacks(session: Session):
+    for callback in session.info.pop("after_commit", []):
+        callback()
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_after_commit_callbacks(session: Session, previous_transaction):
+    # a rolled back SAVEPOINT leaves the outer transaction and its callbacks alive
+    if not previous_transaction.nested:
+        session.info.pop("after_commit", None)
 
 
 def db_session_handler(func):
-    """decorator to handle database sessions and retries"""
+    """decorator to handle async database sessions and retries.
+
+    When the caller passes session= (the per-update session of DbSessionMiddleware) the
+    function joins that transaction: no own commit and no retries, the owner commits once.
+    """
 
     @wraps(func)
-    def wrapper(*args, **kwargs):
+    async def wrapper(*args, session: AsyncSession = None, **kwargs):
+        if session is not None:
+            return await func(*args, session=session, **kwargs)
+
         max_retries = 3
         retry_count = 0
 
         while retry_count < max_retries:
             try:
-                with get_db_session() as session:
-                    result = func(session=session, *args, **kwargs)
-
-                    if result is not None:
-                        if hasattr(result, 'all'):
-                            result = result.all()
-
-                        if isinstance(result, list) and result and hasattr(result[0], "__dict__") and hasattr(result[0],
-                                                                                                              "__tablename__"):
-                            result = [_convert_sa_object_to_dict(obj) for obj in result]
-                        elif hasattr(result, "__dict__") and hasattr(result, "__tablename__"):
-                            result = _convert_sa_object_to_dict(result)
-
-                    return result
+                async with get_db_session() as session:
+                    return await func(*args, session=session, **kwargs)
             except (OperationalError, DisconnectionError) as e:
                 retry_count += 1
                 logger.warning(f"Database connection error: {e}. Retry {retry_count}/{max_retries}")
@@ -98,315 +130,782 @@ def db_session_handler(func):
     return wrapper
 
 
-def _convert_sa_object_to_dict(obj):
-    if obj is None:
-        return None
+USER_COLUMNS = columns_of(UserRow, Users)
+CART_COLUMNS = columns_of(CartRow, Carts)
+CART_LINE_COLUMNS = columns_of(CartLineRow, Finally_carts)
+CATEGORY_COLUMNS = columns_of(CategoryRow, Categories)
+PRODUCT_COLUMNS = columns_of(ProductRow, Products)
+ORDER_COLUMNS = columns_of(OrderRow, Orders)
+ORDER_ITEM_COLUMNS = columns_of(OrderItemRow, OrderItems)
+CAMPAIGN_COLUMNS = columns_of(CampaignRow, Campaigns)
+DAILY_SALES_COLUMNS = columns_of(DailySalesRow, DailySales)
+PRODUCT_SALES_COLUMNS = columns_of(ProductSalesRow, DailyProductSales)
 
-    data = {}
-    for key, value in obj.__dict__.items():
-        if not key.startswith("_"):
-            if hasattr(value, "__dict__") and hasattr(value, "__tablename__"):
-                data[key] = _convert_sa_object_to_dict(value)
-            else:
-                data[key] = value
-    return data
 
+async def _fetch_one(session: AsyncSession, row_type, query):
+    row = (await session.execute(query)).first()
+    return row_type(*row) if row else None
 
-@db_session_handler
-def db_get_user(chat_id: int, session: Session = None):
-    return session.query(Users).filter(Users.telegram == chat_id).first()
+
+async def _fetch_all(session: AsyncSession, row_type, query) -> list:
+    return [row_type(*row) for row in await session.execute(query)]
+
+
+async def _fetch_page(session: AsyncSession, row_type, query, key, size: int,
+                      after_id: Optional[int] = None, before_id: Optional[int] = None) -> Page:
+    """Keyset page on an indexed key: WHERE key > after ORDER BY key LIMIT size + 1, no OFFSET"""
+    if before_id is not None:
+        rows = await _fetch_all(session, row_type, query.where(key < before_id).order_by(key.desc()).limit(size + 1))
+        return Page(rows[:size][::-1], len(rows) > size, True)
+
+    if after_id is not None:
+        query = query.where(key > after_id)
+    rows = await _fetch_all(session, row_type, query.order_by(key).limit(size + 1))
+    return Page(rows[:size], after_id is not None, len(rows) > size)
 
 
 @db_session_handler
-def db_register_user(user_name: str, chat_id: int, session: Session = None) -> bool:
-    try:
-        query = Users(name=user_name, telegram=chat_id)
-        session.add(query)
-        return False
-    except IntegrityError:
-        return True
+async def db_get_user(chat_id: int, session: AsyncSession = None) -> Optional[UserRow]:
+    return await _fetch_one(session, UserRow, select(*USER_COLUMNS).where(Users.telegram == chat_id))
+
+
+# Postgres sets xmax of a freshly inserted row to 0, on the ON CONFLICT update path it is not
+INSERTED = literal_column("xmax") == 0
 
 
 @db_session_handler
-def dp_update_user(chat_id: int, phone: str, session: Session = None):
-    """adding user contact number"""
-    query = update(Users).where(Users.telegram == chat_id).values(phone=phone)
-    session.execute(query)
+async def db_register_user(user_name: str, chat_id: int, phone: Optional[str] = None,
+                           session: AsyncSession = None) -> bool:
+    """Create user or refresh name/phone of existing one, returns True if user is new"""
+    query = insert(Users).values(name=user_name, telegram=chat_id, phone=phone)
+    set_ = {"name": query.excluded.name}
+    if phone is not None:
+        set_["phone"] = query.excluded.phone
+
+    query = query.on_conflict_do_update(index_elements=[Users.telegram], set_=set_).returning(INSERTED)
+    return await session.scalar(query)
 
 
 @db_session_handler
-def db_add_lang(chat_id: int, lang: str, session: Session = None):
+async def db_add_lang(chat_id: int, lang: str, session: AsyncSession = None):
     """adding user language"""
     query = update(Users).where(Users.telegram == chat_id).values(lang=lang)
-    session.execute(query)
+    await session.execute(query)
 
 
 @db_session_handler
-def db_get_user_lang(chat_id: int, session: Session = None):
-    return session.query(Users.lang).filter(Users.telegram == chat_id).first()
+async def db_get_user_lang(chat_id: int, session: AsyncSession = None) -> Optional[str]:
+    return await session.scalar(select(Users.lang).where(Users.telegram == chat_id))
 
 
 @db_session_handler
-def db_create_user_cart(chat_id: int, session: Session = None):
-    """create temporary cart for user"""
-    try:
-        subquery = session.scalar(select(Users).where(Users.telegram == chat_id))
-        query = Carts(user_id=subquery.id)
+async def db_bulk_update_lang(langs: dict[int, str], session: AsyncSession = None):
+    """Save languages of many users, one UPDATE per language"""
+    by_lang: dict[str, list[int]] = {}
+    for chat_id, lang in langs.items():
+        by_lang.setdefault(lang, []).append(chat_id)
 
-        session.add(query)
-        return True
-    except IntegrityError:
-        """If cart already exists"""
-        return False
-    except AttributeError:
-        """If anonim user send contact number"""
-        return False
+    for lang, chat_ids in by_lang.items():
+        await session.execute(update(Users).where(Users.telegram.in_(chat_ids)).values(lang=lang))
 
 
 @db_session_handler
-def db_get_all_category(session: Session = None) -> Iterable:
-    query = select(Categories)
-    return session.scalars(query)
+async def db_create_user_cart(chat_id: int, session: AsyncSession = None) -> bool:
+    """create temporary cart for user, returns False if cart already exists or user is unknown"""
+    query = insert(Carts).from_select(
+        [Carts.user_id], select(Users.id).where(Users.telegram == chat_id)
+    ).on_conflict_do_nothing(index_elements=[Carts.user_id]).returning(Carts.id)
 
+    return await session.scalar(query) is not None
 
-@db_session_handler
-def db_get_products_by_category(category_id: int, session: Session = None) -> Iterable:
-    return session.scalars(select(Products).where(Products.category_id == category_id))
 
+@db_session_handler
+async def _db_load_catalog(session: AsyncSession = None) -> tuple[list[CategoryRow], list[ProductRow]]:
+    """Read whole catalog for the in-process cache"""
+    categories = await _fetch_all(session, CategoryRow, select(*CATEGORY_COLUMNS))
+    products = await _fetch_all(session, ProductRow, select(*PRODUCT_COLUMNS))
+    return categories, products
 
 
-@db_session_handler
-def db_product_details(product_id: int, session: Session = None) -> Products:
-    query = select(Products).where(Products.id == product_id)
-    return session.scalar(query)
+async def db_ensure_catalog() -> None:
+    """Load or refresh the catalog cache, for callers that read catalog_cache directly"""
+    await catalog_cache.ensure(_db_load_catalog)
 
 
-@db_session_handler
-def db_get_user_cart(chat_id: int, session: Session = None) -> Carts:
-    query = select(Carts).join(Users).where(Users.telegram == chat_id)
-    return session.scalar(query)
+async def db_product_details(product_id: int) -> Optional[ProductRow]:
+    await catalog_cache.ensure(_db_load_catalog)
+    return catalog_cache.product(product_id)
 
 
 @db_session_handler
-def db_update_user_cart(price: DECIMAL, cart_id: int, quantity=1, session: Session = None):
-    query = update(Carts) \
-        .where(Carts.id == cart_id) \
-        .values(total_price=price, total_products=quantity)
+async def db_get_user_cart(chat_id: int, session: AsyncSession = None) -> Optional[CartRow]:
+    query = select(*CART_COLUMNS).join(Users).where(Users.telegram == chat_id)
+    return await _fetch_one(session, CartRow, query)
 
-    session.execute(query)
 
+async def _lock_user_cart(session: AsyncSession, chat_id: int) -> Optional[int]:
+    """Id of user's cart, the row stays locked until commit.
 
-@db_session_handler
-def db_get_product_by_name(product_name: str, session: Session = None) -> Products:
-    query = select(Products).where(Products.product_name == product_name)
-    return session.scalar(query)
+    Every cart line write locks the cart first, so the deltas it adds to carts.total_price
+    and carts.total_products apply in the same order as the line changes themselves.
+    """
+    query = select(Carts.id).join(Users).where(Users.telegram == chat_id).with_for_update(of=Carts)
+    return await session.scalar(query)
 
 
-@db_session_handler
-def db_insert_or_update_finally_cart(cart_id: int, product_name: str, total_products: int, total_price: int,
-                                     session: Session = None) -> bool:
-    """Insert or update finally cart"""
-    try:
-        query = Finally_carts(cart_id=cart_id,
-                              product_name=product_name,
-                              quantity=total_products,
-                              final_price=total_price)
+async def _add_to_cart_totals(session: AsyncSession, cart_id: int, price: DECIMAL, quantity: int) -> None:
+    if price or quantity:
+        await session.execute(update(Carts).where(Carts.id == cart_id).values(
+            total_price=Carts.total_price + price,
+            total_products=Carts.total_products + quantity
+        ))
 
-        session.add(query)
-        return True
-    except IntegrityError:
-        query = update(Finally_carts
-                       ).where(Finally_carts.product_name == product_name
-                               ).where(Finally_carts.cart_id == cart_id
-                                       ).values(quantity=total_products, final_price=total_price)
 
-        update(Finally_carts).where()
-        session.execute(query)
-        return False
+def _upsert_finally_cart_lines(rows: list[dict]):
+    query = insert(Finally_carts).values(rows)
+    return query.on_conflict_do_update(
+        index_elements=[Finally_carts.cart_id, Finally_carts.product_name],
+        set_={"quantity": query.excluded.quantity, "final_price": query.excluded.final_price}
+    )
 
 
 @db_session_handler
-def db_save_finally_cart(product_name: str, quantity: int, final_price: DECIMAL, cart: Carts, session: Session = None):
-    query = Finally_carts(product_name=product_name,
-                          final_price=final_price,
-                          quantity=quantity,
-                          user_cart=cart)
-
-    session.add(query)
-    session.commit()
+async def db_insert_or_update_finally_cart(chat_id: int, product_name: str, total_products: int, total_price: int,
+                                           session: AsyncSession = None) -> bool:
+    """Insert or update finally cart line, returns True if line is new"""
+    return await db_upsert_finally_cart_lines(chat_id, [(product_name, total_products, total_price)],
+                                              session=session) > 0
 
 
 @db_session_handler
-def db_get_price_sum(chat_id: int, session: Session = None):
-    queue = select(sum(Finally_carts.final_price)
-                   ).join(Carts
-                          ).join(Users
-                                 ).where(Users.telegram == chat_id)
-
-    return session.execute(queue).fetchone()[0]
+async def db_upsert_finally_cart_lines(chat_id: int, lines: Iterable[tuple[str, int, DECIMAL]],
+                                       session: AsyncSession = None) -> int:
+    """Insert or update many (product_name, quantity, final_price) lines of user's cart at once,
+    returns number of new lines"""
+    cart_id = await _lock_user_cart(session, chat_id)
+    # one row per product, Postgres refuses to update the same row twice in one statement
+    rows = {product_name: {"cart_id": cart_id, "product_name": product_name, "quantity": quantity,
+                           "final_price": final_price}
+            for product_name, quantity, final_price in lines}
+    if cart_id is None or not rows:
+        return 0
+
+    # the upsert cannot return the values it overwrites, read them first
+    old = (await session.execute(
+        select(func.coalesce(sum(Finally_carts.final_price), 0), func.coalesce(sum(Finally_carts.quantity), 0))
+        .where(Finally_carts.cart_id == cart_id, Finally_carts.product_name.in_(rows))
+    )).one()
+    inserted = await session.scalars(_upsert_finally_cart_lines(list(rows.values())).returning(INSERTED))
+
+    price, quantity = -old[0], -old[1]
+    for row in rows.values():
+        price += row["final_price"]
+        quantity += row["quantity"]
+    await _add_to_cart_totals(session, cart_id, price, quantity)
+    return inserted.all().count(True)
 
 
 @db_session_handler
-def db_get_all_product_inside_finally_cart(chat_id, session: Session = None) -> Iterable[Finally_carts]:
-    """Get list of products based on telegram id"""
-    queue = select(Finally_carts
-                   ).join(Carts
-                          ).join(Users
-                                 ).where(Users.telegram == chat_id)
+async def db_reorder(chat_id: int, order_id: int, session: AsyncSession = None) -> Optional[tuple[int, int]]:
+    """Put the lines of a previous order back into the user's cart with one INSERT ... SELECT.
+
+    Lines are repriced from the current catalog and products deleted since are dropped, a
+    product already in the cart gets the order's quantity. Returns (restored, dropped) line
+    counts, None when the order is not the user's.
+    """
+    cart = (await session.execute(
+        select(Carts.id, Carts.user_id).join(Users).where(Users.telegram == chat_id).with_for_update(of=Carts)
+    )).first()
+    if not cart or not await session.scalar(
+            select(Orders.id).where(Orders.id == order_id, Orders.user_id == cart.user_id)):
+        return None
 
-    return session.scalars(queue).fetchall()
+    ordered = select(Products.product_name, OrderItems.quantity, (Products.price * OrderItems.quantity)) \
+        .join(Products, Products.id == OrderItems.product_id).where(OrderItems.order_id == order_id)
+    old = (await session.execute(
+        select(func.coalesce(sum(Finally_carts.final_price), 0), func.coalesce(sum(Finally_carts.quantity), 0))
+        .where(Finally_carts.cart_id == cart.id,
+               Finally_carts.product_name.in_(ordered.with_only_columns(Products.product_name)))
+    )).one()
+
+    query = insert(Finally_carts).from_select(
+        [Finally_carts.product_name, Finally_carts.quantity, Finally_carts.final_price, Finally_carts.cart_id],
+        ordered.add_columns(literal(cart.id))
+    )
+    query = query.on_conflict_do_update(
+        index_elements=[Finally_carts.cart_id, Finally_carts.product_name],
+        set_={"quantity": query.excluded.quantity, "final_price": query.excluded.final_price}
+    ).returning(Finally_carts.final_price, Finally_carts.quantity)
+    restored = (await session.execute(query)).all()
 
+    price, quantity = -old[0], -old[1]
+    for line in restored:
+        price += line.final_price
+        quantity += line.quantity
+    await _add_to_cart_totals(session, cart.id, price, quantity)
 
-@db_session_handler
-def db_get_finally_cart(cart_id: int, session: Session = None) -> Finally_carts:
-    """get finally cart by id"""
-    queue = select(Finally_carts).where(Finally_carts.id == cart_id)
-    return session.scalar(queue)
+    items = await session.scalar(select(func.count()).select_from(OrderItems).where(OrderItems.order_id == order_id))
+    return len(restored), items - len(restored)
 
 
 @db_session_handler
-def db_update_finally_cart(cart_id: int, new_price: DECIMAL, new_quantity: DECIMAL, session: Session = None):
-    """update finally cart's price and quantity"""
-    queue = update(Finally_carts
-                   ).where(Finally_carts.id == cart_id
-                           ).values(final_price=new_price, quantity=new_quantity)
+async def db_get_cart_total(chat_id: int, session: AsyncSession = None) -> DECIMAL:
+    """Total price of user's cart, kept on the carts row by every line write"""
+    total = await session.scalar(select(Carts.total_price).join(Users).where(Users.telegram == chat_id))
+    return total or 0
 
-    session.execute(queue)
 
-
-@db_session_handler
-def db_delete_product_from_finally_cart(cart_id: int, session: Session = None):
-    try:
-        queue = delete(Finally_carts).where(Finally_carts.id == cart_id)
-        session.execute(queue)
-        return True
-    except IntegrityError:
-        return False
+def _cart_lines(cart_id: int):
+    return select(*CART_LINE_COLUMNS).where(Finally_carts.cart_id == cart_id).order_by(Finally_carts.id)
 
 
 @db_session_handler
-def db_get_user_info(chat_id: int, session: Session = None) -> Users:
-    """return user info"""
-    query = select(Users).where(Users.telegram == chat_id)
-    return session.scalar(query)
+async def db_get_user_cart_with_lines(chat_id: int,
+                                      session: AsyncSession = None) -> tuple[Optional[CartRow], list[CartLineRow]]:
+    """User's cart with its totals and lines"""
+    cart = await _fetch_one(session, CartRow, select(*CART_COLUMNS).join(Users).where(Users.telegram == chat_id))
+    lines = await _fetch_all(session, CartLineRow, _cart_lines(cart.id)) if cart else []
+    return cart, lines
 
 
 @db_session_handler
-def db_clear_finally_cart(cart_id: int, session: Session = None) -> None:
-    query = delete(Finally_carts).where(Finally_carts.cart_id == cart_id)
-    session.execute(query)
+async def db_change_finally_cart_line(chat_id: int, line_id: int, action: str, session: AsyncSession = None
+                                      ) -> tuple[Optional[str], Optional[str], Optional[CartRow], list[CartLineRow]]:
+    """Apply add/minus/remove to a line of user's cart and return the refreshed cart in the same transaction.
+
+    Returns (status, product_name, cart, lines), status is one of "updated", "removed", "missing"
+    (product left the catalog, line dropped) or None when the line is not in user's cart.
+    """
+    cart_id = await _lock_user_cart(session, chat_id)
+    own_line = (Finally_carts.id == line_id) & (Finally_carts.cart_id == cart_id)
+    line = (await session.execute(
+        select(Finally_carts.product_name, Finally_carts.quantity, Finally_carts.final_price, Products.price)
+        .outerjoin(Products, Products.product_name == Finally_carts.product_name)
+        .where(own_line)
+    )).first()
+
+    status = None
+    if line:
+        quantity = line.quantity + (1 if action == 'add' else -1)
+        if action == 'remove' or line.price is None or quantity < 1:
+            await session.execute(delete(Finally_carts).where(own_line))
+            await _add_to_cart_totals(session, cart_id, -line.final_price, -line.quantity)
+            status = "missing" if line.price is None else "removed"
+        else:
+            await session.execute(update(Finally_carts)
+                                  .where(own_line)
+                                  .values(quantity=quantity, final_price=line.price * quantity))
+            await _add_to_cart_totals(session, cart_id, line.price * quantity - line.final_price,
+                                      quantity - line.quantity)
+            status = "updated"
+
+    cart, lines = await db_get_user_cart_with_lines(chat_id, session=session)
+    return status, line.product_name if line else None, cart, lines
 
 
 @db_session_handler
-def db_add_category(category_name, session: Session = None):
+async def db_add_category(category_name, session: AsyncSession = None):
     """Add a new category to the database"""
+    query = insert(Categories).values(category_name=category_name).returning(*CATEGORY_COLUMNS)
     try:
-        category = Categories(category_name=category_name)
-        session.add(category)
-        return True
+        # SAVEPOINT keeps a shared per-update transaction usable after a duplicate name
+        async with session.begin_nested():
+            category = await _fetch_one(session, CategoryRow, query)
     except IntegrityError:
         return False
 
+    run_after_commit(session, lambda: catalog_cache.put_category(category))
+    return True
+
 
 @db_session_handler
-def db_add_product(category_id, product_name, description, price, image, session: Session = None):
+async def db_add_product(category_id, product_name, description, price, image, image_file_id=None,
+                         session: AsyncSession = None):
     """Add a new product to the database"""
+    query = insert(Products).values(
+        category_id=category_id,
+        product_name=product_name,
+        description=description,
+        price=price,
+        image=image,
+        image_file_id=image_file_id
+    ).returning(*PRODUCT_COLUMNS)
     try:
-        product = Products(
-            category_id=category_id,
-            product_name=product_name,
-            description=description,
-            price=price,
-            image=image
-        )
-        session.add(product)
-        session.commit()
-        return True
+        async with session.begin_nested():
+            product = await _fetch_one(session, ProductRow, query)
     except IntegrityError:
         return False
 
+    run_after_commit(session, lambda: catalog_cache.put_product(product))
+    return True
+
 
 @db_session_handler
-def db_get_all_categories(session: Session = None):
-    """get all categories from database"""
-    return session.query(Categories).all()
+async def db_get_categories_page(size: int, after_id: Optional[int] = None, before_id: Optional[int] = None,
+                                 session: AsyncSession = None) -> Page:
+    return await _fetch_page(session, CategoryRow, select(*CATEGORY_COLUMNS), Categories.id, size, after_id, before_id)
 
 
 @db_session_handler
-def db_get_category(category_id: int, session: Session = None) -> Optional[Type[Categories]]:
+async def db_get_category(category_id: int, session: AsyncSession = None) -> Optional[CategoryRow]:
     """get category"""
-    return session.query(Categories).filter(Categories.id == category_id).first()
+    return await _fetch_one(session, CategoryRow, select(*CATEGORY_COLUMNS).where(Categories.id == category_id))
 
 
 @db_session_handler
-def db_get_all_products(session: Session = None):
-    """get all products from database"""
-    return session.query(Products).all()
+async def db_get_products_page(size: int, after_id: Optional[int] = None, before_id: Optional[int] = None,
+                               session: AsyncSession = None) -> Page:
+    return await _fetch_page(session, ProductRow, select(*PRODUCT_COLUMNS), Products.id, size, after_id, before_id)
 
 
 @db_session_handler
-def db_get_product_by_id(product_id, session: Session = None) -> Optional[Type[Products]]:
-    return session.query(Products).filter(Products.id == product_id).first()
+async def db_get_product_by_id(product_id, session: AsyncSession = None) -> Optional[ProductRow]:
+    return await _fetch_one(session, ProductRow, select(*PRODUCT_COLUMNS).where(Products.id == product_id))
 
 
 @db_session_handler
-def db_delete_category(category_id, session: Session = None):
+async def db_delete_category(category_id, session: AsyncSession = None) -> Optional[list[str]]:
+    """Delete a category with its products, returns the images of the deleted products,
+    None if the category could not be deleted"""
     try:
-        products = session.query(Products).filter(Products.category_id == category_id).all()
-        for product in products:
-            session.delete(product)
+        # SAVEPOINT keeps a shared per-update transaction usable after a constraint violation
+        async with session.begin_nested():
+            images = (await session.scalars(
+                delete(Products).where(Products.category_id == category_id).returning(Products.image)
+            )).all()
+            result = await session.execute(delete(Categories).where(Categories.id == category_id))
+    except IntegrityError as e:
+        logger.error(f"Error deleting category: {e}")
+        return None
 
-        category = session.query(Categories).filter(Categories.id == category_id).first()
-        if category:
-            session.delete(category)
-            return True
+    if result.rowcount == 0:
+        return None
+    run_after_commit(session, lambda: catalog_cache.drop_category(category_id))
+    return images
 
+
+@db_session_handler
+async def db_delete_product(product_id, session: AsyncSession = None):
+    "Delete product by id"
+    try:
+        async with session.begin_nested():
+            result = await session.execute(delete(Products).where(Products.id == product_id))
+    except IntegrityError as e:
+        logger.error(f"Error whiling deleting product: {e}")
         return False
 
-    except Exception as e:
-        logger.error(f"Error deleting category: {e}")
+    if result.rowcount == 0:
         return False
+    run_after_commit(session, lambda: catalog_cache.drop_product(product_id))
+    return True
 
 
 @db_session_handler
-def db_delete_product(product_id, session: Session = None):
-    "Delete product by id"
+async def db_update_product(product_id, name, description, price, image, image_file_id=None,
+                            session: AsyncSession = None):
+    """ Update product details, dropping the cached Telegram file_id when the image changes"""
+    query = update(Products).where(Products.id == product_id).values(
+        product_name=name,
+        description=description,
+        price=price,
+        image=image,
+        image_file_id=case((Products.image != image, image_file_id), else_=Products.image_file_id)
+    ).returning(*PRODUCT_COLUMNS)
     try:
-        product = session.query(Products).filter(Products.id == product_id).first()
-        if product:
-            session.delete(product)
-            return True
+        async with session.begin_nested():
+            product = await _fetch_one(session, ProductRow, query)
+    except IntegrityError:
         return False
-    except Exception as e:
-        logger.error(f"Error whiling deleting product: {e}")
+
+    if not product:
         return False
 
+    run_after_commit(session, lambda: catalog_cache.put_product(product))
+    return True
+
 
 @db_session_handler
-def db_update_product(product_id, name, description, price, image, session: Session = None):
-    """ Update product details"""
-    try:
-        product = session.query(Products).filter(Products.id == product_id).first()
-        if product:
-            product.product_name = name
-            product.description = description
-            product.price = price
-            product.image = image
-            return True
+async def db_count_products_with_image(image: str, session: AsyncSession = None) -> int:
+    return await session.scalar(select(func.count()).select_from(Products).where(Products.image == image))
 
+
+@db_session_handler
+async def db_set_product_file_id(product_id: int, image: str, file_id: Optional[str],
+                                 session: AsyncSession = None) -> bool:
+    """Remember Telegram file_id of product photo (None forces re-upload from media/).
+
+    Only applies while the product still shows image, the file the file_id belongs to: an
+    admin may have changed the photo while it was being uploaded.
+    """
+    query = update(Products).where(Products.id == product_id, Products.image == image).values(image_file_id=file_id)
+    result = await session.execute(query)
+    if not result.rowcount:
         return False
-    except IntegrityError:
-        return False
+    run_after_commit(session, lambda: catalog_cache.set_product_file_id(product_id, image, file_id))
+    return True
 
 
 @db_session_handler
-def db_update_category(category_id, name, session: Session = None):
+async def db_update_category(category_id, name, session: AsyncSession = None):
+    query = update(Categories).where(Categories.id == category_id).values(category_name=name) \
+        .returning(*CATEGORY_COLUMNS)
     try:
-        category = session.query(Categories).filter(Categories.id == category_id).first()
-        if category:
-            category.category_name = name
-            return True
-
-        return False
+        async with session.begin_nested():
+            category = await _fetch_one(session, CategoryRow, query)
     except IntegrityError:
         return False
+
+    if not category:
+        return False
+
+    run_after_commit(session, lambda: catalog_cache.put_category(category))
+    return True
+
+
+@db_session_handler
+async def db_import_catalog(products: list[dict], batch_size: int,
+                            session: AsyncSession = None) -> tuple[int, int, set[str]]:
+    """Upsert an imported catalog within the caller's transaction.
+
+    products are dicts with category, product_name, description, price and image, product
+    names unique. Missing categories are created, products are matched by name and written
+    batch_size rows per statement. Returns (created, updated, images no product uses any more).
+    """
+    categories = sorted({product["category"] for product in products})
+    await session.execute(insert(Categories).values([{"category_name": name} for name in categories])
+                          .on_conflict_do_nothing(index_elements=[Categories.category_name]))
+    category_ids = dict((await session.execute(
+        select(Categories.category_name, Categories.id).where(Categories.category_name.in_(categories))
+    )).all())
+
+    created = updated = 0
+    replaced = set()
+    for start in range(0, len(products), batch_size):
+        rows = [{"category_id": category_ids[product["category"]], "product_name": product["product_name"],
+                 "description": product["description"], "price": product["price"], "image": product["image"]}
+                for product in products[start:start + batch_size]]
+        images = {row["product_name"]: row["image"] for row in rows}
+        # the upsert cannot return the images it overwrites, read them first
+        old = await session.execute(
+            select(Products.product_name, Products.image).where(Products.product_name.in_(images)).with_for_update()
+        )
+        replaced.update(image for name, image in old if image != images[name])
+
+        query = insert(Products).values(rows)
+        query = query.on_conflict_do_update(index_elements=[Products.product_name], set_={
+            "category_id": query.excluded.category_id,
+            "description": query.excluded.description,
+            "price": query.excluded.price,
+            "image": query.excluded.image,
+            "image_file_id": case((Products.image != query.excluded.image, None), else_=Products.image_file_id),
+        })
+        inserted = (await session.scalars(query.returning(INSERTED))).all()
+        created += inserted.count(True)
+        updated += inserted.count(False)
+
+    run_after_commit(session, catalog_cache.invalidate)
+    return created, updated, replaced - {product["image"] for product in products}
+
+
+@db_session_handler
+async def db_get_fsm_entry(key: str, session: AsyncSession = None) -> Optional[tuple[Optional[str], dict]]:
+    row = (await session.execute(select(FsmStates.state, FsmStates.data).where(FsmStates.key == key))).first()
+    return (row.state, row.data or {}) if row else None
+
+
+@db_session_handler
+async def db_write_fsm_entries(entries: dict[str, tuple[Optional[str], dict]], session: AsyncSession = None):
+    """Upsert buffered FSM entries in one statement, empty entries are deleted"""
+    empty = [key for key, (state, data) in entries.items() if state is None and not data]
+    rows = [{"key": key, "state": state, "data": data}
+            for key, (state, data) in entries.items() if state is not None or data]
+
+    if empty:
+        await session.execute(delete(FsmStates).where(FsmStates.key.in_(empty)))
+    if rows:
+        query = insert(FsmStates).values(rows)
+        query = query.on_conflict_do_update(index_elements=[FsmStates.key],
+                                            set_={"state": query.excluded.state, "data": query.excluded.data})
+        await session.execute(query)
+
+
+@db_session_handler
+async def db_checkout(chat_id: int, idempotency_key: str,
+                      session: AsyncSession = None) -> tuple[Optional[OrderRow], bool]:
+    """Move the user's cart lines into a new order within the caller's transaction.
+
+    Returns (order, created). A repeated idempotency_key returns the existing order with
+    created=False, an empty cart returns (None, False). A new order is added to the daily
+    sales aggregates in the same transaction.
+    """
+    # FOR UPDATE on the cart row holds back new lines until the checkout commits
+    cart = (await session.execute(
+        select(Carts.id, Carts.user_id).join(Users).where(Users.telegram == chat_id).with_for_update(of=Carts)
+    )).first()
+    if not cart:
+        return None, False
+
+    query = insert(Orders).values(user_id=cart.user_id, idempotency_key=idempotency_key) \
+        .on_conflict_do_nothing(index_elements=[Orders.idempotency_key]).returning(Orders.id)
+    order_id = await session.scalar(query)
+    if order_id is None:
+        existing = select(*ORDER_COLUMNS).where(Orders.idempotency_key == idempotency_key,
+                                                Orders.user_id == cart.user_id)
+        return await _fetch_one(session, OrderRow, existing), False
+
+    # DELETE ... RETURNING hands over exactly the lines that are removed, concurrent quantity
+    # changes either land before it or wait for it
+    moved = delete(Finally_carts).where(Finally_carts.cart_id == cart.id) \
+        .returning(Finally_carts.product_name, Finally_carts.quantity, Finally_carts.final_price).cte("moved")
+    items = select(literal(order_id), Products.id, moved.c.product_name, moved.c.quantity, moved.c.final_price) \
+        .select_from(moved).outerjoin(Products, Products.product_name == moved.c.product_name)
+    query = insert(OrderItems).add_cte(moved).from_select(
+        [OrderItems.order_id, OrderItems.product_id, OrderItems.product_name, OrderItems.quantity,
+         OrderItems.final_price],
+        items
+    ).returning(OrderItems.id)
+    if not (await session.scalars(query)).all():
+        await session.execute(delete(Orders).where(Orders.id == order_id))
+        return None, False
+
+    await session.execute(update(Carts).where(Carts.id == cart.id).values(total_price=0, total_products=0))
+
+    query = update(Orders).where(Orders.id == order_id).values(
+        total_price=select(sum(OrderItems.final_price)).where(OrderItems.order_id == order_id).scalar_subquery(),
+        total_products=select(sum(OrderItems.quantity)).where(OrderItems.order_id == order_id).scalar_subquery()
+    ).returning(*ORDER_COLUMNS)
+    order = await _fetch_one(session, OrderRow, query)
+    await _add_order_to_sales(session, order_id)
+    run_after_commit(session, lambda: order_history_cache.invalidate(chat_id))
+    return order, True
+
+
+def _sales_day(timestamp):
+    """Calendar day of a timestamptz in SALES_TIMEZONE"""
+    return cast(func.timezone(SALES_TIMEZONE, timestamp), Date)
+
+
+def _product_sales(orders):
+    """(day, product_name, category_id, quantity, revenue) of the items of orders, summed per
+    day and product name. Ordered by the key, so concurrent upserts lock aggregate rows in the same order."""
+    day = _sales_day(Orders.created_at)
+    return select(day, OrderItems.product_name, func.max(Products.category_id),
+                  sum(OrderItems.quantity), sum(OrderItems.final_price)) \
+        .select_from(OrderItems).join(Orders, Orders.id == OrderItems.order_id) \
+        .outerjoin(Products, Products.id == OrderItems.product_id) \
+        .where(Orders.id.in_(orders)).group_by(day, OrderItems.product_name).order_by(day, OrderItems.product_name)
+
+
+def _daily_sales(orders):
+    day = _sales_day(Orders.created_at)
+    return select(day, func.count(), sum(Orders.total_price), sum(Orders.total_products)) \
+        .where(Orders.id.in_(orders)).group_by(day).order_by(day)
+
+
+def _insert_sales(orders):
+    """Upserts adding orders (ids or a select of them) to the aggregates, products first, days last"""
+    products = insert(DailyProductSales).from_select(
+        [DailyProductSales.day, DailyProductSales.product_name, DailyProductSales.category_id,
+         DailyProductSales.quantity, DailyProductSales.revenue],
+        _product_sales(orders)
+    )
+    products = products.on_conflict_do_update(index_elements=[DailyProductSales.day, DailyProductSales.product_name],
+                                              set_={
+        "category_id": func.coalesce(products.excluded.category_id, DailyProductSales.category_id),
+        "quantity": DailyProductSales.quantity + products.excluded.quantity,
+        "revenue": DailyProductSales.revenue + products.excluded.revenue,
+    })
+    days = insert(DailySales).from_select(
+        [DailySales.day, DailySales.orders, DailySales.revenue, DailySales.products], _daily_sales(orders)
+    )
+    days = days.on_conflict_do_update(index_elements=[DailySales.day], set_={
+        "orders": DailySales.orders + days.excluded.orders,
+        "revenue": DailySales.revenue + days.excluded.revenue,
+        "products": DailySales.products + days.excluded.products,
+    })
+    return products, days
+
+
+async def _add_order_to_sales(session: AsyncSession, order_id: int) -> None:
+    """Add a new order to the daily aggregates in its checkout transaction, two upserts whatever the
+    number of orders so far. The per-day row is locked last, for as short as possible."""
+    for query in _insert_sales([order_id]):
+        await session.execute(query)
+
+
+@db_session_handler
+async def db_get_daily_sales(start: date, end: date, session: AsyncSession = None) -> list[DailySalesRow]:
+    """Aggregates of the days start to end, both included, days without orders have no row"""
+    query = select(*DAILY_SALES_COLUMNS).where(DailySales.day.between(start, end)).order_by(DailySales.day)
+    return await _fetch_all(session, DailySalesRow, query)
+
+
+@db_session_handler
+async def db_get_product_sales(start: date, end: date, session: AsyncSession = None) -> list[ProductSalesRow]:
+    query = select(*PRODUCT_SALES_COLUMNS).where(DailyProductSales.day.between(start, end))
+    return await _fetch_all(session, ProductSalesRow, query)
+
+
+@db_session_handler
+async def db_get_sales_today(session: AsyncSession = None) -> date:
+    """Today in SALES_TIMEZONE, by the database clock the aggregates are keyed with"""
+    return await session.scalar(select(_sales_day(func.now())))
+
+
+@db_session_handler
+async def db_rebuild_sales(start: date, end: date, session: AsyncSession = None) -> None:
+    """Recompute the aggregates of days start to end from the orders, after orders were deleted or edited"""
+    await session.execute(delete(DailyProductSales).where(DailyProductSales.day.between(start, end)))
+    await session.execute(delete(DailySales).where(DailySales.day.between(start, end)))
+    orders = select(Orders.id).where(_sales_day(Orders.created_at).between(start, end))
+    for query in _insert_sales(orders):
+        await session.execute(query)
+
+
+@db_session_handler
+async def db_get_order_history_page(chat_id: int, size: int, after_id: Optional[int] = None,
+                                    before_id: Optional[int] = None, session: AsyncSession = None) -> Page:
+    """User's orders newest first, after_id pages to older orders and before_id to newer ones.
+
+    Keyset on (created_at, id) served by ix_orders_user_id_created_at_id, the cursor order
+    is looked up by primary key. Pages are cached until the user's next checkout.
+    """
+    page = order_history_cache.get(chat_id, (after_id, before_id))
+    if page is not None:
+        return page
+
+    user_id = select(Users.id).where(Users.telegram == chat_id).scalar_subquery()
+    query = select(*ORDER_COLUMNS).where(Orders.user_id == user_id)
+    position = tuple_(Orders.created_at, Orders.id)
+    cursor = aliased(Orders)
+
+    def cursor_position(order_id: int):
+        return select(cursor.created_at, cursor.id).where(cursor.id == order_id).scalar_subquery()
+
+    if before_id is not None:
+        query = query.where(position > cursor_position(before_id)) \
+            .order_by(Orders.created_at, Orders.id).limit(size + 1)
+        rows = await _fetch_all(session, OrderRow, query)
+        page = Page(rows[:size][::-1], len(rows) > size, True)
+    else:
+        if after_id is not None:
+            query = query.where(position < cursor_position(after_id))
+        rows = await _fetch_all(session, OrderRow,
+                                query.order_by(Orders.created_at.desc(), Orders.id.desc()).limit(size + 1))
+        page = Page(rows[:size], after_id is not None, len(rows) > size)
+
+    order_history_cache.put(chat_id, (after_id, before_id), page)
+    return page
+
+
+@db_session_handler
+async def db_get_order_report(order_id: int,
+                              session: AsyncSession = None) -> Optional[tuple[OrderRow, UserRow, list[OrderItemRow]]]:
+    """Order with its customer and items, for the manager report"""
+    order = await _fetch_one(session, OrderRow, select(*ORDER_COLUMNS).where(Orders.id == order_id))
+    if not order:
+        return None
+
+    user = await _fetch_one(session, UserRow, select(*USER_COLUMNS).where(Users.id == order.user_id))
+    items = await _fetch_all(session, OrderItemRow,
+                             select(*ORDER_ITEM_COLUMNS).where(OrderItems.order_id == order_id).order_by(OrderItems.id))
+    return order, user, items
+
+
+@db_session_handler
+async def db_get_unreported_order_ids(session: AsyncSession = None) -> list[int]:
+    """Orders still waiting for their manager report, oldest first"""
+    return list(await session.scalars(select(Orders.id).where(Orders.status == 'new').order_by(Orders.id)))
+
+
+@db_session_handler
+async def db_set_order_status(order_id: int, status: str, session: AsyncSession = None) -> None:
+    await session.execute(update(Orders).where(Orders.id == order_id).values(status=status))
+
+
+@db_session_handler
+async def db_count_users(session: AsyncSession = None) -> int:
+    return await session.scalar(select(func.count()).select_from(Users))
+
+
+@db_session_handler
+async def db_create_campaign(from_chat_id: int, message_id: int, session: AsyncSession = None) -> CampaignRow:
+    query = insert(Campaigns).values(from_chat_id=from_chat_id, message_id=message_id).returning(*CAMPAIGN_COLUMNS)
+    return await _fetch_one(session, CampaignRow, query)
+
+
+@db_session_handler
+async def db_get_running_campaign_ids(session: AsyncSession = None) -> list[int]:
+    query = select(Campaigns.id).where(Campaigns.status == 'running').order_by(Campaigns.id)
+    return list(await session.scalars(query))
+
+
+@db_session_handler
+async def db_claim_campaign(campaign_id: int, lease_seconds: float,
+                            session: AsyncSession = None) -> Optional[CampaignRow]:
+    """Take a running campaign unless another bot process holds an unexpired lease on it"""
+    query = update(Campaigns).where(
+        Campaigns.id == campaign_id,
+        Campaigns.status == 'running',
+        or_(Campaigns.lease_until.is_(None), Campaigns.lease_until < func.now())
+    ).values(lease_until=func.now() + timedelta(seconds=lease_seconds)).returning(*CAMPAIGN_COLUMNS)
+    return await _fetch_one(session, CampaignRow, query)
+
+
+async def db_stream_campaign_recipients(campaign_id: int, after_user_id: int,
+                                        batch_size: int) -> AsyncIterator[list[tuple[int, int]]]:
+    """Yield (users.id, telegram) batches in users.id order, skipping users the campaign already reached.
+
+    Every batch is a keyset page read through a server-side cursor in its own short
+    transaction, so no connection is held while the batch is being sent.
+    """
+    delivered = select(CampaignDeliveries.user_id).where(CampaignDeliveries.campaign_id == campaign_id,
+                                                         CampaignDeliveries.user_id == Users.id)
+    while True:
+        query = select(Users.id, Users.telegram).where(Users.id > after_user_id, ~delivered.exists()) \
+            .order_by(Users.id).limit(batch_size).execution_options(yield_per=batch_size)
+        async with get_db_session() as session:
+            result = await session.stream(query)
+            batch = [(user_id, telegram) async for user_id, telegram in result]
+
+        if not batch:
+            return
+        yield batch
+        after_user_id = batch[-1][0]
+
+
+@db_session_handler
+async def db_record_campaign_batch(campaign_id: int, deliveries: list[tuple[int, str, Optional[str]]],
+                                   last_user_id: int, lease_seconds: float, session: AsyncSession = None) -> None:
+    """Store (user_id, status, error) outcomes, move the checkpoint and renew the lease"""
+    counts = {'sent': 0, 'failed': 0, 'blocked': 0}
+    if deliveries:
+        query = insert(CampaignDeliveries).values([
+            {"campaign_id": campaign_id, "user_id": user_id, "status": status, "error": error}
+            for user_id, status, error in deliveries
+        ]).on_conflict_do_nothing().returning(CampaignDeliveries.status)
+        # only rows inserted now are counted, a batch repeated after a crash is not counted twice
+        for status in await session.scalars(query):
+            counts[status] += 1
+
+    await session.execute(update(Campaigns).where(Campaigns.id == campaign_id).values(
+        last_user_id=func.greatest(Campaigns.last_user_id, last_user_id),
+        sent=Campaigns.sent + counts['sent'],
+        failed=Campaigns.failed + counts['failed'],
+        blocked=Campaigns.blocked + counts['blocked'],
+        lease_until=func.now() + timedelta(seconds=lease_seconds)
+    ))
+
+
+@db_session_handler
+async def db_finish_campaign(campaign_id: int, status: str = 'done',
+                             session: AsyncSession = None) -> Optional[CampaignRow]:
+    query = update(Campaigns).where(Campaigns.id == campaign_id) \
+        .values(status=status, lease_until=None).returning(*CAMPAIGN_COLUMNS)
+    return await _fetch_one(session, CampaignRow, query)
+
+
+@db_session_handler
+async def db_release_campaign(campaign_id: int, session: AsyncSession = None) -> None:
+    """Drop the lease so the next bot start can resume the campaign at once"""
+    await session.execute(update(Campaigns).where(Campaigns.id == campaign_id).values(lease_until=None))
@@ -0,0 +1,14 @@
+from typing import Union
+
+from aiogram.filters import BaseFilter
+from aiogram.types import Message
+
+from utils.i18n import TEXT_INTENTS
+
+
+class MenuIntent(BaseFilter):
+    """Match reply keyboard text in any language with a single dict lookup"""
+
+    async def __call__(self, message: Message) -> Union[bool, dict]:
+        intent = TEXT_INTENTS.get(message.text)
+        return {"intent": intent} if intent else False
@@ -0,0 +1,72 @@
+from collections import OrderedDict
+from functools import wraps
+from os import getenv
+from typing import Any, Callable, Hashable
+
+from dotenv import load_dotenv
+
+from database.cache import catalog_cache
+
+load_dotenv()
+
+KEYBOARD_CACHE_SIZE = int(getenv('KEYBOARD_CACHE_SIZE', '2048'))
+
+
+class MarkupCache:
+    """Bounded LRU of prebuilt keyboard markups.
+
+    Keyboards only depend on the language, a few ids and, for catalog keyboards, the
+    catalog version, so the same pydantic objects can be sent again and again.
+    Cached markups are shared between handlers and must not be modified.
+    """
+
+    def __init__(self, maxsize: int = KEYBOARD_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._markups: OrderedDict[Hashable, Any] = OrderedDict()
+
+    def get_or_build(self, key: Hashable, build: Callable[[], Any]) -> Any:
+        try:
+            markup = self._markups[key]
+        except KeyError:
+            self.misses += 1
+            markup = self._markups[key] = build()
+            if len(self._markups) > self.maxsize:
+                self._markups.popitem(last=False)
+            return markup
+
+        self.hits += 1
+        self._markups.move_to_end(key)
+        return markup
+
+    def clear(self) -> None:
+        self._markups.clear()
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._markups),
+        }
+
+
+markup_cache = MarkupCache()
+
+
+def cached_markup(catalog: bool = False):
+    """Memoize a keyboard factory by its arguments.
+
+    catalog=True adds the catalog version to the key, so keyboards built from categories
+    or products are rebuilt after an admin edit and the old ones age out of the LRU.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (func.__qualname__, catalog_cache.version if catalog else None, args, tuple(sorted(kwargs.items())))
+            return markup_cache.get_or_build(key, lambda: func(*args, **kwargs))
+
+        return wrapper
+
+    return decorator
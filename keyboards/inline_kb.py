@@ -1,38 +1,54 @@
-from typing import Iterable
+from typing import Iterable, Optional
 
 from aiogram.utils.keyboard import InlineKeyboardBuilder, InlineKeyboardButton, InlineKeyboardMarkup
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database.modules import Products, Finally_carts
-from database.utils import db_get_all_category, db_get_products_by_category, db_get_price_sum, db_get_user_cart
+from database.cache import catalog_cache
+from database.dto import CartLineRow, Page
+from database.utils import db_ensure_catalog, db_get_cart_total
 from translation import translations
+from .cache import cached_markup
+from .pagination import CATALOG_PAGE_SIZE, page_nav_row
 
 
-def generate_category_menu(chat_id: int, lang: str) -> InlineKeyboardMarkup:
-    """categories buttons"""
-    categories = db_get_all_category()
+@cached_markup(catalog=True)
+def _category_rows(after_id: Optional[int], before_id: Optional[int]) -> list[list[InlineKeyboardButton]]:
+    page = catalog_cache.categories_page(CATALOG_PAGE_SIZE, after_id, before_id)
     builder = InlineKeyboardBuilder()
-    total_price = db_get_price_sum(chat_id)
+    [builder.button(text=category.category_name,
+                    callback_data=f'category_{category.id}') for category in page.rows]
+
+    builder.adjust(2)
+    if nav := page_nav_row(page, 'catpage'):
+        builder.row(*nav)
+    return list(builder.export())
+
+
+async def generate_category_menu(chat_id: int, lang: str, session: AsyncSession = None,
+                                 after_id: Optional[int] = None, before_id: Optional[int] = None) -> InlineKeyboardMarkup:
+    """categories buttons, only the cart button with the user's total is built per call"""
+    await db_ensure_catalog()
+    total_price = await db_get_cart_total(chat_id, session=session)
 
     # Use translated text for "Your cart" button
     cart_text_key = "your_cart_button"
-    cart_text = translations[lang][cart_text_key].format(total_price=total_price if total_price else 0)
-    builder.button(text=cart_text, callback_data="your_cart")
+    cart_text = translations[lang][cart_text_key].format(total_price=total_price)
+    cart_button = InlineKeyboardButton(text=cart_text, callback_data="your_cart")
 
-    [builder.button(text=category["category_name"],
-                    callback_data=f'category_{category["id"]}') for category in categories]
-
-    builder.adjust(1, 2)
-    return builder.as_markup()
+    return InlineKeyboardMarkup(inline_keyboard=[[cart_button], *_category_rows(after_id, before_id)])
 
 
-def show_product_by_category(category_id: int, user_language: str) -> InlineKeyboardMarkup:
-    """Product buttons"""
-    products = db_get_products_by_category(category_id)
+@cached_markup(catalog=True)
+def _product_menu(category_id: int, user_language: str, after_id: Optional[int],
+                  before_id: Optional[int]) -> InlineKeyboardMarkup:
+    page = catalog_cache.products_page(category_id, CATALOG_PAGE_SIZE, after_id, before_id)
     builder = InlineKeyboardBuilder()
 
-    [builder.button(text=product["product_name"],
-                    callback_data=f'product_{product["id"]}') for product in products]
+    [builder.button(text=product.product_name,
+                    callback_data=f'product_{product.id}') for product in page.rows]
     builder.adjust(2)
+    if nav := page_nav_row(page, f'prodpage_{category_id}'):
+        builder.row(*nav)
 
     # Use translated text for "Back" button
     back_text_key = "back_button"
@@ -43,6 +59,14 @@ def show_product_by_category(category_id: int, user_language: str) -> InlineKeyb
     return builder.as_markup()
 
 
+async def show_product_by_category(category_id: int, user_language: str, after_id: Optional[int] = None,
+                                   before_id: Optional[int] = None) -> InlineKeyboardMarkup:
+    """Product buttons, one page of the category"""
+    await db_ensure_catalog()
+    return _product_menu(category_id, user_language, after_id, before_id)
+
+
+@cached_markup()
 def go_back_to_products(category_id: int, user_language) -> InlineKeyboardMarkup:
     """Back button for going back to product list"""
     builder = InlineKeyboardBuilder()
@@ -54,33 +78,33 @@ def go_back_to_products(category_id: int, user_language) -> InlineKeyboardMarkup
     return builder.as_markup()
 
 
-def generate_constructor_button(user_language, quantity=1) -> InlineKeyboardMarkup:
-    """buttons for selecting quantity of products"""
+@cached_markup()
+def generate_constructor_button(user_language, product_id: int, quantity=1) -> InlineKeyboardMarkup:
+    """buttons for selecting quantity of products, product id and quantity travel in callback data"""
 
     builder = InlineKeyboardBuilder()
     # Use translated text for quantity decrease button
     quantity_decrease_text_key = "quantity_decrease"
     quantity_decrease_text = translations[user_language][quantity_decrease_text_key]
-    builder.button(text=quantity_decrease_text, callback_data="action -")
+    builder.button(text=quantity_decrease_text, callback_data=f"action - {product_id} {quantity}")
     builder.button(text=str(quantity), callback_data=str(quantity))
     # Use translated text for quantity increase button
     quantity_increase_text_key = "quantity_increase"
     quantity_increase_text = translations[user_language][quantity_increase_text_key]
-    builder.button(text=quantity_increase_text, callback_data="action +")
+    builder.button(text=quantity_increase_text, callback_data=f"action + {product_id} {quantity}")
     # Use translated text for "Add to cart" button
     add_to_cart_text_key = "add_to_cart_button"
     add_to_cart_text = translations[user_language][add_to_cart_text_key]
-    builder.button(text=add_to_cart_text, callback_data="add_to_cart")
+    builder.button(text=add_to_cart_text, callback_data=f"add_to_cart {product_id} {quantity}")
 
     builder.adjust(3, 1)
     return builder.as_markup()
 
 
-def generate_buttons_for_finally(user_language, product_carts: Iterable[Finally_carts]) -> InlineKeyboardMarkup:
+def generate_buttons_for_finally(user_language, product_carts: Iterable[CartLineRow]) -> InlineKeyboardMarkup:
     """buttons for buying products from cart and update quantity of products"""
     builder = InlineKeyboardBuilder()
-    print(product_carts.__sizeof__())
-    if product_carts.__sizeof__() > 0:
+    if product_carts:
         # Use translated text for "Purchase" button
         purchase_text_key = "purchase_button"
         purchase_text = translations[user_language][purchase_text_key]
@@ -90,61 +114,67 @@ def generate_buttons_for_finally(user_language, product_carts: Iterable[Finally_
             # Use translated text for quantity increase button
             quantity_increase_text_key = "quantity_increase"
             quantity_increase_text = translations[user_language][quantity_increase_text_key]
-            builder.button(text=quantity_increase_text, callback_data=f'add_{cart["id"]}')
-            builder.button(text=f'{cart["product_name"]}', callback_data='product')
+            builder.button(text=quantity_increase_text, callback_data=f'add_{cart.id}')
+            builder.button(text=f'{cart.product_name}', callback_data='product')
             # Use translated text for quantity decrease button
             quantity_decrease_text_key = "quantity_decrease"
             quantity_decrease_text = translations[user_language][quantity_decrease_text_key]
-            builder.button(text=quantity_decrease_text, callback_data=f'minus_{cart["id"]}')
+            builder.button(text=quantity_decrease_text, callback_data=f'minus_{cart.id}')
             # Use translated text for "Remove" button
             remove_item_text_key = "remove_item_button"
             remove_item_text = translations[user_language][remove_item_text_key]
-            builder.button(text=remove_item_text, callback_data=f'remove_{cart["id"]}')
+            builder.button(text=remove_item_text, callback_data=f'remove_{cart.id}')
 
         builder.adjust(1, 4)
 
     return builder.as_markup()
 
 
-def generate_categories_for_admin(categories):
+def generate_categories_for_admin(page: Page):
     """Generate keyboard with categories for admin"""
     keyboard = []
-    for category in categories:
+    for category in page.rows:
         keyboard.append([
             InlineKeyboardButton(
-                text=f"{category['category_name']}",
-                callback_data=f"admin_category_{category['id']}"
+                text=f"{category.category_name}",
+                callback_data=f"admin_category_{category.id}"
             )
         ])
 
+    if nav := page_nav_row(page, "admcat_pick"):
+        keyboard.append(nav)
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
-def generate_categories_for_admin_edit(categories):
+def generate_categories_for_admin_edit(page: Page):
     """Generate keyboard with categories for admin"""
     keyboard = []
-    for category in categories:
+    for category in page.rows:
         keyboard.append([
             InlineKeyboardButton(
-                text=f"{category['category_name']}",
-                callback_data=f"admin_category_edit_{category['id']}"
+                text=f"{category.category_name}",
+                callback_data=f"admin_category_edit_{category.id}"
             )
         ])
 
+    if nav := page_nav_row(page, "admcat_edit"):
+        keyboard.append(nav)
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
-def generate_products_for_admin(products):
+def generate_products_for_admin(page: Page):
     """Generate keyboard with products for admin"""
     keyboards = []
-    for product in products:
+    for product in page.rows:
         keyboards.append([
             InlineKeyboardButton(
-                text=f"{product['product_name']}",
-                callback_data=f"admin_prod_{product['id']}"
+                text=f"{product.product_name}",
+                callback_data=f"admin_prod_{product.id}"
             )
         ])
 
+    if nav := page_nav_row(page, "admprod"):
+        keyboards.append(nav)
     return InlineKeyboardMarkup(inline_keyboard=keyboards)
 
 
@@ -208,3 +238,39 @@ def generate_confirm_delete_keyboard(item_type, item_id, lang):
     ]
 
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+def generate_broadcast_confirm_keyboard(lang):
+    """Generate keyboard for confirming a broadcast"""
+    keyboard = [
+        [
+            InlineKeyboardButton(
+                text=translations[lang]["broadcast_send_button"],
+                callback_data="broadcast_confirm"
+            ),
+            InlineKeyboardButton(
+                text=translations[lang]["broadcast_cancel_button"],
+                callback_data="broadcast_cancel"
+            )
+        ]
+    ]
+
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+def generate_order_history_keyboard(page: Page) -> InlineKeyboardMarkup:
+    """Older/newer navigation of the order history, newest orders come first"""
+    return InlineKeyboardMarkup(inline_keyboard=[row] if (row := page_nav_row(page, 'histpage')) else [])
+
+
+def generate_reorder_keyboard(page: Page, lang: str) -> InlineKeyboardMarkup:
+    """One repeat button per past order, newest first"""
+    keyboard = [[InlineKeyboardButton(
+        text=translations[lang]["reorder_button"].format(order_id=order.id,
+                                                         date=order.created_at.strftime("%d.%m.%Y"),
+                                                         total_price=order.total_price),
+        callback_data=f"reorder_{order.id}"
+    )] for order in page.rows]
+    if nav := page_nav_row(page, 'reordpage'):
+        keyboard.append(nav)
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
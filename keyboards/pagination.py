@@ -0,0 +1,29 @@
+from os import getenv
+from typing import Optional
+
+from aiogram.utils.keyboard import InlineKeyboardButton
+from dotenv import load_dotenv
+
+from database.dto import Page
+
+load_dotenv()
+
+CATALOG_PAGE_SIZE = int(getenv('CATALOG_PAGE_SIZE', '10'))
+ADMIN_PAGE_SIZE = int(getenv('ADMIN_PAGE_SIZE', '20'))
+HISTORY_PAGE_SIZE = int(getenv('HISTORY_PAGE_SIZE', '5'))
+
+
+def page_nav_row(page: Page, prefix: str) -> list[InlineKeyboardButton]:
+    """Prev/next buttons, the callback carries the id of the first/last row shown as keyset cursor"""
+    row = []
+    if page.has_prev and page.rows:
+        row.append(InlineKeyboardButton(text="⬅️", callback_data=f"{prefix}_prev_{page.rows[0].id}"))
+    if page.has_next and page.rows:
+        row.append(InlineKeyboardButton(text="➡️", callback_data=f"{prefix}_next_{page.rows[-1].id}"))
+    return row
+
+
+def parse_page_callback(data: str) -> tuple[Optional[int], Optional[int]]:
+    """'<prefix>_next_<id>' -> (after_id, None), '<prefix>_prev_<id>' -> (None, before_id)"""
+    *_, direction, cursor = data.split("_")
+    return (int(cursor), None) if direction == "next" else (None, int(cursor))
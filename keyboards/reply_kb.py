@@ -1,51 +1,60 @@
 from aiogram.utils.keyboard import ReplyKeyboardMarkup, ReplyKeyboardBuilder
 from translation import translations
+from utils.i18n import (MAKE_ORDER_MAIN_MENU, HISTORY_MAIN_MENU, CARTS_MAIN_MENU, SETTINGS_MAIN_MENU,
+                        MAIN_MENU_BUTTON, MAIN_MENU_BUTTON_TEXT, GO_BACK_BUTTON, CHANGE_LANGUAGE_SETTING,
+                        LANGUAGE_BUTTONS)
+from .cache import cached_markup
 
+
+@cached_markup()
 def share_phono_button() -> ReplyKeyboardMarkup:
     builder = ReplyKeyboardBuilder()
     builder.button(text="Share your phone number ☎️", request_contact=True)
     return builder.as_markup(resize_keyboard=True)
 
 
+@cached_markup()
 def generate_main_menu(user_lang) -> ReplyKeyboardMarkup:
     """main menu button"""
     builder = ReplyKeyboardBuilder()
-    builder.button(text=translations[user_lang]["make_order_main_menu"])
-    builder.button(text=translations[user_lang]["history_main_menu"])
-    builder.button(text=translations[user_lang]["carts_main_menu"])
-    builder.button(text=translations[user_lang]["settings_main_menu"])
+    builder.button(text=translations[user_lang][MAKE_ORDER_MAIN_MENU])
+    builder.button(text=translations[user_lang][HISTORY_MAIN_MENU])
+    builder.button(text=translations[user_lang][CARTS_MAIN_MENU])
+    builder.button(text=translations[user_lang][SETTINGS_MAIN_MENU])
 
     builder.adjust(1, 3)
     return builder.as_markup(resize_keyboard=True)
 
 
+@cached_markup()
 def back_to_main_menu(lang) -> ReplyKeyboardMarkup:
     builder = ReplyKeyboardBuilder()
-    builder.button(text=translations[lang]["main_menu_button"])
+    builder.button(text=translations[lang][MAIN_MENU_BUTTON])
 
     return builder.as_markup(resize_keyboard=True)
 
 
+@cached_markup()
 def back_arrow_button(lang) -> ReplyKeyboardMarkup:
     builder = ReplyKeyboardBuilder()
-    builder.button(text=translations[lang]["go_back_button"])
+    builder.button(text=translations[lang][GO_BACK_BUTTON])
     return builder.as_markup(resize_keyboard=True)
 
 
+@cached_markup()
 def setting_commands(is_admin, lang) -> ReplyKeyboardMarkup:
     builder = ReplyKeyboardBuilder()
     if is_admin:
         builder.button(text="🔐Admin")
 
-    builder.button(text=translations[lang]["change_language_setting"])
-    builder.button(text=translations[lang]["main_menu_button_text"])
+    builder.button(text=translations[lang][CHANGE_LANGUAGE_SETTING])
+    builder.button(text=translations[lang][MAIN_MENU_BUTTON_TEXT])
     return builder.as_markup(resize_keyboard=True)
 
 
+@cached_markup()
 def language_select_buttons() -> ReplyKeyboardMarkup:
     builder = ReplyKeyboardBuilder()
-    builder.button(text="UZ 🇺🇿")
-    builder.button(text="RU 🇷🇺")
-    builder.button(text="ENG 🏴󠁧󠁢󠁥󠁮󠁧󠁿")
+    [builder.button(text=text) for text in LANGUAGE_BUTTONS]
 
     return builder.as_markup(resize_keyboard=True)
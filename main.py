@@ -1,34 +1,68 @@
 import asyncio
+import logging
 
 from os import getenv
 from aiogram import Bot, Dispatcher, F
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 from aiogram.filters import CommandStart
-from aiogram.types import Message, CallbackQuery, FSInputFile, InputMediaPhoto, LabeledPrice
+from aiogram.types import Message, CallbackQuery, LabeledPrice
 from aiogram.exceptions import TelegramBadRequest
+from sqlalchemy.ext.asyncio import AsyncSession
 from dotenv import load_dotenv
 
 from admin.admin_commands import admin_router
 from keyboards.inline_kb import *
 from keyboards.reply_kb import *
+from keyboards.cache import markup_cache
+from keyboards.pagination import HISTORY_PAGE_SIZE, parse_page_callback
+from database.cache import catalog_cache, order_history_cache
 from database.utils import *
 from translation import translations
 from utils.helper import *
+from utils.photos import send_product_photo, edit_product_photo
+from utils.broadcast import broadcast_engine
+from utils.notifier import order_notifier
+from utils.i18n import Intent, LANGUAGE_BUTTONS
+from utils.ingest import close_media
+from utils.log import setup_logging
+from utils.metrics import instrument_engine, stats_collector, start_metrics_server
+from utils.webhook import run_webhook
 from filters.admin_filters import is_admin
-from translation import LANG
+from filters.intent_filters import MenuIntent
+from middlewares.db import DbSessionMiddleware
+from middlewares.lang import LangMiddleware
+from middlewares.log_context import LogContextMiddleware
+from middlewares.metrics import UpdateMetricsMiddleware, HandlerNameMiddleware
+from middlewares.send_scheduler import create_bot_session, send_scheduler
+from storage import LANG, FSM_STORAGE, close_storage
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 TOKEN = getenv('TOKEN')
 PAYMENT = getenv('PAYMENT')
-MANAGER = getenv('MANAGER')
+BOT_MODE = getenv('BOT_MODE', 'polling')  # polling | webhook
 ADMIN_IDS = [int(id) for id in getenv('ADMIN_IDS', '').split(',')]
 
-dp = Dispatcher()
+dp = Dispatcher(storage=FSM_STORAGE)
+dp.update.outer_middleware(LogContextMiddleware())
+dp.update.outer_middleware(UpdateMetricsMiddleware())
+dp.update.outer_middleware(LangMiddleware())
+dp.update.outer_middleware(DbSessionMiddleware())
+dp.message.middleware(HandlerNameMiddleware())
+dp.callback_query.middleware(HandlerNameMiddleware())
 dp.include_router(admin_router)
 
+instrument_engine(engine)
+stats_collector.add("send", send_scheduler.stats)
+stats_collector.add("markup_cache", markup_cache.stats)
+stats_collector.add("catalog_cache", catalog_cache.stats)
+stats_collector.add("order_history_cache", order_history_cache.stats)
+
 bot = Bot(TOKEN,
+          session=create_bot_session(),
           default=DefaultBotProperties(
               parse_mode=ParseMode.HTML,
           )
@@ -36,43 +70,49 @@ bot = Bot(TOKEN,
 
 
 
-def get_translated_text(key):
-    # lang = LANG.get(chat_id, "uz")
-    return [translations[lang][key] for lang in translations]
+@dp.startup()
+async def on_startup():
+    await order_notifier.start(bot)
+    await broadcast_engine.start(bot)
+
+
+@dp.shutdown()
+async def on_shutdown():
+    await broadcast_engine.close()
+    await order_notifier.close()
+    await close_media()
+    await close_storage()
+    await send_scheduler.close()
 
 
 @dp.message(CommandStart())
-async def command_start(message: Message):
+async def command_start(message: Message, session: AsyncSession):
     """start bot"""
     user_id = message.from_user.id
     chat_id = message.chat.id
     full_name = message.from_user.full_name
-    print("fullname" + full_name)
 
-    user_lang = db_get_user_lang(chat_id)[0]
-
-    language = user_lang if user_lang else "uz"
+    language = LANG.get(chat_id, "uz")
     admin_status = is_admin(user_id)
 
-    print("admin status: " + str(admin_status))
+    logger.debug("Start from %s, admin: %s", full_name, admin_status)
     await message.answer(translations[language]["welcome_message"].format(user_name=full_name))
     if admin_status:
         await message.answer(translations[language]["admin_access_detected"])
 
-    await user_register(message)
+    await user_register(message, session=session)
 
 
-async def user_register(message: Message):
+async def user_register(message: Message, session: AsyncSession):
     chat_id = message.chat.id
-    user = db_get_user(chat_id)
+    user = await db_get_user(chat_id, session=session)
     if user:
-        user_lang = db_get_user_lang(chat_id)[0]
-        print("User lang: " + str(user_lang))
+        user_lang = LANG.get(chat_id)
+        logger.debug("User lang: %s", user_lang)
         if not user_lang:
             await message.answer(translations["uz"]["menu_change_language"], reply_markup=language_select_buttons())
             return
 
-        LANG[chat_id] = user_lang
         await show_main_menu(message)
     else:
         await message.answer(text="To connect with you we need your phone number",
@@ -80,13 +120,13 @@ async def user_register(message: Message):
 
 
 @dp.message(F.contact)
-async def update_user_contact(message: Message):
+async def update_user_contact(message: Message, session: AsyncSession):
     """Update user contact info"""
     chat_id = message.chat.id
     phone = message.contact.phone_number
     lang = LANG.get(chat_id, "uz")
-    dp_update_user(chat_id, phone)
-    if db_create_user_cart(chat_id):
+    await db_register_user(message.from_user.full_name, chat_id, phone, session=session)
+    if await db_create_user_cart(chat_id, session=session):
         await message.answer(text=translations[lang]["registration_completed"])
 
     await show_main_menu(message)
@@ -100,8 +140,7 @@ async def show_main_menu(message: Message):
                          reply_markup=generate_main_menu(user_lang))
 
 
-@dp.message(F.text.in_(get_translated_text("make_an_order")))
-async def make_order(message: Message):
+async def make_order(message: Message, session: AsyncSession):
     """ordering function"""
     chat_id = message.chat.id
     lang = LANG.get(chat_id, "uz")
@@ -111,18 +150,17 @@ async def make_order(message: Message):
                            reply_markup=back_to_main_menu(lang))
 
     await message.answer(text=translations[lang]["choose_category"],
-                         reply_markup=generate_category_menu(chat_id, lang))
+                         reply_markup=await generate_category_menu(chat_id, lang, session=session))
 
 
-@dp.message(F.text.in_(get_translated_text("main_menu_button")))
-async def return_to_main_menu(message: Message):
+async def return_to_main_menu(message: Message, session: AsyncSession):
     """back to main menu"""
     try:
         await bot.delete_message(chat_id=message.chat.id,
                                  message_id=message.message_id - 1)
         await show_main_menu(message)
     except TelegramBadRequest as e:
-        print(e.message)
+        logger.debug("Main menu: %s", e.message)
 
 
 @dp.callback_query(F.data.regexp(r'category_'))
@@ -137,11 +175,32 @@ async def show_product_button(call: CallbackQuery):
 
     await bot.send_message(text=translations[lang]["choose_product"],
                            chat_id=chat_id,
-                           reply_markup=show_product_by_category(category_id, lang))
+                           reply_markup=await show_product_by_category(category_id, lang))
+
+
+@dp.callback_query(F.data.startswith('prodpage_'))
+async def page_product_button(call: CallbackQuery):
+    """prodpage_<category_id>_<next|prev>_<cursor>"""
+    chat_id = call.message.chat.id
+    lang = LANG.get(chat_id, "uz")
+    category_id = int(call.data.split('_')[1])
+    after_id, before_id = parse_page_callback(call.data)
+    await call.message.edit_reply_markup(reply_markup=await show_product_by_category(category_id, lang,
+                                                                                     after_id, before_id))
+
+
+@dp.callback_query(F.data.startswith('catpage_'))
+async def page_category_button(call: CallbackQuery, session: AsyncSession):
+    chat_id = call.message.chat.id
+    lang = LANG.get(chat_id, "uz")
+    after_id, before_id = parse_page_callback(call.data)
+    await call.message.edit_reply_markup(reply_markup=await generate_category_menu(chat_id, lang, session=session,
+                                                                                   after_id=after_id,
+                                                                                   before_id=before_id))
 
 
 @dp.callback_query(F.data == 'return_to_category')
-async def return_to_category_button(call: CallbackQuery):
+async def return_to_category_button(call: CallbackQuery, session: AsyncSession):
     """return to select product categories"""
     chat_id = call.message.chat.id
     lang = LANG.get(chat_id, "uz")
@@ -150,12 +209,12 @@ async def return_to_category_button(call: CallbackQuery):
     await bot.edit_message_text(chat_id=chat_id,
                                 message_id=message_id,
                                 text=translations[lang]["choose_category"],
-                                reply_markup=generate_category_menu(chat_id, lang)
+                                reply_markup=await generate_category_menu(chat_id, lang, session=session)
                                 )
 
 
 @dp.callback_query(F.data.startswith('product_'))
-async def show_product_details(call: CallbackQuery):
+async def show_product_details(call: CallbackQuery, session: AsyncSession):
     """show selected product details"""
     chat_id = call.message.chat.id
     lang = LANG.get(chat_id, "uz")
@@ -164,101 +223,101 @@ async def show_product_details(call: CallbackQuery):
 
     product_id = int(data[-1])
 
-    product = db_product_details(product_id)
-    print(product)
+    product = await db_product_details(product_id)
     await bot.delete_message(chat_id=chat_id,
                              message_id=message_id)
 
-    if user_cart := db_get_user_cart(chat_id):
-        db_update_user_cart(price=product["price"], cart_id=user_cart["id"])
-        text = text_for_caption(product_name=product["product_name"], price=product["price"], description=product["description"])
+    if not product:
+        await bot.send_message(chat_id=chat_id, text=translations[lang]["product_not_exist"])
+        return
+
+    if await db_get_user_cart(chat_id, session=session):
+        text = text_for_caption(product_name=product.product_name, price=product.price, description=product.description)
 
         await bot.send_message(chat_id=chat_id,
                                text=translations[lang]["choose_modification"],
                                reply_markup=back_arrow_button(lang))
 
-        await bot.send_photo(chat_id=chat_id,
-                             photo=FSInputFile(path=product["image"]),
-                             caption=text,
-                             reply_markup=generate_constructor_button(lang)
-                             )
+        await send_product_photo(bot, chat_id, product,
+                                 caption=text,
+                                 reply_markup=generate_constructor_button(lang, product_id))
 
     else:
         await bot.send_message(chat_id=chat_id,
-                               text=translations[chat_id]["phone_number_required"],
+                               text=translations[lang]["phone_number_required"],
                                reply_markup=share_phono_button())
 
 
-@dp.message(F.text.in_(get_translated_text("go_back_button")))
-async def return_to_category_menu(message: Message):
+async def return_to_category_menu(message: Message, session: AsyncSession):
     """Back to product selection"""
     try:
         await bot.delete_message(chat_id=message.chat.id, message_id=message.message_id - 1)
-        await make_order(message)
+        await make_order(message, session=session)
     except TelegramBadRequest:
         pass
 
 
 @dp.callback_query(F.data.regexp(r'action [+-]'))
 async def increase_product_quantity(call: CallbackQuery):
-    """Increase quantity of product"""
+    """Increase quantity of product, product id and current quantity come with callback data"""
     chat_id = call.message.chat.id
     lang = LANG.get(chat_id, "uz")
     message_id = call.message.message_id
-    product_name = call.message.caption.split("\n")[0].strip()
-    action = call.data.split()[-1]
+    _, action, product_id, quantity = call.data.split()
+    quantity = int(quantity)
 
-    product = db_get_product_by_name(product_name)
-    user_cart = db_get_user_cart(chat_id)
+    product = await db_product_details(int(product_id))
+    if not product:
+        await call.answer(translations[lang]["product_not_exist"])
+        return
 
     if action == '+':
-        user_cart["total_products"] += 1
-    elif action == '-':
-        if user_cart["total_products"] < 2:
-            await call.answer(translations[lang]["quantity_minimum"])
-        else:
-            user_cart["total_products"] -= 1
-
-    product_price = product["price"] * user_cart["total_products"]
-    db_update_user_cart(price=product_price,
-                        cart_id=user_cart["id"],
-                        quantity=user_cart["total_products"])
+        quantity += 1
+    elif quantity < 2:
+        await call.answer(translations[lang]["quantity_minimum"])
+        return
+    else:
+        quantity -= 1
 
-    text = text_for_caption(product_name=product["product_name"], price=product_price, description=product["description"])
+    product_price = product.price * quantity
+    text = text_for_caption(product_name=product.product_name, price=product_price, description=product.description)
 
     try:
-        await bot.edit_message_media(chat_id=chat_id,
-                                     message_id=message_id,
-                                     media=InputMediaPhoto(
-                                         media=FSInputFile(path=product['image']),
-                                         caption=text
-                                     ),
-                                     reply_markup=generate_constructor_button(
-                                         lang,
-                                         quantity=user_cart["total_products"])
-                                     )
+        await edit_product_photo(bot, chat_id, message_id, product,
+                                 caption=text,
+                                 reply_markup=generate_constructor_button(
+                                     lang,
+                                     product.id,
+                                     quantity=quantity)
+                                 )
     except TelegramBadRequest:
         pass
 
 
-@dp.callback_query(F.data == 'add_to_cart')
-async def put_products_to_cart(call: CallbackQuery):
+@dp.callback_query(F.data.startswith('add_to_cart '))
+async def put_products_to_cart(call: CallbackQuery, session: AsyncSession):
     """Put products to cart"""
     try:
         chat_id = call.message.chat.id
         lang = LANG.get(chat_id, "uz")
         message_id = call.message.message_id
-        product_name = call.message.caption.split("\n")[0].strip()
-        product = db_get_product_by_name(product_name)
-        user_cart = db_get_user_cart(chat_id)
+        _, product_id, quantity = call.data.split()
+        quantity = int(quantity)
+        product = await db_product_details(int(product_id))
 
         await bot.delete_message(chat_id=chat_id,
                                  message_id=message_id)
 
-        if db_insert_or_update_finally_cart(cart_id=user_cart["id"],
-                                            product_name=product_name,
-                                            total_products=user_cart["total_products"],
-                                            total_price=user_cart["total_price"]):
+        if not product:
+            await bot.send_message(chat_id=chat_id, text=translations[lang]["product_not_exist"])
+            return
+
+        product_name = product.product_name
+        if await db_insert_or_update_finally_cart(chat_id=chat_id,
+                                                  product_name=product_name,
+                                                  total_products=quantity,
+                                                  total_price=product.price * quantity,
+                                                  session=session):
 
             await bot.send_message(chat_id=chat_id,
                                    text=translations[lang]["added_to_cart"].format(product_name=product_name))
@@ -266,14 +325,14 @@ async def put_products_to_cart(call: CallbackQuery):
             await bot.send_message(chat_id=chat_id,
                                    text=translations[lang]["updated_in_cart"].format(product_name=product_name))
 
-        await return_to_category_menu(call.message)
+        await return_to_category_menu(call.message, session=session)
 
     except TelegramBadRequest:
         pass
 
 
 @dp.callback_query(F.data == 'your_cart')
-async def show_product_inside_cart(call: CallbackQuery):
+async def show_product_inside_cart(call: CallbackQuery, session: AsyncSession):
     try:
         chat_id = call.message.chat.id
         message_id = call.message.message_id
@@ -281,101 +340,111 @@ async def show_product_inside_cart(call: CallbackQuery):
         await bot.delete_message(chat_id=chat_id,
                                  message_id=message_id)
 
-        text, cart_products = count_products_from_cart(chat_id, "Test")
+        text, cart_products = await count_products_from_cart(chat_id, "Test", session=session)
         await bot.send_message(chat_id=chat_id, text=text, reply_markup=generate_buttons_for_finally(lang, cart_products))
 
     except TelegramBadRequest as e:
-        print(e.message)
+        logger.debug("Cart view: %s", e.message)
 
 
-@dp.callback_query(F.data.regexp(r'^(add_|minus_|remove_)'))
-async def update_finally_cart_products(call: CallbackQuery):
+@dp.callback_query(F.data.regexp(r'^(add|minus|remove)_\d+$'))
+async def update_finally_cart_products(call: CallbackQuery, session: AsyncSession):
+    """Change quantity of cart line, one transaction returns the refreshed cart"""
     chat_id = call.message.chat.id
     message_id = call.message.message_id
     lang = LANG.get(chat_id, "uz")
-    cart_id = call.data.split('_')[-1].strip()
-    action = call.data.split('_')[0].strip()
-
-    finally_cart = db_get_finally_cart(int(cart_id))
-    product = db_get_product_by_name(finally_cart["product_name"])
-    if action == 'remove':
-        if db_delete_product_from_finally_cart(int(cart_id)):
-            await call.answer(text=f"Product removed from cart")
-
-    new_price = 0
-    new_quantity = 0
-    if product:
-        if action == 'add':
-            new_price = finally_cart["final_price"] + product["price"]
-            new_quantity = finally_cart["quantity"] + 1
-        elif action == 'minus':
-            new_price = finally_cart["final_price"] - product["price"]
-            new_quantity = finally_cart["quantity"] - 1
-    else:
-        await call.answer(text=translations[lang]["product_not_exist"])
-
-    if new_quantity > 0:
-        db_update_finally_cart(int(cart_id), new_price, new_quantity)
-    else:
-        if db_delete_product_from_finally_cart(int(cart_id)):
-            product_name = product["product_name"] if product else "Product"
-            await call.answer(text=translations[lang]["removed_from_cart"])
+    action, line_id = call.data.split('_')
 
-    text, cart_products = count_products_from_cart(chat_id, "Test")
-    await bot.edit_message_text(chat_id=chat_id,
-                                text=text,
-                                message_id=message_id,
-                                reply_markup=generate_buttons_for_finally(lang, cart_products)
-                                )
+    status, product_name, cart, cart_products = await db_change_finally_cart_line(chat_id, int(line_id), action,
+                                                                                  session=session)
+    if status == "missing":
+        await call.answer(text=translations[lang]["product_not_exist"])
+    elif status == "removed":
+        await call.answer(text=translations[lang]["removed_from_cart"].format(product_name=product_name))
 
+    text = cart_text(cart, cart_products, "Test")
+    try:
+        await bot.edit_message_text(chat_id=chat_id,
+                                    text=text,
+                                    message_id=message_id,
+                                    reply_markup=generate_buttons_for_finally(lang, cart_products)
+                                    )
+    except TelegramBadRequest:
+        pass
 
 
 @dp.callback_query(F.data == 'purchase')
-async def create_order(call: CallbackQuery):
+async def create_order(call: CallbackQuery, session: AsyncSession):
     chat_id = call.message.chat.id
     message_id = call.message.message_id
     lang = LANG.get(chat_id, "uz")
-    await bot.delete_message(chat_id=chat_id, message_id=message_id)
 
-    content = count_products_for_purchase(chat_id)
-    print(content)
+    # the cart message id makes a double tap on "purchase" hit the same order
+    order, created = await db_checkout(chat_id, f"{chat_id}:{message_id}", session=session)
+    if not created:
+        await call.answer(text=None if order else translations[lang]["cart_empty"])
+        return
 
-    text = content[0]
-    total_price = content[1]
+    run_after_commit(session, lambda: order_notifier.notify(order.id))
+    await session.commit()
 
+    await bot.delete_message(chat_id=chat_id, message_id=message_id)
     await bot.send_invoice(chat_id=chat_id,
                            title=translations[lang]["your_order"],
-                           description=text,
-                           payload="bot-defined invoice payload",
+                           description=order_cheque(order),
+                           payload=f"order:{order.id}",
                            provider_token=PAYMENT,
                            currency="UZS",
                            prices=[
-                               LabeledPrice(label="Total price", amount=int(total_price) * 100),
+                               LabeledPrice(label="Total price", amount=int(order.total_price) * 100),
                                LabeledPrice(label="Delivery", amount=10000)
                            ])
     await bot.send_message(chat_id=chat_id, text=translations[lang]["purchase_completed"])
-    await sending_report_to_manager(chat_id, text)
-    user_cart = db_get_user_cart(chat_id)
-    db_clear_finally_cart(user_cart.id)
 
 
-async def sending_report_to_manager(chat_id: int, text: str):
-    """Sending message to group chat"""
-    user = db_get_user_info(chat_id)
-    text += f"\n\n<b>Customer name: {user.name}\nContact: {user.phone}</b>\n\n"
+async def show_carts(message: Message, session: AsyncSession):
+    """Past orders as saved carts, one tap puts an order back into the cart"""
+    chat_id = message.chat.id
+    lang = LANG.get(chat_id, "uz")
+    page = await db_get_order_history_page(chat_id, HISTORY_PAGE_SIZE, session=session)
+    if not page.rows:
+        await message.answer(text=translations[lang]["history_empty"])
+        return
 
-    await bot.send_message(chat_id=MANAGER, text=text)
+    await message.answer(text=translations[lang]["reorder_prompt"], reply_markup=generate_reorder_keyboard(page, lang))
 
 
-@dp.message(F.text.in_(get_translated_text("carts_main_menu")))
-async def show_carts(message: Message):
-    chat_id = message.chat.id
+@dp.callback_query(F.data.startswith('reordpage_'))
+async def page_saved_carts(call: CallbackQuery, session: AsyncSession):
+    chat_id = call.message.chat.id
     lang = LANG.get(chat_id, "uz")
-    await message.answer(text=translations[lang]["carts_selected"])
+    after_id, before_id = parse_page_callback(call.data)
+    page = await db_get_order_history_page(chat_id, HISTORY_PAGE_SIZE, after_id, before_id, session=session)
+    await call.message.edit_reply_markup(reply_markup=generate_reorder_keyboard(page, lang))
 
 
-@dp.message(F.text.in_(get_translated_text("settings_main_menu")))
-async def show_settings(message: Message):
+@dp.callback_query(F.data.regexp(r'^reorder_\d+$'))
+async def reorder(call: CallbackQuery, session: AsyncSession):
+    """Copy the order's lines into the cart in one statement and show the cart"""
+    chat_id = call.message.chat.id
+    lang = LANG.get(chat_id, "uz")
+    order_id = int(call.data.split('_')[1])
+    result = await db_reorder(chat_id, order_id, session=session)
+    if result is None:
+        await call.answer(text=translations[lang]["product_not_exist"])
+        return
+
+    restored, dropped = result
+    notice = translations[lang]["reorder_done"].format(count=restored, order_id=order_id)
+    if dropped:
+        notice += "\n" + translations[lang]["reorder_dropped"].format(count=dropped)
+    await call.answer(text=notice, show_alert=bool(dropped))
+
+    text, cart_products = await count_products_from_cart(chat_id, "Test", session=session)
+    await bot.send_message(chat_id=chat_id, text=text, reply_markup=generate_buttons_for_finally(lang, cart_products))
+
+
+async def show_settings(message: Message, session: AsyncSession):
     chat_id = message.chat.id
     lang = LANG.get(chat_id, "uz")
     user_id = message.from_user.id
@@ -384,50 +453,83 @@ async def show_settings(message: Message):
                          reply_markup=setting_commands(admin_status, lang))
 
 
-@dp.message(F.text.in_(get_translated_text("history_main_menu")))
-async def show_history(message: Message):
+async def show_history(message: Message, session: AsyncSession):
     chat_id = message.chat.id
     lang = LANG.get(chat_id, "uz")
-    await message.answer(translations[lang]["history_selected"])
+    page = await db_get_order_history_page(chat_id, HISTORY_PAGE_SIZE, session=session)
+    if not page.rows:
+        await message.answer(translations[lang]["history_empty"])
+        return
+
+    await message.answer(order_history_text(page, lang), reply_markup=generate_order_history_keyboard(page))
+
+
+@dp.callback_query(F.data.startswith('histpage_'))
+async def page_order_history(call: CallbackQuery, session: AsyncSession):
+    chat_id = call.message.chat.id
+    lang = LANG.get(chat_id, "uz")
+    after_id, before_id = parse_page_callback(call.data)
+    page = await db_get_order_history_page(chat_id, HISTORY_PAGE_SIZE, after_id, before_id, session=session)
+    try:
+        await call.message.edit_text(order_history_text(page, lang), reply_markup=generate_order_history_keyboard(page))
+    except TelegramBadRequest:
+        pass
 
 
-@dp.message(F.text.in_(get_translated_text("change_language_setting")))
-async def change_language_settings(message: Message):
+async def change_language_settings(message: Message, session: AsyncSession):
     chat_id = message.chat.id
     lang = LANG.get(chat_id, "uz")
     await message.answer(translations[lang]["menu_change_language"], reply_markup=language_select_buttons())
 
 
-@dp.message(F.text == "UZ 🇺🇿")
-async def change_to_uzb(message: Message):
-    chat_id = message.chat.id
-    LANG[chat_id] = "uz"
-    db_add_lang(chat_id, "uz")
-    await message.answer("O'zbek tili sozlandi!")
-    await show_main_menu(message)
+LANGUAGE_INSTALLED = {
+    "uz": "O'zbek tili sozlandi!",
+    "ru": "Русский язык установлен!",
+    "en": "English language installed!",
+}
 
 
-@dp.message(F.text == "RU 🇷🇺")
-async def change_to_ru(message: Message):
+async def set_language(message: Message, session: AsyncSession):
     chat_id = message.chat.id
-    LANG[chat_id] = "ru"
-    db_add_lang(chat_id, "ru")
-    await message.answer("Русский язык установлен!")
+    lang = LANGUAGE_BUTTONS[message.text]
+    await LANG.save(chat_id, lang, session=session)
+    await message.answer(LANGUAGE_INSTALLED[lang])
     await show_main_menu(message)
 
 
-@dp.message(F.text == "ENG 🏴󠁧󠁢󠁥󠁮󠁧󠁿")
-async def change_to_eng(message: Message):
-    chat_id = message.chat.id
-    LANG[chat_id] = "en"
-    db_add_lang(chat_id, "en")
-    await message.answer("English language installed!")
-    await show_main_menu(message)
+INTENT_HANDLERS = {
+    Intent.MAKE_ORDER: make_order,
+    Intent.MAIN_MENU: return_to_main_menu,
+    Intent.GO_BACK: return_to_category_menu,
+    Intent.HISTORY: show_history,
+    Intent.CARTS: show_carts,
+    Intent.SETTINGS: show_settings,
+    Intent.CHANGE_LANGUAGE: change_language_settings,
+    Intent.SET_LANGUAGE: set_language,
+}
+
+
+@dp.message(MenuIntent())
+async def route_menu_text(message: Message, intent: str, session: AsyncSession):
+    """Reply keyboard buttons of every language, resolved by MenuIntent with one dict lookup"""
+    await INTENT_HANDLERS[intent](message, session)
 
 
 async def main():
-    await dp.start_polling(bot)
+    metrics = await start_metrics_server()
+    try:
+        if BOT_MODE == 'webhook':
+            await run_webhook(dp, bot)
+        else:
+            await dp.start_polling(bot)
+    finally:
+        if metrics is not None:
+            await metrics.cleanup()
 
 
 if __name__ == '__main__':
-    asyncio.run(main())
+    listener = setup_logging()
+    try:
+        asyncio.run(main())
+    finally:
+        listener.stop()
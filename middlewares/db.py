@@ -0,0 +1,61 @@
+import asyncio
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+from aiogram.types import TelegramObject
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.utils import get_db_session
+
+# session of the update being processed and the task processing it, tasks spawned from the
+# handler inherit the context but must not touch the session
+_update_session: ContextVar[Optional[tuple[asyncio.Task, AsyncSession]]] = ContextVar("update_session",
+                                                                                       default=None)
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    """One database session (unit of work) per update.
+
+    Handlers receive it as `session` and pass it to db_* functions, everything is committed
+    after the handler returns and rolled back if it raises. AsyncSession only checks a
+    connection out of the pool on first use, so updates served from caches cost nothing.
+    The transaction is also committed before every Bot API request the handler makes (see
+    CommitBeforeRequestMiddleware), so connections and row locks are never held across
+    Telegram I/O; DB work after a request runs in a new transaction.
+    """
+
+    async def __call__(self,
+                       handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject,
+                       data: Dict[str, Any]) -> Any:
+        async with get_db_session() as session:
+            data["session"] = session
+            token = _update_session.set((asyncio.current_task(), session))
+            try:
+                return await handler(event, data)
+            finally:
+                _update_session.reset(token)
+
+
+class CommitBeforeRequestMiddleware(BaseRequestMiddleware):
+    """Bot session middleware committing the open transaction of the update before a request goes out.
+
+    A request may wait seconds in the send scheduler and on the network, the update's
+    session would keep its pooled connection and locks (the cart row FOR UPDATE) all
+    that time. Must be the outermost session middleware.
+    """
+
+    async def __call__(self,
+                       make_request: NextRequestMiddlewareType[TelegramType],
+                       bot: Bot,
+                       method: TelegramMethod[TelegramType]) -> Response[TelegramType]:
+        current = _update_session.get()
+        if current is not None:
+            task, session = current
+            if task is asyncio.current_task() and session.in_transaction():
+                await session.commit()
+        return await make_request(bot, method)
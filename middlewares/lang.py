@@ -0,0 +1,20 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Chat
+
+from storage import LANG
+
+
+class LangMiddleware(BaseMiddleware):
+    """Load language of the chat before handlers read it with LANG.get()"""
+
+    async def __call__(self,
+                       handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject,
+                       data: Dict[str, Any]) -> Any:
+        chat: Chat = data.get("event_chat")
+        if chat is not None:
+            await LANG.load(chat.id)
+
+        return await handler(event, data)
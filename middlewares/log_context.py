@@ -0,0 +1,17 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from utils.log import log_update
+
+
+class LogContextMiddleware(BaseMiddleware):
+    """Tag every log record of an update with its update_id, see utils.log"""
+
+    async def __call__(self,
+                       handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: Update,
+                       data: Dict[str, Any]) -> Any:
+        with log_update(event.update_id):
+            return await handler(event, data)
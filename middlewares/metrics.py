@@ -0,0 +1,73 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramAPIError
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+from aiogram.types import TelegramObject
+
+from utils.metrics import (UpdateStats, current_update, HANDLER_SECONDS, HANDLER_ERRORS, HANDLER_DB_QUERIES,
+                           HANDLER_DB_SECONDS, API_REQUESTS, API_SECONDS)
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Outermost update middleware: latency, SQL count and SQL time of every update by handler.
+
+    The handler name is filled in by HandlerNameMiddleware once routing has picked one,
+    statements are counted by the engine hooks of utils.metrics.instrument_engine. A caller
+    that sets current_update before feeding the update (bench/load_test.py) gets them back.
+    """
+
+    async def __call__(self,
+                       handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject,
+                       data: Dict[str, Any]) -> Any:
+        stats = current_update.get() or UpdateStats()
+        token = current_update.set(stats)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.labels(stats.handler).inc()
+            raise
+        finally:
+            HANDLER_SECONDS.labels(stats.handler).observe(time.perf_counter() - started)
+            HANDLER_DB_QUERIES.labels(stats.handler).observe(stats.queries)
+            HANDLER_DB_SECONDS.labels(stats.handler).observe(stats.query_seconds)
+            current_update.reset(token)
+
+
+class HandlerNameMiddleware(BaseMiddleware):
+    """Inner middleware naming the handler an update was routed to, menu texts by their intent"""
+
+    async def __call__(self,
+                       handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject,
+                       data: Dict[str, Any]) -> Any:
+        stats = current_update.get()
+        if stats is not None:
+            name = data["handler"].callback.__name__
+            stats.handler = f"{name}:{data['intent']}" if "intent" in data else name
+        return await handler(event, data)
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """Bot session middleware counting Bot API requests by method and outcome"""
+
+    async def __call__(self,
+                       make_request: NextRequestMiddlewareType[TelegramType],
+                       bot: Bot,
+                       method: TelegramMethod[TelegramType]) -> Response[TelegramType]:
+        name = method.__api_method__
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            return await make_request(bot, method)
+        except TelegramAPIError as e:
+            outcome = type(e).__name__
+            raise
+        finally:
+            API_SECONDS.labels(name).observe(time.perf_counter() - started)
+            API_REQUESTS.labels(name, outcome).inc()
@@ -0,0 +1,247 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from contextvars import Context, ContextVar
+from os import getenv
+from typing import Optional, Union
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+from dotenv import load_dotenv
+
+from middlewares.db import CommitBeforeRequestMiddleware
+from middlewares.metrics import ApiMetricsMiddleware
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_API_URL = getenv('TELEGRAM_API_URL')  # e.g. http://127.0.0.1:8081 for bench/fake_bot_api.py
+SEND_GLOBAL_RATE = float(getenv('SEND_GLOBAL_RATE', '30'))  # messages per second for the whole bot
+SEND_CHAT_RATE = float(getenv('SEND_CHAT_RATE', '1'))  # per private chat
+SEND_CHAT_BURST = float(getenv('SEND_CHAT_BURST', '3'))
+SEND_GROUP_RATE = float(getenv('SEND_GROUP_RATE', str(20 / 60)))  # per group or channel
+SEND_GROUP_BURST = float(getenv('SEND_GROUP_BURST', '5'))
+SEND_MAX_RETRIES = int(getenv('SEND_MAX_RETRIES', '3'))
+
+ChatId = Union[int, str]
+
+# methods that post a new message to the chat and count towards Telegram's flood limits,
+# edits, deletes and chat actions do not
+PACED_PREFIXES = ("send", "copy", "forward")
+UNPACED_METHODS = frozenset({"sendChatAction"})
+
+
+def is_paced(method: TelegramMethod) -> bool:
+    name = method.__api_method__
+    return name.startswith(PACED_PREFIXES) and name not in UNPACED_METHODS
+
+
+class Priority:
+    """Send lanes, lower value goes first"""
+    INTERACTIVE = 0  # replies to the user who is waiting on the other side
+    NOTIFY = 1  # manager reports
+    BULK = 2  # broadcasts
+
+
+_send_priority: ContextVar[int] = ContextVar("send_priority", default=Priority.INTERACTIVE)
+
+
+def set_send_priority(priority: int) -> None:
+    """Lane of every request sent from the current task from now on"""
+    _send_priority.set(priority)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until a token can be taken"""
+        self._refill(now)
+        wait = self.blocked_until - now
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return max(wait, 0.0)
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, now: float, seconds: float) -> None:
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+    def is_idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity and self.blocked_until <= now
+
+
+class SendScheduler(BaseRequestMiddleware):
+    """Bot session middleware pacing the requests that send messages to a chat.
+
+    Every such request (sendMessage, sendPhoto, copyMessage, forwardMessage, ...) waits
+    for a token of its chat bucket and of the global bucket, so the bot stays inside
+    Telegram's flood limits instead of collecting 429s. Waiting requests are served by
+    lane (see Priority) and in arrival order within a lane, a chat that is out of tokens
+    does not hold up other chats. A 429 blocks the chat for retry_after seconds and the
+    request is queued again. Everything else (edits, deleteMessage, sendChatAction,
+    answerCallbackQuery, getMe, ...) passes straight through.
+    """
+
+    def __init__(self, global_rate: float = SEND_GLOBAL_RATE,
+                 chat_rate: float = SEND_CHAT_RATE, chat_burst: float = SEND_CHAT_BURST,
+                 group_rate: float = SEND_GROUP_RATE, group_burst: float = SEND_GROUP_BURST,
+                 max_retries: int = SEND_MAX_RETRIES):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.max_retries = max_retries
+        self.sent = 0
+        self.retried = 0
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats: dict[ChatId, TokenBucket] = {}
+        self._lanes = {priority: deque() for priority in
+                       (Priority.INTERACTIVE, Priority.NOTIFY, Priority.BULK)}
+        self._wakeup = asyncio.Event()
+        self._pump: Optional[asyncio.Task] = None
+        self._pruned_at = time.monotonic()
+
+    async def __call__(self,
+                       make_request: NextRequestMiddlewareType[TelegramType],
+                       bot: Bot,
+                       method: TelegramMethod[TelegramType]) -> Response[TelegramType]:
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None or not is_paced(method):
+            return await make_request(bot, method)
+
+        priority = _send_priority.get()
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(chat_id, priority)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                self.retried += 1
+                self._bucket(chat_id).block(time.monotonic(), e.retry_after)
+                logger.warning(f"Flood wait {e.retry_after}s for chat {chat_id} on {type(method).__name__}")
+
+    def _bucket(self, chat_id: ChatId) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # groups and channels have negative ids or @usernames
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            bucket = self._chats[chat_id] = TokenBucket(self.group_rate if is_group else self.chat_rate,
+                                                        self.group_burst if is_group else self.chat_burst)
+        return bucket
+
+    async def _acquire(self, chat_id: ChatId, priority: int) -> None:
+        if self._pump is None or self._pump.done():
+            # empty context: the pump outlives the update whose request started it
+            self._pump = asyncio.create_task(self._run(), context=Context())
+
+        granted = asyncio.get_running_loop().create_future()
+        self._lanes[priority].append((chat_id, granted))
+        self._wakeup.set()
+        await granted
+
+    def _grant_next(self, now: float) -> Optional[float]:
+        """Grant one waiting request, otherwise return seconds until one could be granted"""
+        wait = None
+        for lane in self._lanes.values():
+            blocked = set()
+            for index, (chat_id, granted) in enumerate(lane):
+                if granted.done():
+                    # cancelled while waiting
+                    del lane[index]
+                    return 0.0
+                if chat_id in blocked:
+                    continue
+
+                bucket = self._bucket(chat_id)
+                delay = bucket.delay(now)
+                if delay == 0:
+                    del lane[index]
+                    bucket.take(now)
+                    self._global.take(now)
+                    self.sent += 1
+                    granted.set_result(None)
+                    return 0.0
+
+                blocked.add(chat_id)
+                wait = delay if wait is None else min(wait, delay)
+        return wait
+
+    async def _run(self) -> None:
+        while True:
+            now = time.monotonic()
+            wait = self._global.delay(now)
+            if wait == 0:
+                wait = self._grant_next(now)
+                if wait == 0:
+                    continue
+
+            if now - self._pruned_at > 60:
+                self._prune(now)
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def _prune(self, now: float) -> None:
+        """Forget buckets of chats that have been quiet long enough to be full again"""
+        waiting = {chat_id for lane in self._lanes.values() for chat_id, _ in lane}
+        self._chats = {chat_id: bucket for chat_id, bucket in self._chats.items()
+                       if chat_id in waiting or not bucket.is_idle(now)}
+        self._pruned_at = now
+
+    def stats(self) -> dict:
+        return {
+            "sent": self.sent,
+            "retried": self.retried,
+            "queued": {priority: len(lane) for priority, lane in self._lanes.items()},
+            "chats": len(self._chats),
+        }
+
+    async def close(self) -> None:
+        if self._pump is not None:
+            self._pump.cancel()
+            try:
+                await self._pump
+            except asyncio.CancelledError:
+                pass
+            self._pump = None
+
+
+send_scheduler = SendScheduler()
+
+
+def create_bot_session() -> AiohttpSession:
+    """Bot API session going through the send scheduler, TELEGRAM_API_URL points it at another server.
+
+    The update's transaction is committed before a request waits in the scheduler, metrics
+    sit inside it, so they count every attempt that reaches the API.
+    """
+    api = TelegramAPIServer.from_base(TELEGRAM_API_URL) if TELEGRAM_API_URL else None
+    session = AiohttpSession(api=api) if api else AiohttpSession()
+    session.middleware(CommitBeforeRequestMiddleware())
+    session.middleware(send_scheduler)
+    session.middleware(ApiMetricsMiddleware())
+    return session
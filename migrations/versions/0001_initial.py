@@ -0,0 +1,65 @@
+"""initial schema: users, carts, cart lines, categories and products
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 18:00:00
+
+The tables as they existed before migrations were introduced. Databases created by hand
+back then already have them and only need `alembic stamp 0001`.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('name', sa.String(50), nullable=False),
+        sa.Column('telegram', sa.BigInteger(), nullable=False, unique=True),
+        sa.Column('phone', sa.String(30), nullable=True),
+        sa.Column('lang', sa.String(30), nullable=True),
+    )
+    op.create_table(
+        'carts',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('total_price', sa.DECIMAL(12, 2), nullable=False),
+        sa.Column('total_products', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False, unique=True),
+    )
+    op.create_table(
+        'finally_carts',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('product_name', sa.String(50), nullable=False),
+        sa.Column('final_price', sa.DECIMAL(12, 2), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('cart_id', sa.Integer(), sa.ForeignKey('carts.id'), nullable=False),
+        sa.UniqueConstraint('cart_id', 'product_name'),
+    )
+    op.create_table(
+        'categories',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('category_name', sa.String(20), nullable=False, unique=True),
+    )
+    op.create_table(
+        'products',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('product_name', sa.String(30), nullable=False, unique=True),
+        sa.Column('description', sa.String(), nullable=False),
+        sa.Column('image', sa.String(), nullable=False),
+        sa.Column('price', sa.DECIMAL(12, 2), nullable=False),
+        sa.Column('category_id', sa.Integer(), sa.ForeignKey('categories.id'), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('products')
+    op.drop_table('categories')
+    op.drop_table('finally_carts')
+    op.drop_table('carts')
+    op.drop_table('users')
@@ -0,0 +1,76 @@
+"""product file_id, FSM storage, orders and broadcast campaigns
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 18:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('products', sa.Column('image_file_id', sa.String(255), nullable=True))
+
+    # the bot used to create fsm_states itself on startup
+    op.create_table(
+        'fsm_states',
+        sa.Column('key', sa.String(255), primary_key=True),
+        sa.Column('state', sa.String(255), nullable=True),
+        sa.Column('data', sa.JSON(), nullable=False),
+        if_not_exists=True,
+    )
+
+    op.create_table(
+        'orders',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('idempotency_key', sa.String(64), nullable=False, unique=True),
+        sa.Column('total_price', sa.DECIMAL(12, 2), nullable=False),
+        sa.Column('total_products', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(20), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+    op.create_table(
+        'order_items',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('order_id', sa.Integer(), sa.ForeignKey('orders.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('product_id', sa.Integer(), sa.ForeignKey('products.id', ondelete='SET NULL'), nullable=True),
+        sa.Column('product_name', sa.String(50), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('final_price', sa.DECIMAL(12, 2), nullable=False),
+    )
+    op.create_table(
+        'campaigns',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('from_chat_id', sa.BigInteger(), nullable=False),
+        sa.Column('message_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(20), nullable=False),
+        sa.Column('last_user_id', sa.Integer(), nullable=False),
+        sa.Column('sent', sa.Integer(), nullable=False),
+        sa.Column('failed', sa.Integer(), nullable=False),
+        sa.Column('blocked', sa.Integer(), nullable=False),
+        sa.Column('lease_until', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+    op.create_table(
+        'campaign_deliveries',
+        sa.Column('campaign_id', sa.Integer(), sa.ForeignKey('campaigns.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('status', sa.String(20), nullable=False),
+        sa.Column('error', sa.String(255), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('campaign_deliveries')
+    op.drop_table('campaigns')
+    op.drop_table('order_items')
+    op.drop_table('orders')
+    op.drop_table('fsm_states')
+    op.drop_column('products', 'image_file_id')
@@ -0,0 +1,40 @@
+"""indexes for the cart, catalog and order lookups
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 18:00:00
+
+users.telegram and carts.user_id are already indexed by their unique constraints, so
+the Users -> Carts -> Finally_carts join needs indexes on the last two hops only:
+
+* finally_carts (cart_id, id) INCLUDE (product_name, final_price, quantity) serves the
+  cart view in line order and the price sum as index-only scans
+* products (category_id, id) serves the per-category menus and their keyset pages
+* order_items (order_id) serves order reports and the cascade from orders
+
+Built CONCURRENTLY, so a running bot keeps writing to these tables meanwhile.
+"""
+from alembic import op
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_finally_carts_cart_id_id', 'finally_carts', ['cart_id', 'id'],
+                        postgresql_include=['product_name', 'final_price', 'quantity'],
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_products_category_id_id', 'products', ['category_id', 'id'],
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_order_items_order_id', 'order_items', ['order_id'],
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_order_items_order_id', 'order_items', postgresql_concurrently=True)
+        op.drop_index('ix_products_category_id_id', 'products', postgresql_concurrently=True)
+        op.drop_index('ix_finally_carts_cart_id_id', 'finally_carts', postgresql_concurrently=True)
@@ -0,0 +1,27 @@
+"""backfill carts.total_price and carts.total_products from the cart lines
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 19:00:00
+
+From here on every cart line write keeps the totals on the carts row up to date, before
+they held whatever the last "add to cart" wrote.
+"""
+from alembic import op
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "UPDATE carts SET "
+        "total_price = coalesce((SELECT sum(final_price) FROM finally_carts WHERE cart_id = carts.id), 0), "
+        "total_products = coalesce((SELECT sum(quantity) FROM finally_carts WHERE cart_id = carts.id), 0)"
+    )
+
+
+def downgrade() -> None:
+    pass
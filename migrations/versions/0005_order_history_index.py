@@ -0,0 +1,26 @@
+"""index for the order history of a user
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 20:00:00
+
+orders (user_id, created_at, id) serves the "my orders" pages newest first, each page is
+one index range scan whatever the number of orders of the user.
+"""
+from alembic import op
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_orders_user_id_created_at_id', 'orders', ['user_id', 'created_at', 'id'],
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_orders_user_id_created_at_id', 'orders', postgresql_concurrently=True)
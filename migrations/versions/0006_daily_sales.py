@@ -0,0 +1,61 @@
+"""daily sales aggregates, backfilled from the orders so far
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 21:00:00
+
+daily_sales holds orders, revenue and sold products per day, daily_product_sales quantity
+and revenue per day and product. From here on db_checkout adds every new order to both in
+its own transaction, so /stats reads a few hundred aggregate rows whatever the number of
+orders. Days are calendar days in SALES_TIMEZONE, the backfill uses the same zone.
+daily_product_sales has no foreign keys, deleting products or categories does not touch it.
+
+Orders checked out by a bot version without the aggregates after this migration ran are
+not counted, apply it together with the upgrade (or call db_rebuild_sales for those days).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from database.utils import SALES_TIMEZONE
+
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'daily_sales',
+        sa.Column('day', sa.Date(), primary_key=True),
+        sa.Column('orders', sa.Integer(), nullable=False),
+        sa.Column('revenue', sa.DECIMAL(14, 2), nullable=False),
+        sa.Column('products', sa.Integer(), nullable=False),
+    )
+    op.create_table(
+        'daily_product_sales',
+        sa.Column('day', sa.Date(), primary_key=True),
+        sa.Column('product_name', sa.String(50), primary_key=True),
+        sa.Column('category_id', sa.Integer(), nullable=True),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('revenue', sa.DECIMAL(14, 2), nullable=False),
+    )
+
+    day = "(timezone(:zone, orders.created_at))::date"
+    op.execute(sa.text(
+        "INSERT INTO daily_sales (day, orders, revenue, products) "
+        f"SELECT {day}, count(*), sum(total_price), sum(total_products) FROM orders GROUP BY 1"
+    ).bindparams(zone=SALES_TIMEZONE))
+    op.execute(sa.text(
+        "INSERT INTO daily_product_sales (day, product_name, category_id, quantity, revenue) "
+        f"SELECT {day}, order_items.product_name, max(products.category_id), "
+        "sum(order_items.quantity), sum(order_items.final_price) "
+        "FROM order_items JOIN orders ON orders.id = order_items.order_id "
+        "LEFT JOIN products ON products.id = order_items.product_id "
+        "GROUP BY 1, 2"
+    ).bindparams(zone=SALES_TIMEZONE))
+
+
+def downgrade() -> None:
+    op.drop_table('daily_product_sales')
+    op.drop_table('daily_sales')
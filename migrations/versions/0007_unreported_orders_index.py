@@ -0,0 +1,27 @@
+"""partial index of the orders not reported to the manager yet
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 10:00:00
+
+OrderNotifier.start() queues every order still in status 'new' again. The partial index
+holds just those few rows, so the lookup stays cheap with millions of orders.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_orders_status_new', 'orders', ['id'], postgresql_where=sa.text("status = 'new'"),
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_orders_status_new', 'orders', postgresql_concurrently=True)
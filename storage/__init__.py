@@ -0,0 +1,33 @@
+from os import getenv
+
+from aiogram.fsm.storage.base import BaseStorage
+from aiogram.fsm.storage.memory import MemoryStorage
+from dotenv import load_dotenv
+
+from .fsm import PostgresStorage
+from .lang import MemoryLangStorage, PostgresLangStorage
+
+load_dotenv()
+
+STORAGE_BACKEND = getenv('STORAGE_BACKEND', 'postgres')  # postgres | memory
+
+
+def create_fsm_storage() -> BaseStorage:
+    if STORAGE_BACKEND == 'memory':
+        return MemoryStorage()
+    return PostgresStorage()
+
+
+def create_lang_storage() -> MemoryLangStorage:
+    if STORAGE_BACKEND == 'memory':
+        return MemoryLangStorage()
+    return PostgresLangStorage()
+
+
+FSM_STORAGE = create_fsm_storage()
+LANG = create_lang_storage()
+
+
+async def close_storage() -> None:
+    await LANG.close()
+    await FSM_STORAGE.close()
@@ -0,0 +1,95 @@
+import asyncio
+import contextvars
+import logging
+from os import getenv
+from typing import Any, Awaitable, Callable, Hashable
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+WRITE_BEHIND_INTERVAL = float(getenv('WRITE_BEHIND_INTERVAL', '0.2'))
+WRITE_BEHIND_MAX_PENDING = int(getenv('WRITE_BEHIND_MAX_PENDING', '500'))
+
+_MISSING = object()
+
+
+class WriteBehindBuffer:
+    """Collect writes in memory and hand them to flush_callback in batches.
+
+    Only the latest value per key is kept, so a chat tapping through several FSM steps
+    between two flushes costs a single row write. Batches are flushed every `interval`
+    seconds or as soon as `max_pending` keys are waiting. A failed batch is merged back
+    and retried on the next flush.
+    """
+
+    def __init__(self, flush_callback: Callable[[dict], Awaitable[Any]],
+                 interval: float = WRITE_BEHIND_INTERVAL, max_pending: int = WRITE_BEHIND_MAX_PENDING):
+        self._flush_callback = flush_callback
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending: dict = {}
+        self._flushing: dict = {}  # batch being written, still newer than what the database returns
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self._pending[key] = value
+        if self._task is None or self._task.done():
+            # started by whichever update wrote first, its flushes must not count towards that update
+            self._task = asyncio.create_task(self._run(), context=contextvars.Context())
+        if len(self._pending) >= self.max_pending:
+            self._wakeup.set()
+
+    def get(self, key: Hashable, default: Any = _MISSING) -> Any:
+        """Pending value of key; raises KeyError when nothing is waiting and no default is given"""
+        if key in self._pending:
+            return self._pending[key]
+        if key in self._flushing:
+            return self._flushing[key]
+        if default is _MISSING:
+            raise KeyError(key)
+        return default
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._pending or key in self._flushing
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, {}
+        self._flushing = batch
+        try:
+            await self._flush_callback(batch)
+        except Exception as e:
+            logger.error(f"Write-behind flush of {len(batch)} entries failed: {e}")
+            for key, value in batch.items():
+                self._pending.setdefault(key, value)
+        finally:
+            self._flushing = {}
+
+    async def close(self) -> None:
+        """Stop background task and write out whatever is still pending"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
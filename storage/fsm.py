@@ -0,0 +1,54 @@
+import copy
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from database.utils import db_get_fsm_entry, db_write_fsm_entries
+from .buffer import WriteBehindBuffer
+
+
+class PostgresStorage(BaseStorage):
+    """aiogram FSM storage kept in the fsm_states table.
+
+    Writes reach Postgres through a write-behind buffer. Reads of a key with a write still
+    waiting in the buffer are answered from it, all other reads go to the database, so with
+    several replicas a flow continued on another replica sees its state and data once the
+    previous step has been flushed.
+    """
+
+    def __init__(self):
+        self._buffer = WriteBehindBuffer(db_write_fsm_entries)
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id}:{key.business_connection_id}:{key.destiny}"
+
+    async def _get(self, key: str) -> tuple[Optional[str], dict]:
+        if key in self._buffer:
+            return self._buffer.get(key)
+        return await db_get_fsm_entry(key) or (None, {})
+
+    def _put(self, key: str, state: Optional[str], data: dict) -> None:
+        self._buffer.put(key, (state, data))
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        storage_key = self._key(key)
+        _, data = await self._get(storage_key)
+        self._put(storage_key, state.state if isinstance(state, State) else state, data)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._get(self._key(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        storage_key = self._key(key)
+        state, _ = await self._get(storage_key)
+        self._put(storage_key, state, copy.deepcopy(dict(data)))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._get(self._key(key))
+        return copy.deepcopy(data)
+
+    async def close(self) -> None:
+        await self._buffer.close()
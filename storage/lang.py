@@ -0,0 +1,103 @@
+import time
+from os import getenv
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.utils import db_add_lang, db_get_user_lang, db_bulk_update_lang
+from .buffer import WriteBehindBuffer
+
+load_dotenv()
+
+LANG_CACHE_TTL = float(getenv('LANG_CACHE_TTL', '60'))
+
+
+class MemoryLangStorage:
+    """Per-chat language kept in process memory for the process lifetime.
+
+    Users.lang is read once per chat and written straight through by save(), so chosen
+    languages survive a restart. Suits a single bot process.
+    """
+
+    def __init__(self):
+        self._langs: dict[int, str] = {}
+        self._known: set[int] = set()  # chats whose language has been read from the database
+
+    def get(self, chat_id: int, default: Optional[str] = None) -> Optional[str]:
+        return self._langs.get(chat_id, default)
+
+    def __setitem__(self, chat_id: int, lang: str) -> None:
+        self._langs[chat_id] = lang
+        self._known.add(chat_id)
+
+    async def save(self, chat_id: int, lang: str, session: AsyncSession = None) -> None:
+        """Language chosen by the user, kept locally and stored in Users.lang"""
+        self[chat_id] = lang
+        await db_add_lang(chat_id, lang, session=session)
+
+    async def load(self, chat_id: int) -> None:
+        """Make language of chat available to get(), called once per update"""
+        if chat_id in self._known:
+            return
+        if lang := await db_get_user_lang(chat_id):
+            self._langs[chat_id] = lang
+        self._known.add(chat_id)
+
+    async def close(self) -> None:
+        pass
+
+
+class PostgresLangStorage(MemoryLangStorage):
+    """Per-chat language stored in Users.lang.
+
+    get() stays synchronous and reads the local copy, which load() refreshes from
+    the database once it is older than LANG_CACHE_TTL, so replicas pick up changes
+    made elsewhere. Changes are written behind in batches. Expired copies are dropped
+    once a minute, so only chats seen within the TTL are kept in memory.
+    """
+
+    def __init__(self, ttl: float = LANG_CACHE_TTL):
+        super().__init__()
+        self.ttl = ttl
+        self._loaded_at: dict[int, float] = {}
+        self._buffer = WriteBehindBuffer(db_bulk_update_lang)
+        self._pruned_at = time.monotonic()
+
+    def __setitem__(self, chat_id: int, lang: str) -> None:
+        self._langs[chat_id] = lang
+        self._loaded_at[chat_id] = time.monotonic()
+        self._buffer.put(chat_id, lang)
+
+    async def save(self, chat_id: int, lang: str, session: AsyncSession = None) -> None:
+        """Language chosen by the user, written behind with other changes"""
+        self[chat_id] = lang
+
+    async def load(self, chat_id: int) -> None:
+        now = time.monotonic()
+        if now - self._pruned_at > 60:
+            self._prune(now)
+
+        loaded_at = self._loaded_at.get(chat_id)
+        if chat_id in self._buffer or (loaded_at is not None and now - loaded_at < self.ttl):
+            return
+
+        lang = await db_get_user_lang(chat_id)
+        if lang:
+            self._langs[chat_id] = lang
+        else:
+            self._langs.pop(chat_id, None)
+        self._loaded_at[chat_id] = time.monotonic()
+
+    def _prune(self, now: float) -> None:
+        """Forget expired languages, the next load() of the chat reads them again"""
+        expired = [chat_id for chat_id, loaded_at in self._loaded_at.items()
+                   if now - loaded_at >= self.ttl and chat_id not in self._buffer]
+        for chat_id in expired:
+            del self._loaded_at[chat_id]
+            self._langs.pop(chat_id, None)
+        self._pruned_at = now
+
+    async def close(self) -> None:
+        await self._buffer.close()
@@ -0,0 +1,9 @@
+import os
+
+# modules read their settings at import time, the tests never connect to Telegram or Postgres
+os.environ.setdefault("TOKEN", "1:test")
+os.environ.setdefault("ADMIN_IDS", "1")
+os.environ.setdefault("DB_USER", "test")
+os.environ.setdefault("DB_PASSWORD", "test")
+os.environ.setdefault("DB_HOST", "localhost")
+os.environ.setdefault("DB_NAME", "test")
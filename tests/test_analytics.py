@@ -0,0 +1,111 @@
+import asyncio
+import warnings
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+
+from database.dto import DailySalesRow, ProductSalesRow
+from utils import analytics
+from utils.analytics import STATS_MAX_DAYS, _per_day, parse_report_range, sales_report
+
+TODAY = date(2026, 10, 17)
+
+
+@pytest.mark.parametrize("args, expected", [
+    (None, (TODAY - timedelta(days=6), TODAY)),
+    ("", (TODAY - timedelta(days=6), TODAY)),
+    ("1", (TODAY, TODAY)),
+    ("30", (TODAY - timedelta(days=29), TODAY)),
+    (str(STATS_MAX_DAYS), (TODAY - timedelta(days=STATS_MAX_DAYS - 1), TODAY)),
+    ("2026-10-01", (date(2026, 10, 1), date(2026, 10, 1))),
+    ("2026-09-01 2026-09-30", (date(2026, 9, 1), date(2026, 9, 30))),
+])
+def test_parse_report_range(args, expected):
+    assert parse_report_range(args, TODAY) == expected
+
+
+@pytest.mark.parametrize("args", [
+    "0",
+    str(STATS_MAX_DAYS + 1),
+    "99999999999",
+    "-5",
+    "week",
+    "2026-13-01",
+    "2026-09-30 2026-09-01",  # end before start
+    "2025-01-01 2026-10-17",  # longer than STATS_MAX_DAYS
+    "2026-09-01 2026-09-02 2026-09-03",
+])
+def test_parse_report_range_rejects(args):
+    assert parse_report_range(args, TODAY) is None
+
+
+def test_per_day_fills_missing_days_with_zeros():
+    rows = [DailySalesRow(TODAY, 2, Decimal("15.50"), 5), DailySalesRow(TODAY + timedelta(days=2), 1, Decimal(3), 1)]
+    orders, revenue, products = _per_day(rows, TODAY, 4)
+
+    assert orders.tolist() == [2, 0, 1, 0]
+    assert revenue.tolist() == [15.5, 0, 3, 0]
+    assert products.tolist() == [5, 0, 1, 0]
+
+
+def test_per_day_without_rows():
+    orders, revenue, products = _per_day([], TODAY, 3)
+    assert orders.tolist() == revenue.tolist() == products.tolist() == [0, 0, 0]
+
+
+def report(monkeypatch, daily, lines, start=TODAY - timedelta(days=2), end=TODAY, top=10):
+    async def get_daily_sales(start, end, session=None):
+        return daily
+
+    async def get_product_sales(start, end, session=None):
+        return lines
+
+    async def ensure_catalog():
+        pass
+
+    monkeypatch.setattr(analytics, "db_get_daily_sales", get_daily_sales)
+    monkeypatch.setattr(analytics, "db_get_product_sales", get_product_sales)
+    monkeypatch.setattr(analytics, "db_ensure_catalog", ensure_catalog)
+    monkeypatch.setattr(analytics.catalog_cache, "category", lambda category_id: None)
+    return asyncio.run(sales_report(start, end, top))
+
+
+def test_sales_report_without_orders(monkeypatch):
+    result = report(monkeypatch, [], [])
+
+    assert result.orders == 0
+    assert result.revenue == 0
+    assert result.average_order == 0
+    assert result.median_day_revenue == 0
+    assert result.best_day is None
+    assert result.previous_revenue == 0
+    assert result.top_products == result.categories == []
+
+
+def test_sales_report_totals_and_previous_period(monkeypatch):
+    daily = [DailySalesRow(TODAY - timedelta(days=4), 1, Decimal(7), 1),  # previous period
+             DailySalesRow(TODAY - timedelta(days=2), 1, Decimal(10), 2),
+             DailySalesRow(TODAY, 3, Decimal(50), 4)]
+    lines = [ProductSalesRow(TODAY - timedelta(days=2), "tea", 1, 2, Decimal(10)),
+             ProductSalesRow(TODAY, "tea", 1, 1, Decimal(5)),
+             ProductSalesRow(TODAY, "cake", 2, 3, Decimal(45))]
+    result = report(monkeypatch, daily, lines, top=1)
+
+    assert (result.orders, result.revenue, result.products) == (4, 60, 6)
+    assert result.average_order == 15
+    assert result.median_day_revenue == 10
+    assert (result.best_day, result.best_day_revenue) == (TODAY, 50)
+    assert result.previous_revenue == 7
+    assert result.top_products == [("cake", 3, 45)]
+    assert [(revenue, share) for _, revenue, share in result.categories] == [(45, 0.75), (15, 0.25)]
+
+
+def test_sales_report_zero_revenue_share(monkeypatch):
+    daily = [DailySalesRow(TODAY, 1, Decimal(0), 1)]
+    lines = [ProductSalesRow(TODAY, "gift", None, 1, Decimal(0))]
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        result = report(monkeypatch, daily, lines)
+
+    assert result.categories == [(None, 0, 0)]
@@ -0,0 +1,30 @@
+from decimal import Decimal
+
+from database.cache import CatalogCache
+from database.dto import CategoryRow, ProductRow
+
+
+def cache_with(product: ProductRow) -> CatalogCache:
+    cache = CatalogCache()
+    cache.load([CategoryRow(product.category_id, "drinks")], [product])
+    return cache
+
+
+def test_set_product_file_id_replaces_the_row():
+    product = ProductRow(1, "tea", "green", "media/a.jpg", None, Decimal(5), 1)
+    cache = cache_with(product)
+
+    cache.set_product_file_id(1, "media/a.jpg", "file-a")
+
+    assert product.image_file_id is None  # rows handed out before do not change
+    assert cache.product(1).image_file_id == "file-a"
+    assert cache.product_by_name("tea").image_file_id == "file-a"
+    assert cache.products_by_category(1)[0].image_file_id == "file-a"
+
+
+def test_set_product_file_id_ignores_file_id_of_a_replaced_image():
+    cache = cache_with(ProductRow(1, "tea", "green", "media/b.jpg", None, Decimal(5), 1))
+
+    cache.set_product_file_id(1, "media/a.jpg", "file-a")
+
+    assert cache.product(1).image_file_id is None
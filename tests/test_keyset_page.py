@@ -0,0 +1,49 @@
+from database.cache import _keyset_page
+
+IDS = [1, 3, 5, 7, 9]
+
+
+def page(size, after_id=None, before_id=None, ids=IDS):
+    result = _keyset_page(list(ids), list(ids), size, after_id, before_id)
+    return result.rows, result.has_prev, result.has_next
+
+
+def test_first_page():
+    assert page(2) == ([1, 3], False, True)
+
+
+def test_middle_page():
+    assert page(2, after_id=3) == ([5, 7], True, True)
+
+
+def test_last_partial_page():
+    assert page(2, after_id=7) == ([9], True, False)
+
+
+def test_last_page_ending_exactly_at_the_end():
+    assert page(2, ids=[1, 3, 5, 7], after_id=3) == ([5, 7], True, False)
+
+
+def test_single_page_has_no_neighbours():
+    assert page(5) == (IDS, False, False)
+    assert page(10) == (IDS, False, False)
+
+
+def test_previous_page():
+    assert page(2, before_id=7) == ([3, 5], True, True)
+
+
+def test_previous_page_reaching_the_start():
+    assert page(2, before_id=5) == ([1, 3], False, True)
+    # fewer rows than size before the boundary: the page is short, not padded from the next one
+    assert page(2, before_id=3) == ([1], False, True)
+
+
+def test_boundary_row_deleted_meanwhile():
+    assert page(2, after_id=4) == ([5, 7], True, True)
+    assert page(2, before_id=6) == ([3, 5], True, True)
+
+
+def test_empty():
+    assert page(2, ids=[]) == ([], False, False)
+    assert page(2, ids=[], after_id=3) == ([], False, False)
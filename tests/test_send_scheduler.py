@@ -0,0 +1,138 @@
+import asyncio
+import time
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import EditMessageText, SendChatAction, SendMessage
+
+from middlewares.send_scheduler import Priority, SendScheduler, TokenBucket, is_paced, set_send_priority
+
+
+def test_bucket_allows_burst_then_paces():
+    bucket = TokenBucket(rate=2, capacity=3)
+    now = bucket.updated
+    for _ in range(3):
+        assert bucket.delay(now) == 0
+        bucket.take(now)
+
+    assert bucket.delay(now) == 0.5
+    assert bucket.delay(now + 0.5) == 0
+    assert not bucket.is_idle(now + 0.5)
+    assert bucket.is_idle(now + 1.5)
+
+
+def test_bucket_block_overrides_tokens():
+    bucket = TokenBucket(rate=1, capacity=3)
+    now = bucket.updated
+    bucket.block(now, 10)
+    bucket.block(now, 2)  # a shorter flood wait does not shorten the block
+
+    assert bucket.delay(now) == 10
+    assert not bucket.is_idle(now + 5)
+    assert bucket.delay(now + 10) == 0
+
+
+def test_only_new_messages_are_paced():
+    assert is_paced(SendMessage(chat_id=1, text="hi"))
+    assert not is_paced(SendChatAction(chat_id=1, action="typing"))
+    assert not is_paced(EditMessageText(chat_id=1, message_id=1, text="hi"))
+
+
+def test_unpaced_requests_pass_straight_through():
+    async def scenario():
+        scheduler = SendScheduler()
+        calls = []
+
+        async def make_request(bot, method):
+            calls.append(method)
+            return True
+
+        await scheduler(make_request, None, EditMessageText(chat_id=1, message_id=1, text="hi"))
+        await scheduler(make_request, None, SendChatAction(chat_id=1, action="typing"))
+        return scheduler, calls
+
+    scheduler, calls = asyncio.run(scenario())
+    assert len(calls) == 2
+    assert scheduler.sent == 0
+    assert scheduler._pump is None
+
+
+def test_lanes_are_served_by_priority_then_arrival():
+    async def scenario():
+        scheduler = SendScheduler(global_rate=100)
+        order = []
+
+        async def make_request(bot, method):
+            order.append(method.text)
+            return True
+
+        async def send(priority, chat_id, text):
+            set_send_priority(priority)
+            await scheduler(make_request, None, SendMessage(chat_id=chat_id, text=text))
+
+        # all requests are queued before the scheduler's pump task first runs
+        await asyncio.gather(send(Priority.BULK, 1, "bulk"),
+                             send(Priority.NOTIFY, 2, "notify"),
+                             send(Priority.INTERACTIVE, 3, "first"),
+                             send(Priority.INTERACTIVE, 4, "second"))
+        await scheduler.close()
+        return order
+
+    assert asyncio.run(scenario()) == ["first", "second", "notify", "bulk"]
+
+
+def test_blocked_chat_does_not_hold_up_others():
+    async def scenario():
+        scheduler = SendScheduler()
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+        scheduler._bucket(1).block(now, 10)
+        blocked, free = loop.create_future(), loop.create_future()
+        scheduler._lanes[Priority.INTERACTIVE].extend([(1, blocked), (2, free)])
+
+        first = scheduler._grant_next(now)
+        second = scheduler._grant_next(now)
+        return first, second, blocked.done(), free.done()
+
+    first, second, blocked_done, free_done = asyncio.run(scenario())
+    assert first == 0
+    assert free_done and not blocked_done
+    assert 9.9 < second <= 10
+
+
+def test_flood_wait_blocks_chat_and_retries():
+    async def scenario():
+        scheduler = SendScheduler()
+        attempts = []
+
+        async def make_request(bot, method):
+            attempts.append(time.monotonic())
+            if len(attempts) == 1:
+                raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=1)
+            return True
+
+        result = await scheduler(make_request, None, SendMessage(chat_id=1, text="hi"))
+        await scheduler.close()
+        return scheduler, attempts, result
+
+    scheduler, attempts, result = asyncio.run(scenario())
+    assert result is True
+    assert scheduler.retried == 1
+    assert attempts[1] - attempts[0] >= 1
+
+
+def test_flood_wait_gives_up_after_max_retries():
+    async def scenario():
+        scheduler = SendScheduler(max_retries=0)
+
+        async def make_request(bot, method):
+            raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=1)
+
+        try:
+            await scheduler(make_request, None, SendMessage(chat_id=1, text="hi"))
+        except TelegramRetryAfter:
+            return True
+        finally:
+            await scheduler.close()
+        return False
+
+    assert asyncio.run(scenario())
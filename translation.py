@@ -2,8 +2,6 @@
 
 # translations.py
 
-LANG = {}
-
 translations = {
     "en": {
         "welcome_message": "Hello <b>{user_name} </b>\nGreetings from Sadiya Bot",
@@ -26,12 +24,19 @@ translations = {
         "removed_from_cart": "{product_name} removed from cart",
         "product_not_exist":"The product does not exist",
         "your_order": "Your order",
+        "cart_empty": "Your cart is empty",
         "total_price": "Total price",
         "delivery": "Delivery",
         "purchase_completed": "Your Purchase Completed",
         "carts_selected": "Carts selected",
         "setting_selected": "Setting is selected",
         "history_selected": "Purchase history",
+        "history_empty": "You have no orders yet",
+        "reorder_prompt": "Tap an order to put it back into your cart",
+        "reorder_button": "🔁 #{order_id} · {date} · {total_price} sum",
+        "reorder_done": "{count} products of order #{order_id} are in your cart",
+        "reorder_dropped": "{count} products are no longer sold",
+        "history_order": "#{order_id} · {date}\n{total_products} pcs · {total_price} sum",
         "admin_command_hint": " User /admin to see available commands.",  # just admin command hint
         "menu_change_language": "Please select language 🌎",
 
@@ -70,7 +75,37 @@ translations = {
                                  "/addcategory - Add new category\n"
                                  "/addproduct - Add new product\n"
                                  "/categories - View and manage categories\n"
-                                 "/products - View and manage products",
+                                 "/products - View and manage products\n"
+                                 "/broadcast - Send a message to all users\n"
+                                 "/import - Add or update products from a CSV/JSON file\n"
+                                 "/export - Download the catalog as CSV (/export json for JSON)\n"
+                                 "/stats - Sales of the last 7 days (/stats 30, /stats 2026-01-01 2026-01-31)",
+        "broadcast_enter_message": "Send the message to broadcast. Text, photo or any other message will be copied to every user as is.",
+        "broadcast_confirm": "The message above will be sent to <b>{users}</b> users. Send it?",
+        "broadcast_send_button": "📣 Send",
+        "broadcast_cancel_button": "❌ Cancel",
+        "broadcast_started": "📣 Broadcast #{campaign_id} started",
+        "broadcast_canceled": "Broadcast canceled",
+        "broadcast_finished": "📣 Broadcast #{campaign_id} finished\nSent: {sent}\nFailed: {failed}\nBlocked the bot: {blocked}",
+        "import_prompt": "Send the catalog as a document: a CSV or JSON file with the columns category, product_name, description, price, image, or a ZIP archive with catalog.csv / catalog.json and the images. Images are paths inside the archive or the image column of /export. Products with an existing name are updated.",
+        "import_invalid_file": "❌ Could not read the file: {error}",
+        "import_errors": "❌ Nothing was imported, the file has {count} errors:",
+        "import_row_error": "line {line}: {error}",
+        "import_row_missing": "{field} is empty",
+        "import_row_too_long": "{field} is too long",
+        "import_row_duplicate": "{field} repeats an earlier line",
+        "import_row_price": "{field} must be a positive number",
+        "import_row_image": "{field} file not found",
+        "import_row_image_invalid": "{field} is not a readable image",
+        "import_empty": "The file has no products",
+        "import_done": "✅ Catalog imported\nAdded: {created}\nUpdated: {updated}",
+        "stats_invalid_range": "Use /stats, /stats 30 for the last 30 days, /stats 2026-01-31 for one day or /stats 2026-01-01 2026-01-31 for a range of at most {max_days} days",
+        "stats_title": "📊 <b>Sales {start} - {end}</b>",
+        "stats_no_orders": "No orders in this period",
+        "stats_summary": "Orders: {orders}\nRevenue: {revenue} sum ({change} to the previous period)\nProducts sold: {products}\nAverage order: {average_order} sum\nMedian day: {median_day} sum\nBest day: {best_day}, {best_day_revenue} sum",
+        "stats_top_products": "Top products",
+        "stats_categories": "Categories",
+        "stats_no_category": "Deleted products",
         "add_category_enter_name": "Please enter the name of the new category:",
         "category_added_success": "✅Category '{category_name}' has been added successfully!",
         "category_added_fail": "❌Failed to add category. It might already exist.",
@@ -136,12 +171,19 @@ translations = {
         "removed_from_cart": "{product_name} удален из корзины",
         "product_not_exist":"Продукт не существует",
         "your_order": "Ваш заказ",
+        "cart_empty": "Ваша корзина пуста",
         "total_price": "Общая стоимость",
         "delivery": "Доставка",
         "purchase_completed": "Ваша покупка завершена",
         "carts_selected": "Корзины выбраны",
         "setting_selected": "Настройки выбраны",
         "history_selected": "История покупок",
+        "history_empty": "У вас пока нет заказов",
+        "reorder_prompt": "Нажмите на заказ, чтобы вернуть его в корзину",
+        "reorder_button": "🔁 #{order_id} · {date} · {total_price} сум",
+        "reorder_done": "{count} товаров из заказа #{order_id} в вашей корзине",
+        "reorder_dropped": "{count} товаров больше не продаются",
+        "history_order": "#{order_id} · {date}\n{total_products} шт · {total_price} сум",
         "admin_command_hint": " Используйте /admin для просмотра доступных команд.",  # just admin command hint
 
         # --- New translations from inline_kb.py ---
@@ -161,7 +203,6 @@ translations = {
         "return_to_categories_admin_button": "🔙",
         "confirm_delete_yes": "✅ Да, удалить",
         "confirm_delete_no": "❌ Нет, отменить",
-        "change_language": "🌍Изменить язык",
         "menu_change_language": "Пожалуйста, выберите язык 🌎",
 
         # --- New translations for reply_kb.py ---
@@ -181,7 +222,37 @@ translations = {
                                  "/addcategory - Добавить новую категорию\n"
                                  "/addproduct - Добавить новый продукт\n"
                                  "/categories - Просмотр и управление категориями\n"
-                                 "/products - Просмотр и управление продуктами",
+                                 "/products - Просмотр и управление продуктами\n"
+                                 "/broadcast - Отправить сообщение всем пользователям\n"
+                                 "/import - Добавить или обновить товары из файла CSV/JSON\n"
+                                 "/export - Скачать каталог в CSV (/export json для JSON)\n"
+                                 "/stats - Продажи за последние 7 дней (/stats 30, /stats 2026-01-01 2026-01-31)",
+        "broadcast_enter_message": "Отправьте сообщение для рассылки. Текст, фото или любое другое сообщение будет скопировано каждому пользователю как есть.",
+        "broadcast_confirm": "Сообщение выше будет отправлено <b>{users}</b> пользователям. Отправить?",
+        "broadcast_send_button": "📣 Отправить",
+        "broadcast_cancel_button": "❌ Отменить",
+        "broadcast_started": "📣 Рассылка #{campaign_id} запущена",
+        "broadcast_canceled": "Рассылка отменена",
+        "broadcast_finished": "📣 Рассылка #{campaign_id} завершена\nОтправлено: {sent}\nОшибки: {failed}\nЗаблокировали бота: {blocked}",
+        "import_prompt": "Отправьте каталог документом: файл CSV или JSON с колонками category, product_name, description, price, image или ZIP-архив с catalog.csv / catalog.json и изображениями. Изображения указываются путями внутри архива или колонкой image из /export. Товары с существующим названием обновляются.",
+        "import_invalid_file": "❌ Не удалось прочитать файл: {error}",
+        "import_errors": "❌ Ничего не импортировано, в файле {count} ошибок:",
+        "import_row_error": "строка {line}: {error}",
+        "import_row_missing": "{field} не заполнено",
+        "import_row_too_long": "{field} слишком длинное",
+        "import_row_duplicate": "{field} повторяет предыдущую строку",
+        "import_row_price": "{field} должно быть положительным числом",
+        "import_row_image": "файл {field} не найден",
+        "import_row_image_invalid": "{field} не является изображением",
+        "import_empty": "В файле нет товаров",
+        "import_done": "✅ Каталог импортирован\nДобавлено: {created}\nОбновлено: {updated}",
+        "stats_invalid_range": "Используйте /stats, /stats 30 за последние 30 дней, /stats 2026-01-31 за один день или /stats 2026-01-01 2026-01-31 за период не более {max_days} дней",
+        "stats_title": "📊 <b>Продажи {start} - {end}</b>",
+        "stats_no_orders": "За этот период заказов нет",
+        "stats_summary": "Заказы: {orders}\nВыручка: {revenue} сум ({change} к предыдущему периоду)\nПродано товаров: {products}\nСредний заказ: {average_order} сум\nМедианный день: {median_day} сум\nЛучший день: {best_day}, {best_day_revenue} сум",
+        "stats_top_products": "Топ товаров",
+        "stats_categories": "Категории",
+        "stats_no_category": "Удалённые товары",
         "add_category_enter_name": "Пожалуйста, введите название новой категории:",
         "category_added_success": "✅Категория '{category_name}' успешно добавлена!",
         "category_added_fail": "❌Не удалось добавить категорию. Возможно, она уже существует.",
@@ -247,12 +318,19 @@ translations = {
         "removed_from_cart": "{product_name} savatchadan olib tashlandi",
         "product_not_exist": "Mahsulot mavjud emas",
         "your_order": "Sizning buyurtmangiz",
+        "cart_empty": "Savatchangiz bo'sh",
         "total_price": "Umumiy narx",
         "delivery": "Yetkazib berish",
         "purchase_completed": "Xaridingiz yakunlandi",
         "carts_selected": "Savatchalar tanlandi",
         "setting_selected": "Sozlamalar tanlandi",
         "history_selected": "Sotib olish tarixi",
+        "history_empty": "Sizda hali buyurtmalar yo'q",
+        "reorder_prompt": "Buyurtmani savatga qaytarish uchun ustiga bosing",
+        "reorder_button": "🔁 #{order_id} · {date} · {total_price} sum",
+        "reorder_done": "#{order_id} buyurtmadan {count} ta mahsulot savatingizda",
+        "reorder_dropped": "{count} ta mahsulot endi sotilmaydi",
+        "history_order": "#{order_id} · {date}\n{total_products} dona · {total_price} sum",
         "admin_command_hint": " Komandalar ro'yxatini ko'rish uchun /admin dan foydalaning.",  # just admin command hint
         "menu_change_language": "Iltimos, tilni tanlang 🌎",
 
@@ -291,7 +369,37 @@ translations = {
                                  "/addcategory - Yangi kategoriya qo'shish\n"
                                  "/addproduct - Yangi mahsulot qo'shish\n"
                                  "/categories - Kategoriyalarni ko'rish va boshqarish\n"
-                                 "/products - Mahsulotlarni ko'rish va boshqarish",
+                                 "/products - Mahsulotlarni ko'rish va boshqarish\n"
+                                 "/broadcast - Barcha foydalanuvchilarga xabar yuborish\n"
+                                 "/import - CSV/JSON fayldan mahsulotlarni qo'shish yoki yangilash\n"
+                                 "/export - Katalogni CSV da yuklab olish (JSON uchun /export json)\n"
+                                 "/stats - Oxirgi 7 kunlik savdo (/stats 30, /stats 2026-01-01 2026-01-31)",
+        "broadcast_enter_message": "Tarqatiladigan xabarni yuboring. Matn, rasm yoki boshqa har qanday xabar har bir foydalanuvchiga o'zgarishsiz nusxalanadi.",
+        "broadcast_confirm": "Yuqoridagi xabar <b>{users}</b> ta foydalanuvchiga yuboriladi. Yuborilsinmi?",
+        "broadcast_send_button": "📣 Yuborish",
+        "broadcast_cancel_button": "❌ Bekor qilish",
+        "broadcast_started": "📣 #{campaign_id} tarqatma boshlandi",
+        "broadcast_canceled": "Tarqatma bekor qilindi",
+        "broadcast_finished": "📣 #{campaign_id} tarqatma tugadi\nYuborildi: {sent}\nXatolar: {failed}\nBotni bloklaganlar: {blocked}",
+        "import_prompt": "Katalogni hujjat sifatida yuboring: category, product_name, description, price, image ustunli CSV yoki JSON fayl yoki catalog.csv / catalog.json va rasmlar solingan ZIP arxiv. Rasmlar arxiv ichidagi yo'l yoki /export dagi image ustuni bilan ko'rsatiladi. Nomi mavjud mahsulotlar yangilanadi.",
+        "import_invalid_file": "❌ Faylni o'qib bo'lmadi: {error}",
+        "import_errors": "❌ Hech narsa import qilinmadi, faylda {count} ta xato bor:",
+        "import_row_error": "{line}-qator: {error}",
+        "import_row_missing": "{field} bo'sh",
+        "import_row_too_long": "{field} juda uzun",
+        "import_row_duplicate": "{field} oldingi qatorda takrorlangan",
+        "import_row_price": "{field} musbat son bo'lishi kerak",
+        "import_row_image": "{field} fayli topilmadi",
+        "import_row_image_invalid": "{field} rasm emas",
+        "import_empty": "Faylda mahsulotlar yo'q",
+        "import_done": "✅ Katalog import qilindi\nQo'shildi: {created}\nYangilandi: {updated}",
+        "stats_invalid_range": "/stats, oxirgi 30 kun uchun /stats 30, bir kun uchun /stats 2026-01-31 yoki ko'pi bilan {max_days} kunlik davr uchun /stats 2026-01-01 2026-01-31 dan foydalaning",
+        "stats_title": "📊 <b>Savdo {start} - {end}</b>",
+        "stats_no_orders": "Bu davrda buyurtmalar yo'q",
+        "stats_summary": "Buyurtmalar: {orders}\nTushum: {revenue} sum (oldingi davrga nisbatan {change})\nSotilgan mahsulotlar: {products}\nO'rtacha buyurtma: {average_order} sum\nMediana kun: {median_day} sum\nEng yaxshi kun: {best_day}, {best_day_revenue} sum",
+        "stats_top_products": "Top mahsulotlar",
+        "stats_categories": "Kategoriyalar",
+        "stats_no_category": "O'chirilgan mahsulotlar",
         "add_category_enter_name": "Yangi kategoriya nomini kiriting:",
         "category_added_success": "✅'{category_name}' kategoriyasi muvaffaqiyatli qo'shildi!",
         "category_added_fail": "❌Kategoriyani qo'shib bo'lmadi. Ehtimol, u allaqachon mavjuddir.",
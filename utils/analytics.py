@@ -0,0 +1,123 @@
+from dataclasses import dataclass
+from datetime import date, timedelta
+from os import getenv
+from typing import Optional
+
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.cache import catalog_cache
+from database.utils import db_ensure_catalog, db_get_daily_sales, db_get_product_sales
+
+load_dotenv()
+
+STATS_TOP_PRODUCTS = int(getenv('STATS_TOP_PRODUCTS', '10'))
+STATS_MAX_DAYS = int(getenv('STATS_MAX_DAYS', '366'))
+
+
+@dataclass(slots=True)
+class SalesReport:
+    start: date
+    end: date
+    orders: int
+    revenue: float
+    products: int
+    average_order: float
+    median_day_revenue: float  # days without orders count as 0
+    best_day: Optional[date]
+    best_day_revenue: float
+    previous_revenue: float  # same number of days right before start
+    top_products: list[tuple[str, int, float]]  # name, quantity, revenue
+    categories: list[tuple[Optional[str], float, float]]  # name (None: deleted or unknown), revenue, share
+
+
+def _per_day(rows, start: date, days: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """orders, revenue and products of every day from start on, zeros where there is no row"""
+    index = np.fromiter(((row.day - start).days for row in rows), np.int64, len(rows))
+    orders = np.zeros(days, np.int64)
+    revenue = np.zeros(days)
+    products = np.zeros(days, np.int64)
+    orders[index] = np.fromiter((row.orders for row in rows), np.int64, len(rows))
+    revenue[index] = np.fromiter((row.revenue for row in rows), np.float64, len(rows))
+    products[index] = np.fromiter((row.products for row in rows), np.int64, len(rows))
+    return orders, revenue, products
+
+
+async def sales_report(start: date, end: date, top: int = STATS_TOP_PRODUCTS,
+                       session: AsyncSession = None) -> SalesReport:
+    """Summary of the days start to end, both included, read from the daily aggregates.
+
+    Only aggregate rows are read: one per day and one per product sold on a day, however
+    many orders there were. Grouping and ranking them is done with NumPy.
+    """
+    days = (end - start).days + 1
+    previous_start = start - timedelta(days=days)
+    daily = await db_get_daily_sales(previous_start, end, session=session)
+    lines = await db_get_product_sales(start, end, session=session)
+    await db_ensure_catalog()
+
+    orders, revenue, products = _per_day(daily, previous_start, 2 * days)
+    previous_revenue, revenue = revenue[:days], revenue[days:]
+    orders, products = orders[days:], products[days:]
+
+    total_orders = int(orders.sum())
+    total_revenue = float(revenue.sum())
+    best = int(revenue.argmax())
+
+    top_products, categories = [], []
+    if lines:
+        names, by_name = np.unique(np.array([line.product_name for line in lines]), return_inverse=True)
+        category_ids, by_category = np.unique(
+            np.fromiter((line.category_id or 0 for line in lines), np.int64, len(lines)), return_inverse=True)
+        quantity = np.fromiter((line.quantity for line in lines), np.int64, len(lines))
+        line_revenue = np.fromiter((line.revenue for line in lines), np.float64, len(lines))
+
+        name_quantity = np.bincount(by_name, weights=quantity, minlength=len(names))
+        name_revenue = np.bincount(by_name, weights=line_revenue, minlength=len(names))
+        for i in np.argsort(-name_revenue, kind="stable")[:top]:
+            top_products.append((str(names[i]), int(name_quantity[i]), float(name_revenue[i])))
+
+        category_revenue = np.bincount(by_category, weights=line_revenue, minlength=len(category_ids))
+        total = category_revenue.sum()
+        share = category_revenue / total if total else np.zeros_like(category_revenue)
+        for i in np.argsort(-category_revenue, kind="stable"):
+            category = catalog_cache.category(int(category_ids[i]))
+            categories.append((category.category_name if category else None, float(category_revenue[i]),
+                               float(share[i])))
+
+    return SalesReport(
+        start=start,
+        end=end,
+        orders=total_orders,
+        revenue=total_revenue,
+        products=int(products.sum()),
+        average_order=total_revenue / total_orders if total_orders else 0.0,
+        median_day_revenue=float(np.median(revenue)),
+        best_day=start + timedelta(days=best) if total_orders else None,
+        best_day_revenue=float(revenue[best]),
+        previous_revenue=float(previous_revenue.sum()),
+        top_products=top_products,
+        categories=categories,
+    )
+
+
+def parse_report_range(args: Optional[str], today: date) -> Optional[tuple[date, date]]:
+    """Days of a /stats command: nothing for the last 7 days, N for the last N days, a YYYY-MM-DD day
+    or two of them for a range. None when the arguments are invalid or span more than STATS_MAX_DAYS."""
+    parts = (args or "").split()
+    try:
+        if not parts:
+            start, end = today - timedelta(days=6), today
+        elif len(parts) == 1 and parts[0].isdigit():
+            start, end = today - timedelta(days=int(parts[0]) - 1), today
+        elif len(parts) <= 2:
+            start, end = date.fromisoformat(parts[0]), date.fromisoformat(parts[-1])
+        else:
+            return None
+    except (ValueError, OverflowError):
+        return None
+
+    if not 0 <= (end - start).days < STATS_MAX_DAYS:
+        return None
+    return start, end
@@ -0,0 +1,109 @@
+import asyncio
+import contextvars
+import logging
+from os import getenv
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError, TelegramAPIError
+from dotenv import load_dotenv
+
+from database.utils import (db_get_running_campaign_ids, db_claim_campaign, db_stream_campaign_recipients,
+                            db_record_campaign_batch, db_finish_campaign, db_release_campaign)
+from middlewares.send_scheduler import Priority, set_send_priority
+from storage import LANG
+from translation import translations
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_BATCH_SIZE = int(getenv('BROADCAST_BATCH_SIZE', '500'))
+BROADCAST_CONCURRENCY = int(getenv('BROADCAST_CONCURRENCY', '30'))
+BROADCAST_LEASE = float(getenv('BROADCAST_LEASE', '300'))  # seconds a process owns a campaign without progress
+
+
+class BroadcastEngine:
+    """Deliver campaigns to every user in the background.
+
+    Users are read in keyset batches (see db_stream_campaign_recipients) and each batch is
+    copied out by a pool of BROADCAST_CONCURRENCY senders in the BULK lane of the send
+    scheduler, which keeps the bot inside flood limits and lets customer replies go first.
+    After every batch the outcomes and the checkpoint are committed together, so a
+    restarted bot resumes a running campaign where it stopped. A lease on the campaign
+    row keeps two bot processes from sending the same campaign.
+    """
+
+    def __init__(self, batch_size: int = BROADCAST_BATCH_SIZE, concurrency: int = BROADCAST_CONCURRENCY,
+                 lease: float = BROADCAST_LEASE):
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.lease = lease
+        self._bot: Optional[Bot] = None
+        self._tasks: dict[int, asyncio.Task] = {}
+
+    async def start(self, bot: Bot) -> None:
+        """Resume campaigns left running by a previous process"""
+        self._bot = bot
+        for campaign_id in await db_get_running_campaign_ids():
+            self.launch(campaign_id)
+
+    def launch(self, campaign_id: int) -> None:
+        if campaign_id in self._tasks:
+            return
+
+        # not part of the admin's update: its SQL and log records are the campaign's own
+        task = asyncio.create_task(self._run(campaign_id), context=contextvars.Context())
+        self._tasks[campaign_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(campaign_id, None))
+
+    async def _run(self, campaign_id: int) -> None:
+        set_send_priority(Priority.BULK)
+        campaign = await db_claim_campaign(campaign_id, self.lease)
+        if campaign is None:
+            logger.info(f"Campaign {campaign_id} is finished or owned by another process")
+            return
+
+        logger.info(f"Campaign {campaign_id} running from user {campaign.last_user_id}")
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def deliver(user_id: int, chat_id: int) -> tuple[int, str, Optional[str]]:
+            async with semaphore:
+                try:
+                    await self._bot.copy_message(chat_id=chat_id, from_chat_id=campaign.from_chat_id,
+                                                 message_id=campaign.message_id)
+                except TelegramForbiddenError as e:
+                    return user_id, 'blocked', e.message[:255]
+                except TelegramAPIError as e:
+                    return user_id, 'failed', e.message[:255]
+                return user_id, 'sent', None
+
+        try:
+            async for batch in db_stream_campaign_recipients(campaign_id, campaign.last_user_id, self.batch_size):
+                deliveries = await asyncio.gather(*(deliver(user_id, chat_id) for user_id, chat_id in batch))
+                await db_record_campaign_batch(campaign_id, deliveries, batch[-1][0], self.lease)
+        except asyncio.CancelledError:
+            logger.info(f"Campaign {campaign_id} paused, it resumes on next start")
+            await db_release_campaign(campaign_id)
+            raise
+
+        campaign = await db_finish_campaign(campaign_id)
+        logger.info(f"Campaign {campaign_id} finished: {campaign.sent} sent, {campaign.failed} failed, "
+                    f"{campaign.blocked} blocked")
+        set_send_priority(Priority.NOTIFY)
+        await LANG.load(campaign.from_chat_id)  # the admin may not have sent an update for a while
+        lang = LANG.get(campaign.from_chat_id, "uz")
+        await self._bot.send_message(chat_id=campaign.from_chat_id,
+                                     text=translations[lang]["broadcast_finished"].format(
+                                         campaign_id=campaign.id, sent=campaign.sent,
+                                         failed=campaign.failed, blocked=campaign.blocked))
+
+    async def close(self) -> None:
+        """Stop sending, running campaigns stay 'running' and are resumed by the next start"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+broadcast_engine = BroadcastEngine()
@@ -0,0 +1,191 @@
+import asyncio
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from decimal import Decimal, InvalidOperation
+from os import getenv
+from typing import Iterator, Optional
+
+from aiogram import Bot
+from dotenv import load_dotenv
+from PIL import Image
+
+from database.cache import catalog_cache
+from database.modules import Categories, Products
+from database.utils import db_ensure_catalog
+from utils.ingest import MEDIA_DIR, download, ingest_file
+
+load_dotenv()
+
+CATALOG_FIELDS = ("category", "product_name", "description", "price", "image")
+CATALOG_FORMATS = ("csv", "json")
+IMPORT_BATCH_SIZE = int(getenv('IMPORT_BATCH_SIZE', '500'))
+IMPORT_MAX_UNPACKED = int(getenv('IMPORT_MAX_UNPACKED', str(200 * 1024 * 1024)))  # bytes of an archive's content
+IMPORT_MAX_ERRORS = 20
+
+CATEGORY_NAME_LENGTH = Categories.category_name.type.length
+PRODUCT_NAME_LENGTH = Products.product_name.type.length
+PRICE_LIMIT = Decimal(10) ** (Products.price.type.precision - Products.price.type.scale)
+
+
+class CatalogFileError(Exception):
+    """The upload is not a catalog: unknown extension, archive without catalog file, too large"""
+
+
+async def export_catalog(fmt: str) -> bytes:
+    """Current catalog as CSV or JSON in the format read_catalog accepts back"""
+    await db_ensure_catalog()
+    rows = [{"category": category.category_name, "product_name": product.product_name,
+             "description": product.description, "price": str(product.price), "image": product.image}
+            for category in catalog_cache.categories()
+            for product in catalog_cache.products_by_category(category.id)]
+
+    if fmt == "json":
+        return json.dumps(rows, ensure_ascii=False, indent=1).encode()
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, CATALOG_FIELDS)
+    writer.writeheader()
+    writer.writerows(rows)
+    # BOM so that Excel opens the Cyrillic names right
+    return buffer.getvalue().encode("utf-8-sig")
+
+
+def _unpack(archive: str, destination: str) -> str:
+    """Extract the archive, returns the path of the catalog.csv / catalog.json inside"""
+    with zipfile.ZipFile(archive) as zf:
+        if sum(info.file_size for info in zf.infolist()) > IMPORT_MAX_UNPACKED:
+            raise CatalogFileError("archive is too large")
+        # extractall drops absolute paths and '..', nothing lands outside destination
+        zf.extractall(destination)
+
+    for fmt in CATALOG_FORMATS:
+        path = os.path.join(destination, f"catalog.{fmt}")
+        if os.path.isfile(path):
+            return path
+    raise CatalogFileError("no catalog.csv or catalog.json in the archive")
+
+
+def _read_rows(path: str) -> Iterator[tuple[int, dict]]:
+    """(line, row) pairs of a catalog file, CSV is read row by row, JSON must be an array of objects"""
+    if path.endswith(".json"):
+        with open(path, encoding="utf-8-sig") as f:
+            rows = json.load(f)
+        if not isinstance(rows, list):
+            raise CatalogFileError("JSON catalog must be an array")
+        for number, row in enumerate(rows, start=1):
+            yield number, row if isinstance(row, dict) else {}
+        return
+
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield reader.line_num, row
+
+
+def _is_image(path: str) -> bool:
+    """Pillow can decode the whole file, store_image only accepts such files"""
+    try:
+        with Image.open(path) as image:
+            image.load()
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError):
+        return False
+    return True
+
+
+def _validate(path: str, images_root: Optional[str]) -> tuple[list[dict], list[tuple[int, str, str]]]:
+    """One pass over the catalog file, returns the clean products and (line, error key, field) errors.
+
+    Images are paths relative to the archive when images_root is given, otherwise files
+    already in MEDIA_DIR (the image column of an export). Each must decode as an image.
+    """
+    products, errors, seen, decodable = [], [], set(), {}
+    for line, row in _read_rows(path):
+        values = {field: str(row.get(field) or "").strip() for field in CATALOG_FIELDS}
+        missing = [field for field in CATALOG_FIELDS if not values[field]]
+        if missing:
+            errors.extend((line, "import_row_missing", field) for field in missing)
+            continue
+
+        if len(values["category"]) > CATEGORY_NAME_LENGTH:
+            errors.append((line, "import_row_too_long", "category"))
+        if len(values["product_name"]) > PRODUCT_NAME_LENGTH:
+            errors.append((line, "import_row_too_long", "product_name"))
+        if values["product_name"] in seen:
+            errors.append((line, "import_row_duplicate", "product_name"))
+        seen.add(values["product_name"])
+
+        try:
+            values["price"] = Decimal(values["price"]).quantize(Decimal("0.01"))
+            if not 0 < values["price"] < PRICE_LIMIT:
+                raise InvalidOperation
+        except InvalidOperation:
+            errors.append((line, "import_row_price", "price"))
+
+        if images_root is not None:
+            image = os.path.realpath(os.path.join(images_root, values["image"]))
+            valid = image.startswith(os.path.realpath(images_root) + os.sep) and os.path.isfile(image)
+        else:
+            image = os.path.normpath(values["image"])
+            valid = os.path.dirname(image) == MEDIA_DIR and os.path.isfile(image)
+        if not valid:
+            errors.append((line, "import_row_image", "image"))
+        else:
+            if image not in decodable:
+                decodable[image] = _is_image(image)
+            if not decodable[image]:
+                errors.append((line, "import_row_image_invalid", "image"))
+        values["image"] = image
+        products.append(values)
+
+    return products, errors
+
+
+async def read_catalog(bot: Bot, file_id: str, file_name: str) -> tuple[list[dict], list[tuple[int, str, str]]]:
+    """Download an uploaded catalog (.csv, .json or .zip with catalog.csv/json and images) to a
+    temporary directory and validate it. Images of a valid archive are ingested into MEDIA_DIR.
+
+    Returns the products ready for db_import_catalog and the validation errors, when there
+    are any the products must not be imported.
+    """
+    extension = os.path.splitext(file_name or "")[1].lower().lstrip(".")
+    if extension not in CATALOG_FORMATS + ("zip",):
+        raise CatalogFileError(f"unsupported file type: {file_name}")
+
+    loop = asyncio.get_running_loop()
+    workdir = tempfile.mkdtemp(prefix="catalog-")
+    try:
+        return await _read_catalog(bot, file_id, extension, workdir)
+    finally:
+        await loop.run_in_executor(None, shutil.rmtree, workdir, True)
+
+
+async def _read_catalog(bot: Bot, file_id: str, extension: str,
+                        workdir: str) -> tuple[list[dict], list[tuple[int, str, str]]]:
+    upload = os.path.join(workdir, f"upload.{extension}")
+    await download(bot, file_id, upload)
+
+    loop = asyncio.get_running_loop()
+    images_root = None
+    path = upload
+    if extension == "zip":
+        images_root = os.path.join(workdir, "unpacked")
+        try:
+            path = await loop.run_in_executor(None, _unpack, upload, images_root)
+        except zipfile.BadZipFile as e:
+            raise CatalogFileError(str(e)) from e
+
+    try:
+        products, errors = await loop.run_in_executor(None, _validate, path, images_root)
+    except (ValueError, csv.Error) as e:  # json.JSONDecodeError and UnicodeDecodeError are ValueErrors
+        raise CatalogFileError(str(e)) from e
+
+    if images_root is not None and not errors:
+        sources = list({product["image"] for product in products})
+        stored = dict(zip(sources, await asyncio.gather(*(ingest_file(source) for source in sources))))
+        for product in products:
+            product["image"] = stored[product["image"]]
+    return products, errors
@@ -1,4 +1,7 @@
-from database.utils import db_get_all_product_inside_finally_cart
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.utils import db_get_user_cart_with_lines
+from translation import translations
 
 
 def text_for_caption(product_name: str, price: int, description: str) -> str:
@@ -9,34 +12,69 @@ def text_for_caption(product_name: str, price: int, description: str) -> str:
     return text
 
 
-def count_products_from_cart(chat_id: int, user_text: str):
-    products = db_get_all_product_inside_finally_cart(chat_id)
+async def count_products_from_cart(chat_id: int, user_text: str, session: AsyncSession = None):
+    cart, products = await db_get_user_cart_with_lines(chat_id, session=session)
+    return cart_text(cart, products, user_text), products
+
 
+def cart_text(cart, products, user_text: str) -> str:
+    """Cart lines and the totals kept on the carts row"""
     text = f"<b>{user_text}</b> \n\n"
-    total_price = total_products = count = 0
 
-    for product in products:
-        count += 1
-        total_price += product["final_price"]
-        total_products += product["quantity"]
-        text += f"{count}. {product['product_name']}\n Quantity: {product['quantity']} \n Price: {product['final_price']} \n\n"
+    for count, product in enumerate(products, start=1):
+        text += f"{count}. {product.product_name}\n Quantity: {product.quantity} \n Price: {product.final_price} \n\n"
 
+    total_products, total_price = (cart.total_products, cart.total_price) if cart else (0, 0)
     text += f"Total number of products: {total_products} \nTotal price inside cart: {total_price}"
-    return text, products
+    return text
+
+
+def order_cheque(order) -> str:
+    text = f"Purchase cheque #{order.id}\n\n"
+    text += f"Total products: {order.total_products} \n" \
+            f"Total price: {order.total_price}"
+
+    return text
 
 
-def count_products_for_purchase(chat_id: int):
-    products = db_get_all_product_inside_finally_cart(chat_id)
+def order_report_text(order, user, items) -> str:
+    """Message for the manager group"""
+    text = order_cheque(order) + "\n\n"
+    for count, item in enumerate(items, start=1):
+        text += f"{count}. {item.product_name} x {item.quantity} - {item.final_price}\n"
 
-    text = f"Purchase cheque \n\n"
-    total_price = total_products = count = 0
+    text += f"\n<b>Customer name: {user.name}\nContact: {user.phone}</b>\n\n"
+    return text
+
+
+def order_history_text(page, lang: str) -> str:
+    """One page of the user's orders"""
+    text = f"<b>{translations[lang]['history_selected']}</b>\n\n"
+    text += "\n\n".join(translations[lang]["history_order"].format(
+        order_id=order.id, date=order.created_at.strftime("%d.%m.%Y %H:%M"),
+        total_products=order.total_products, total_price=order.total_price) for order in page.rows)
+    return text
 
-    for product in products:
-        total_price += product['final_price']
-        total_products += 1
 
-    text += f"Total products: {total_products} \n" \
-            f"Total price: {total_price}"
+def stats_text(report, lang: str) -> str:
+    """Sales report of the /stats command"""
+    texts = translations[lang]
+    text = texts["stats_title"].format(start=report.start.strftime("%d.%m.%Y"), end=report.end.strftime("%d.%m.%Y"))
+    if not report.orders:
+        return text + "\n\n" + texts["stats_no_orders"]
 
-    content = (text, total_price)
-    return content
+    change = f"{(report.revenue / report.previous_revenue - 1) * 100:+.0f}%" if report.previous_revenue else "—"
+    text += "\n\n" + texts["stats_summary"].format(
+        orders=report.orders, revenue=f"{report.revenue:.2f}", products=report.products,
+        average_order=f"{report.average_order:.2f}", median_day=f"{report.median_day_revenue:.2f}",
+        best_day=report.best_day.strftime("%d.%m.%Y"), best_day_revenue=f"{report.best_day_revenue:.2f}",
+        change=change)
+
+    text += f"\n\n<b>{texts['stats_top_products']}</b>\n"
+    for count, (name, quantity, revenue) in enumerate(report.top_products, start=1):
+        text += f"{count}. {name} x {quantity} - {revenue:.2f}\n"
+
+    text += f"\n<b>{texts['stats_categories']}</b>\n"
+    for name, revenue, share in report.categories:
+        text += f"{name or texts['stats_no_category']} - {revenue:.2f} ({share:.0%})\n"
+    return text
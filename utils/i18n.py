@@ -0,0 +1,84 @@
+from string import Formatter
+
+from translation import translations
+
+DEFAULT_LANG = "uz"
+LANGUAGES = tuple(translations)
+
+"""
+Keys of reply keyboard buttons
+"""
+MAKE_AN_ORDER = "make_an_order"
+MAKE_ORDER_MAIN_MENU = "make_order_main_menu"
+MAIN_MENU_BUTTON = "main_menu_button"
+MAIN_MENU_BUTTON_TEXT = "main_menu_button_text"
+GO_BACK_BUTTON = "go_back_button"
+HISTORY_MAIN_MENU = "history_main_menu"
+CARTS_MAIN_MENU = "carts_main_menu"
+SETTINGS_MAIN_MENU = "settings_main_menu"
+CHANGE_LANGUAGE_SETTING = "change_language_setting"
+
+# Language buttons are shown before the user has a language, so they are not translated
+LANGUAGE_BUTTONS = {
+    "UZ 🇺🇿": "uz",
+    "RU 🇷🇺": "ru",
+    "ENG 🏴󠁧󠁢󠁥󠁮󠁧󠁿": "en",
+}
+
+
+class Intent:
+    MAKE_ORDER = "make_order"
+    MAIN_MENU = "main_menu"
+    GO_BACK = "go_back"
+    HISTORY = "history"
+    CARTS = "carts"
+    SETTINGS = "settings"
+    CHANGE_LANGUAGE = "change_language"
+    SET_LANGUAGE = "set_language"
+
+
+# Several buttons can lead to the same place, e.g. the main menu and the settings menu
+# both have a "Main menu" button with its own key
+INTENT_KEYS = {
+    Intent.MAKE_ORDER: (MAKE_AN_ORDER, MAKE_ORDER_MAIN_MENU),
+    Intent.MAIN_MENU: (MAIN_MENU_BUTTON, MAIN_MENU_BUTTON_TEXT),
+    Intent.GO_BACK: (GO_BACK_BUTTON,),
+    Intent.HISTORY: (HISTORY_MAIN_MENU,),
+    Intent.CARTS: (CARTS_MAIN_MENU,),
+    Intent.SETTINGS: (SETTINGS_MAIN_MENU,),
+    Intent.CHANGE_LANGUAGE: (CHANGE_LANGUAGE_SETTING,),
+}
+
+
+def _placeholders(text: str) -> frozenset:
+    return frozenset(name for _, name, _, _ in Formatter().parse(text) if name)
+
+
+def validate_translations() -> None:
+    """Every language must have the same keys with the same format placeholders"""
+    reference_lang = LANGUAGES[0]
+    reference = translations[reference_lang]
+    for lang, texts in translations.items():
+        if missing := reference.keys() - texts.keys():
+            raise ValueError(f"Translation '{lang}' is missing keys: {sorted(missing)}")
+        if extra := texts.keys() - reference.keys():
+            raise ValueError(f"Translation '{lang}' has keys missing in '{reference_lang}': {sorted(extra)}")
+        for key, text in texts.items():
+            if _placeholders(text) != _placeholders(reference[key]):
+                raise ValueError(f"Translation '{lang}.{key}' placeholders differ from '{reference_lang}'")
+
+
+def build_text_intents() -> dict[str, str]:
+    """Reverse index of button text in every language to its intent"""
+    text_intents = {text: Intent.SET_LANGUAGE for text in LANGUAGE_BUTTONS}
+    for intent, keys in INTENT_KEYS.items():
+        for key in keys:
+            for lang in LANGUAGES:
+                text = translations[lang][key]
+                if text_intents.setdefault(text, intent) != intent:
+                    raise ValueError(f"Button text {text!r} ('{lang}.{key}') is used by two intents")
+    return text_intents
+
+
+validate_translations()
+TEXT_INTENTS = build_text_intents()
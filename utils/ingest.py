@@ -0,0 +1,131 @@
+import asyncio
+import contextvars
+import hashlib
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import suppress
+from os import getenv
+from typing import Optional
+from uuid import uuid4
+
+import aiofiles
+import aiofiles.os
+from aiogram import Bot
+from dotenv import load_dotenv
+from PIL import Image, ImageOps
+
+from database.utils import db_count_products_with_image
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+MEDIA_DIR = getenv('MEDIA_DIR', 'media')
+MEDIA_MAX_SIDE = int(getenv('MEDIA_MAX_SIDE', '1280'))  # Telegram shows photos at most 1280px wide
+MEDIA_QUALITY = int(getenv('MEDIA_QUALITY', '82'))
+MEDIA_WORKERS = int(getenv('MEDIA_WORKERS', '2'))
+MEDIA_CHUNK_SIZE = 64 * 1024
+
+_pool: Optional[ProcessPoolExecutor] = None
+_releases: set[asyncio.Task] = set()
+
+
+def _render(source: str, destination: str, max_side: int, quality: int) -> None:
+    """Runs in a worker process: shrink to max_side, recompress as progressive JPEG without metadata"""
+    part = f"{destination}.{os.getpid()}.part"
+    try:
+        with Image.open(source) as image:
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((max_side, max_side))
+            image.convert("RGB").save(part, "JPEG", quality=quality, optimize=True, progressive=True)
+    except Exception:
+        with suppress(FileNotFoundError):
+            os.remove(part)
+        raise
+    os.replace(part, destination)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn, forking a process with a running event loop and logging thread is not safe
+        _pool = ProcessPoolExecutor(MEDIA_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+async def download(bot: Bot, file_id: str, destination: str) -> str:
+    """Stream a Telegram file to destination in chunks, returns its SHA-256"""
+    file = await bot.get_file(file_id)
+    digest = hashlib.sha256()
+    async with aiofiles.open(destination, "wb") as f:
+        async for chunk in bot.session.stream_content(url=bot.session.api.file_url(bot.token, file.file_path),
+                                                      timeout=bot.session.timeout,
+                                                      chunk_size=MEDIA_CHUNK_SIZE):
+            digest.update(chunk)
+            await f.write(chunk)
+    return digest.hexdigest()
+
+
+async def store_image(source: str, digest: str) -> str:
+    """Place the image at source in MEDIA_DIR under its content hash, resized and recompressed
+    in the process pool. Raises what Pillow raises when source is not an image, nothing is
+    stored then."""
+    path = os.path.join(MEDIA_DIR, f"{digest}.jpg")
+    if await aiofiles.os.path.exists(path):
+        return path
+
+    await asyncio.get_running_loop().run_in_executor(_get_pool(), _render, source, path,
+                                                     MEDIA_MAX_SIDE, MEDIA_QUALITY)
+    return path
+
+
+async def ingest_photo(bot: Bot, file_id: str) -> str:
+    """Download a Telegram photo into MEDIA_DIR and return the path products should point at.
+
+    The download is streamed to disk in chunks and hashed on the way, the stored image is
+    named by the SHA-256 of the upload, so the same photo sent twice is stored once. The
+    stored copy is resized and recompressed in a process pool, the event loop only moves bytes.
+    """
+    await aiofiles.os.makedirs(MEDIA_DIR, exist_ok=True)
+    part = os.path.join(MEDIA_DIR, f".{uuid4().hex}.part")
+    try:
+        return await store_image(part, await download(bot, file_id, part))
+    finally:
+        with suppress(FileNotFoundError):
+            await aiofiles.os.remove(part)
+
+
+async def ingest_file(source: str) -> str:
+    """store_image for a file already on disk, e.g. extracted from an uploaded archive"""
+    await aiofiles.os.makedirs(MEDIA_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    async with aiofiles.open(source, "rb") as f:
+        while chunk := await f.read(MEDIA_CHUNK_SIZE):
+            digest.update(chunk)
+    return await store_image(source, digest.hexdigest())
+
+
+async def release_media(path: str) -> None:
+    """Delete a stored image once no product points at it any more"""
+    if os.path.dirname(path) != MEDIA_DIR or await db_count_products_with_image(path):
+        return
+
+    with suppress(FileNotFoundError):
+        await aiofiles.os.remove(path)
+        logger.info(f"Removed unused image {path}")
+
+
+def schedule_release(path: str) -> None:
+    """release_media in the background, for run_after_commit callbacks, outside the update's context"""
+    task = asyncio.create_task(release_media(path), context=contextvars.Context())
+    _releases.add(task)
+    task.add_done_callback(_releases.discard)
+
+
+async def close_media() -> None:
+    if _releases:
+        await asyncio.gather(*_releases, return_exceptions=True)
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
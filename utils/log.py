@@ -0,0 +1,100 @@
+import json
+import logging
+import random
+import sys
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from os import getenv
+from queue import SimpleQueue
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LOG_LEVEL = getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = getenv('LOG_FORMAT', 'text')  # text | json
+LOG_DEBUG_SAMPLE = float(getenv('LOG_DEBUG_SAMPLE', '0'))  # share of updates whose DEBUG records are kept
+SQL_ECHO = getenv('SQL_ECHO', '').lower() in ('1', 'true', 'yes')
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(update_id)s] %(message)s"
+# loggers of libraries stay at LOG_LEVEL when debug sampling lowers the root logger
+LIBRARY_LOGGERS = ("aiogram", "aiohttp", "asyncio", "sqlalchemy", "psycopg", "alembic")
+
+# (update_id, debug records kept) of the update being processed
+_update_context: ContextVar[Optional[tuple[int, bool]]] = ContextVar("log_update_context", default=None)
+
+
+@contextmanager
+def log_update(update_id: int):
+    """Tag records logged inside with update_id and decide whether the update's debug trace is kept"""
+    token = _update_context.set((update_id, random.random() < LOG_DEBUG_SAMPLE))
+    try:
+        yield
+    finally:
+        _update_context.reset(token)
+
+
+class UpdateContextFilter(logging.Filter):
+    """Runs on the event loop before the record is queued: reads the update context and samples DEBUG"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = _update_context.get()
+        record.update_id = context[0] if context else "-"
+        if record.levelno < logging.getLevelName(LOG_LEVEL):
+            # only present when LOG_DEBUG_SAMPLE lowered the root level
+            return context is not None and context[1]
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.update_id != "-":
+            entry["update_id"] = record.update_id
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _PassThroughQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # merge args now, the listener thread must not touch objects the loop keeps mutating;
+        # traceback formatting is left to the listener
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def setup_logging() -> QueueListener:
+    """Route all logging through a queue, a listener thread formats and writes to stderr.
+
+    LOG_LEVEL sets the level, LOG_FORMAT=json writes one JSON object per line,
+    LOG_DEBUG_SAMPLE=0.01 keeps DEBUG records of 1% of updates (see log_update) and
+    SQL_ECHO=1 logs every SQL statement. Stop the returned listener on exit to flush the queue.
+    """
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(JsonFormatter() if LOG_FORMAT == 'json' else logging.Formatter(TEXT_FORMAT))
+
+    queue = SimpleQueue()
+    handler = _PassThroughQueueHandler(queue)
+    handler.addFilter(UpdateContextFilter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(logging.DEBUG if LOG_DEBUG_SAMPLE > 0 else LOG_LEVEL)
+    if LOG_DEBUG_SAMPLE > 0:
+        for name in LIBRARY_LOGGERS:
+            logging.getLogger(name).setLevel(LOG_LEVEL)
+    logging.getLogger("sqlalchemy.engine").setLevel(logging.INFO if SQL_ECHO else logging.WARNING)
+
+    listener = QueueListener(queue, stream, respect_handler_level=True)
+    listener.start()
+    return listener
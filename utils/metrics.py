@@ -0,0 +1,109 @@
+import logging
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from os import getenv
+from typing import Callable, Optional
+
+from aiohttp import web
+from dotenv import load_dotenv
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+METRICS_HOST = getenv('METRICS_HOST', '0.0.0.0')  # e.g. 127.0.0.1 or a private interface, there is no auth
+METRICS_PORT = int(getenv('METRICS_PORT', '0'))  # 0 disables, never the public webhook port
+METRICS_PATH = '/metrics'
+
+LATENCY_BUCKETS = (.005, .01, .025, .05, .075, .1, .25, .5, .75, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1)
+
+HANDLER_SECONDS = Histogram('bot_handler_seconds', 'Time to process an update, middlewares and commit included',
+                            ['handler'], buckets=LATENCY_BUCKETS)
+HANDLER_ERRORS = Counter('bot_handler_errors_total', 'Updates whose processing raised', ['handler'])
+HANDLER_DB_QUERIES = Histogram('bot_handler_db_queries', 'SQL statements executed per update',
+                               ['handler'], buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34))
+HANDLER_DB_SECONDS = Histogram('bot_handler_db_seconds', 'Time spent in SQL per update',
+                               ['handler'], buckets=LATENCY_BUCKETS)
+DB_QUERY_SECONDS = Histogram('bot_db_query_seconds', 'Duration of single SQL statements', ['statement'],
+                             buckets=QUERY_BUCKETS)
+API_REQUESTS = Counter('bot_telegram_requests_total', 'Bot API requests by method and outcome', ['method', 'outcome'])
+API_SECONDS = Histogram('bot_telegram_request_seconds', 'Bot API request duration', ['method'],
+                        buckets=LATENCY_BUCKETS)
+
+
+@dataclass(slots=True)
+class UpdateStats:
+    """Collected while one update is processed, see UpdateMetricsMiddleware"""
+    handler: str = "unhandled"
+    queries: int = 0
+    query_seconds: float = 0.0
+
+
+current_update: ContextVar[Optional[UpdateStats]] = ContextVar("current_update", default=None)
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Time every SQL statement and add it to the stats of the update that issued it"""
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        DB_QUERY_SECONDS.labels(statement.lstrip().split(None, 1)[0].upper()).observe(elapsed)
+        stats = current_update.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.query_seconds += elapsed
+
+
+class StatsCollector:
+    """Expose stats() dicts of in-process components (caches, send scheduler) as gauges at scrape time"""
+
+    def __init__(self):
+        self._sources: dict[str, Callable[[], dict]] = {}
+
+    def add(self, name: str, stats: Callable[[], dict]) -> None:
+        self._sources[name] = stats
+
+    def collect(self):
+        for name, stats in self._sources.items():
+            for key, value in stats().items():
+                family = GaugeMetricFamily(f"bot_{name}_{key}", f"{name} {key}",
+                                           labels=["lane"] if isinstance(value, dict) else None)
+                if isinstance(value, dict):
+                    for label, number in value.items():
+                        family.add_metric([str(label)], number)
+                else:
+                    family.add_metric([], value)
+                yield family
+
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(body=generate_latest(REGISTRY), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+
+async def start_metrics_server() -> Optional[web.AppRunner]:
+    """Serve /metrics on METRICS_PORT, kept apart from the webhook so only the scraper's network can read it"""
+    if not METRICS_PORT:
+        return None
+
+    app = web.Application()
+    app.router.add_get(METRICS_PATH, metrics_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host=METRICS_HOST, port=METRICS_PORT).start()
+    logger.info(f"Metrics on {METRICS_HOST}:{METRICS_PORT}{METRICS_PATH}")
+    return runner
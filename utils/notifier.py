@@ -0,0 +1,121 @@
+import asyncio
+import logging
+from os import getenv
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from dotenv import load_dotenv
+
+from database.utils import db_get_order_report, db_get_unreported_order_ids, db_set_order_status
+from middlewares.send_scheduler import Priority, set_send_priority
+from utils.helper import order_report_text
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+MANAGER = getenv('MANAGER')
+NOTIFY_MAX_ATTEMPTS = int(getenv('NOTIFY_MAX_ATTEMPTS', '5'))
+NOTIFY_RETRY_DELAY = float(getenv('NOTIFY_RETRY_DELAY', '2'))
+NOTIFY_SHUTDOWN_TIMEOUT = float(getenv('NOTIFY_SHUTDOWN_TIMEOUT', '10'))
+
+
+class OrderNotifier:
+    """Send order reports to the MANAGER chat from a background worker.
+
+    Checkout only puts the order id on the queue once the order is committed, so the
+    customer does not wait for the manager group. Network errors, 5xx and flood waits
+    are retried with exponential backoff. The outcome is stored in orders.status
+    ('notified' or 'notify_failed'), until then the order stays 'new'. The queue lives in
+    memory only, so start() queues every 'new' order again: reports lost to a crash or
+    left over at shutdown go out after the restart. With several replicas, an order
+    another replica is reporting at that moment may be reported twice, never lost.
+    """
+
+    def __init__(self, chat_id: Optional[str] = MANAGER, max_attempts: int = NOTIFY_MAX_ATTEMPTS,
+                 retry_delay: float = NOTIFY_RETRY_DELAY):
+        self.chat_id = chat_id
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._queue: asyncio.Queue[int] = asyncio.Queue()
+        self._queued: set[int] = set()
+        self._worker: Optional[asyncio.Task] = None
+        self._bot: Optional[Bot] = None
+
+    async def start(self, bot: Bot) -> None:
+        self._bot = bot
+        pending = await db_get_unreported_order_ids()
+        if pending:
+            logger.info(f"{len(pending)} order reports left from a previous run queued again")
+        for order_id in pending:
+            self.notify(order_id)
+        self._worker = asyncio.create_task(self._run())
+
+    def notify(self, order_id: int) -> None:
+        if order_id not in self._queued:
+            self._queued.add(order_id)
+            self._queue.put_nowait(order_id)
+
+    async def _run(self) -> None:
+        # customers waiting for a reply go first
+        set_send_priority(Priority.NOTIFY)
+        while True:
+            order_id = await self._queue.get()
+            try:
+                await self._deliver(order_id)
+            except Exception:
+                logger.exception(f"Report of order {order_id} failed")
+            finally:
+                self._queued.discard(order_id)
+                self._queue.task_done()
+
+    async def _deliver(self, order_id: int) -> None:
+        report = await db_get_order_report(order_id)
+        if report is None:
+            logger.warning(f"Order {order_id} disappeared before its report was sent")
+            return
+
+        text = order_report_text(*report)
+        delay = self.retry_delay
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                await self._bot.send_message(chat_id=self.chat_id, text=text)
+            except TelegramRetryAfter as e:
+                wait = e.retry_after
+            except (TelegramNetworkError, TelegramServerError) as e:
+                wait = delay
+                delay *= 2
+                logger.warning(f"Report of order {order_id}, attempt {attempt} failed: {e.message}")
+            except TelegramAPIError as e:
+                logger.error(f"Report of order {order_id} rejected: {e.message}")
+                break
+            else:
+                await db_set_order_status(order_id, 'notified')
+                return
+
+            if attempt < self.max_attempts:
+                await asyncio.sleep(wait)
+
+        await db_set_order_status(order_id, 'notify_failed')
+
+    async def close(self, timeout: float = NOTIFY_SHUTDOWN_TIMEOUT) -> None:
+        """Give queued reports a chance to go out, then stop the worker"""
+        if self._worker is None:
+            return
+
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            # their orders stay 'new', the next start() queues them again
+            logger.warning(f"{self._queue.qsize()} order reports were not sent before shutdown")
+
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+
+order_notifier = OrderNotifier()
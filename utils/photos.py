@@ -0,0 +1,80 @@
+import logging
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile, InputMediaPhoto, Message, InlineKeyboardMarkup
+
+from database.dto import ProductRow
+from database.utils import db_set_product_file_id
+
+logger = logging.getLogger(__name__)
+
+# "wrong file identifier/HTTP URL specified", "wrong remote file identifier specified", ...
+FILE_ID_ERRORS = ("file identifier", "file_id")
+
+
+def _is_file_id_error(error: TelegramBadRequest) -> bool:
+    message = error.message.lower()
+    return any(marker in message for marker in FILE_ID_ERRORS)
+
+
+async def _forget_file_id(product: ProductRow, error: TelegramBadRequest) -> None:
+    """Drop a file_id Telegram no longer accepts, any other error is not about the photo and is raised"""
+    if not _is_file_id_error(error):
+        raise error
+    logger.warning(f"Cached file_id of product {product.id} failed: {error.message}. Re-uploading")
+    # the cached row is shared, db_set_product_file_id updates it through the catalog cache
+    await db_set_product_file_id(product.id, product.image, None)
+
+
+async def _remember_file_id(product: ProductRow, message) -> None:
+    """Store file_id Telegram assigned to the uploaded photo"""
+    if not isinstance(message, Message) or not message.photo:
+        return
+
+    file_id = message.photo[-1].file_id
+    if file_id != product.image_file_id:
+        await db_set_product_file_id(product.id, product.image, file_id)
+
+
+async def send_product_photo(bot: Bot, chat_id: int, product: ProductRow, caption: str,
+                             reply_markup: Optional[InlineKeyboardMarkup] = None) -> Message:
+    """Send product photo, uploading it from media/ only if Telegram has no file_id for it yet"""
+    if product.image_file_id:
+        try:
+            return await bot.send_photo(chat_id=chat_id,
+                                        photo=product.image_file_id,
+                                        caption=caption,
+                                        reply_markup=reply_markup)
+        except TelegramBadRequest as e:
+            await _forget_file_id(product, e)
+
+    message = await bot.send_photo(chat_id=chat_id,
+                                   photo=FSInputFile(path=product.image),
+                                   caption=caption,
+                                   reply_markup=reply_markup)
+    await _remember_file_id(product, message)
+    return message
+
+
+async def edit_product_photo(bot: Bot, chat_id: int, message_id: int, product: ProductRow, caption: str,
+                             reply_markup: Optional[InlineKeyboardMarkup] = None):
+    """Edit photo message of product, preferring cached file_id over re-upload"""
+    if product.image_file_id:
+        try:
+            return await bot.edit_message_media(chat_id=chat_id,
+                                                message_id=message_id,
+                                                media=InputMediaPhoto(media=product.image_file_id,
+                                                                      caption=caption),
+                                                reply_markup=reply_markup)
+        except TelegramBadRequest as e:
+            await _forget_file_id(product, e)
+
+    result = await bot.edit_message_media(chat_id=chat_id,
+                                          message_id=message_id,
+                                          media=InputMediaPhoto(media=FSInputFile(path=product.image),
+                                                                caption=caption),
+                                          reply_markup=reply_markup)
+    await _remember_file_id(product, result)
+    return result
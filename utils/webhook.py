@@ -0,0 +1,129 @@
+import asyncio
+import hmac
+import logging
+import signal
+from os import getenv
+from typing import Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import web
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_HOST = getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(getenv('WEBHOOK_PORT', '8080'))
+WEBHOOK_PATH = getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_URL = getenv('WEBHOOK_URL')  # public base url, e.g. https://bot.example.com; empty skips setWebhook
+WEBHOOK_SECRET = getenv('WEBHOOK_SECRET')
+WEBHOOK_MAX_IN_FLIGHT = int(getenv('WEBHOOK_MAX_IN_FLIGHT', '100'))
+WEBHOOK_SHUTDOWN_TIMEOUT = float(getenv('WEBHOOK_SHUTDOWN_TIMEOUT', '30'))
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookHandler:
+    """Accept Telegram updates over HTTP and process them concurrently.
+
+    Telegram gets its 200 as soon as the update is parsed, handlers run in background tasks.
+    At most max_in_flight updates are processed at once; when the limit is reached the
+    request waits for a free slot, which slows Telegram down instead of piling up tasks.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, secret_token: Optional[str] = None,
+                 max_in_flight: int = WEBHOOK_MAX_IN_FLIGHT):
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.secret_token = secret_token
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.secret_token and not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), self.secret_token):
+            return web.Response(status=401)
+
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except ValueError as e:
+            logger.warning(f"Rejected malformed update: {e}")
+            return web.Response(status=400)
+
+        await self._semaphore.acquire()
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response()
+
+    async def _process(self, update: Update) -> None:
+        try:
+            await self.dispatcher.feed_update(self.bot, update)
+        except Exception as e:
+            logger.exception(f"Failed to process update {update.update_id}: {e}")
+        finally:
+            self._semaphore.release()
+
+    async def close(self, timeout: float = WEBHOOK_SHUTDOWN_TIMEOUT) -> None:
+        """Wait for in-flight updates to finish"""
+        if not self._tasks:
+            return
+
+        logger.info(f"Waiting for {len(self._tasks)} in-flight updates")
+        _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+
+
+def create_webhook_app(dispatcher: Dispatcher, bot: Bot) -> web.Application:
+    """aiohttp application serving the bot webhook"""
+    app = web.Application()
+    handler = WebhookHandler(dispatcher, bot, secret_token=WEBHOOK_SECRET)
+    app["webhook_handler"] = handler
+    app.router.add_post(WEBHOOK_PATH, handler.handle)
+
+    async def on_startup(_: web.Application):
+        await dispatcher.emit_startup(bot=bot)
+        if WEBHOOK_URL:
+            await bot.set_webhook(url=f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}",
+                                  secret_token=WEBHOOK_SECRET,
+                                  allowed_updates=dispatcher.resolve_used_update_types(),
+                                  max_connections=min(WEBHOOK_MAX_IN_FLIGHT, 100))
+            logger.info(f"Webhook set to {WEBHOOK_URL}{WEBHOOK_PATH}")
+
+    async def on_shutdown(_: web.Application):
+        await handler.close()
+        await dispatcher.emit_shutdown(bot=bot)
+        await bot.session.close()
+
+    app.on_startup.append(on_startup)
+    app.on_shutdown.append(on_shutdown)
+    return app
+
+
+async def run_webhook(dispatcher: Dispatcher, bot: Bot) -> None:
+    """Serve webhook until SIGINT/SIGTERM, then shut down gracefully"""
+    runner = web.AppRunner(create_webhook_app(dispatcher, bot))
+    await runner.setup()
+    site = web.TCPSite(runner, host=WEBHOOK_HOST, port=WEBHOOK_PORT)
+    await site.start()
+    logger.info(f"Webhook server listening on {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Windows: Ctrl+C cancels the main task instead
+            pass
+
+    try:
+        await stop.wait()
+    finally:
+        await runner.cleanup()